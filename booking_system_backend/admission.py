@@ -0,0 +1,238 @@
+"""Admission control: per-client rate limits and a cap on concurrent writes.
+
+`AdmissionControl` is an ASGI middleware. Each client has a token bucket;
+a request over its limit is rejected at once with 429 and a Retry-After
+header, before any database work. A client is identified by its MCP
+session (the `mcp-session-id` header), then its `X-API-Key`, then its IP
+address. Neither header is authenticated, so every IP address also has a
+bucket, shared by all its clients, that is `RATE_LIMIT_IP_FACTOR` times
+larger: a client sending a new session id or key with each request still
+can't exceed it.
+
+Writes (REST POST/PUT/PATCH/DELETE, and the MCP write tools via
+`write_limiter`) are also capped at a fixed number in flight. A small
+bounded queue waits behind them. When the queue is full, or a request
+waits longer than the queue timeout, the request gets 503 straight away
+instead of piling up. Reads are never queued behind writes.
+"""
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import config
+import metrics
+from cache import LRUCache
+from schemas import ErrorResponse
+
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+EXEMPT_PATHS = {'/', '/metrics'}
+
+
+class RateLimiter:
+    """Token buckets per client key: `rate` requests per second, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        # Idle clients' buckets are full again after burst / rate seconds, so they can be dropped
+        self._buckets = LRUCache(maxsize=max_clients, ttl=max(burst / rate, 1.0))
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> float:
+        """Take a token for `key`; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                wait = 0.0
+            else:
+                bucket[0] = tokens
+                wait = (1 - tokens) / self.rate
+            self._buckets.set(key, bucket)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class _Waiter:
+    __slots__ = ('granted', 'wake')
+
+    def __init__(self, wake):
+        self.granted = False
+        self.wake = wake
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders, `max_queue` waiters, and waits of at most `timeout` seconds.
+
+    Usable from threads (`acquire`) and from the event loop (`acquire_async`);
+    a released slot is handed directly to the longest waiter.
+    """
+
+    def __init__(self, limit: int, max_queue: int = 64, timeout: float = 1.0):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _enter(self, waiter: _Waiter) -> Optional[bool]:
+        """True if a slot was taken, False if the queue is full, None if queued."""
+        with self._lock:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                metrics.incr('admission.shed')
+                return False
+            self._waiters.append(waiter)
+            return None
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout; returns True if a slot was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+        metrics.incr('admission.timed_out')
+        return False
+
+    def acquire(self) -> bool:
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        entered = self._enter(waiter)
+        if entered is not None:
+            return entered
+        started = time.perf_counter()
+        event.wait(self.timeout)
+        metrics.observe('admission.queue_wait', time.perf_counter() - started)
+        return waiter.granted or self._abandon(waiter)
+
+    async def acquire_async(self) -> bool:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(wake)
+        entered = self._enter(waiter)
+        if entered is not None:
+            return entered
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        metrics.observe('admission.queue_wait', time.perf_counter() - started)
+        return waiter.granted or self._abandon(waiter)
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.in_flight -= 1
+
+
+def client_ip(scope) -> str:
+    client = scope.get('client')
+    return 'ip:' + (client[0] if client else 'unknown')
+
+
+def client_key(scope) -> str:
+    headers = dict(scope.get('headers') or ())
+    if b'mcp-session-id' in headers:
+        return 'mcp:' + headers[b'mcp-session-id'].decode('latin-1')
+    if b'x-api-key' in headers:
+        return 'key:' + headers[b'x-api-key'].decode('latin-1')
+    return client_ip(scope)
+
+
+def overloaded_error() -> ErrorResponse:
+    return ErrorResponse(
+        error="Server busy",
+        error_code="OVERLOADED",
+        details="Too many bookings and other changes are in progress. Please retry in a moment."
+    )
+
+
+class AdmissionControl:
+    """ASGI middleware applying the module's `ip_rate_limiter` and `rate_limiter` to every
+    request and `write_limiter` to REST writes (any may be None to disable it)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        for limiter, key in ((ip_rate_limiter, client_ip(scope)), (rate_limiter, client_key(scope))):
+            if limiter is None:
+                continue
+            retry_after = limiter.check(key)
+            if retry_after:
+                metrics.incr('admission.rate_limited')
+                error = ErrorResponse(
+                    error="Too many requests",
+                    error_code="RATE_LIMITED",
+                    details=f"Request rate limit of {limiter.rate:g}/s exceeded. Retry after {retry_after:.2f} seconds."
+                )
+                return await _reject(send, 429, error, {'retry-after': str(math.ceil(retry_after))})
+
+        limiter = write_limiter
+        if (limiter is None or scope['method'] not in WRITE_METHODS
+                or scope['path'].startswith('/mcp')):  # MCP write tools are limited per tool call
+            return await self.app(scope, receive, send)
+        if not await limiter.acquire_async():
+            return await _reject(send, 503, overloaded_error(), {'retry-after': '1'})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+async def _reject(send, status: int, error: ErrorResponse, headers: dict[str, str]) -> None:
+    body = json.dumps(error.model_dump()).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        + [(k.encode(), v.encode()) for k, v in headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+rate_limiter = RateLimiter(config.RATE_LIMIT_RPS, config.RATE_LIMIT_BURST) if config.RATE_LIMIT_RPS > 0 else None
+ip_rate_limiter = (
+    RateLimiter(config.RATE_LIMIT_RPS * config.RATE_LIMIT_IP_FACTOR, math.ceil(config.RATE_LIMIT_BURST * config.RATE_LIMIT_IP_FACTOR))
+    if config.RATE_LIMIT_RPS > 0 else None
+)
+write_limiter = (
+    ConcurrencyLimiter(config.WRITE_CONCURRENCY, config.WRITE_QUEUE_SIZE, config.WRITE_QUEUE_TIMEOUT)
+    if config.WRITE_CONCURRENCY > 0 else None
+)
+metrics.register('admission', lambda: {
+    'rate_limited_clients': len(rate_limiter) if rate_limiter is not None else None,
+    'rate_limited_ips': len(ip_rate_limiter) if ip_rate_limiter is not None else None,
+    'writes_in_flight': write_limiter.in_flight if write_limiter is not None else None,
+    'writes_queued': write_limiter.queued if write_limiter is not None else None,
+})
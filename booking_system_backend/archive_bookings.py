@@ -0,0 +1,40 @@
+"""Move finished bookings from `bookings` to `bookings_archive`.
+
+Usage:
+    python archive_bookings.py
+    python archive_bookings.py --departed-before 2099-01-05T00:00:00Z --chunk-size 5000
+
+Archives completed and cancelled bookings of flights that have departed,
+plus cancellations older than the retention period, one chunk per
+transaction. Safe to run while the server is up, and to re-run.
+"""
+import argparse
+import sys
+import time
+
+from db import SessionLocal, init_db
+from services import archive
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive completed and cancelled bookings.")
+    parser.add_argument("--departed-before", help="Archive finished bookings of flights departing before this time (default: now)")
+    parser.add_argument("--cancelled-before", help="Archive cancellations booked before this time "
+                        f"(default: {archive.CANCELLED_RETENTION_DAYS} days ago)")
+    parser.add_argument("--chunk-size", type=int, default=archive.ARCHIVE_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        result = archive.archive_bookings(db, args.departed_before, args.cancelled_before, args.chunk_size)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print(f"Archived {result.archived} bookings in {result.chunks} chunks in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
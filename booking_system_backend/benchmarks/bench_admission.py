@@ -0,0 +1,100 @@
+"""Latency of a well-behaved client while another client floods the server.
+
+Usage:
+    python benchmarks/bench_admission.py --abusers 8 --seconds 5
+
+Three runs against a single `server.py` worker, each in a scratch directory:
+no abuse, abuse with admission control off, and abuse with per-client rate
+limits and the write concurrency limit on. The abusers hammer GET /flights
+and POST /book under one API key; the polite client sends a request every
+20 ms under its own key and reports its p50/p99 latency.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_workers import SERVER, _wait_until_up
+
+LIMITS = {
+    "GALAXIUM_RATE_LIMIT_RPS": "100",
+    "GALAXIUM_RATE_LIMIT_BURST": "50",
+    "GALAXIUM_WRITE_CONCURRENCY": "4",
+}
+
+
+def _abuser(base, seconds, index, rejected):
+    booking = {"user_id": 1, "name": "Alice", "flight_id": 1}
+    headers = {"X-API-Key": "abuser"}
+    deadline = time.perf_counter() + seconds
+    with httpx.Client(base_url=base, headers=headers) as client:
+        while time.perf_counter() < deadline:
+            response = client.post("/book", json=booking) if index % 2 else client.get("/flights")
+            if response.status_code in (429, 503):
+                with rejected.get_lock():
+                    rejected.value += 1
+
+
+def _polite(base, seconds, latencies):
+    deadline = time.perf_counter() + seconds
+    with httpx.Client(base_url=base, headers={"X-API-Key": "polite"}) as client:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            client.get("/flights").raise_for_status()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.02)
+
+
+def run(label, abusers, seconds, port, env):
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.Popen(
+            [sys.executable, str(SERVER), "--port", str(port)],
+            cwd=workdir, env={**os.environ, "GALAXIUM_MCP": "off", **env},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            _wait_until_up(base + "/")
+            with multiprocessing.Manager() as manager:
+                latencies = manager.list()
+                rejected = multiprocessing.Value("l", 0)
+                procs = [multiprocessing.Process(target=_polite, args=(base, seconds, latencies))]
+                procs += [
+                    multiprocessing.Process(target=_abuser, args=(base, seconds, i, rejected))
+                    for i in range(abusers)
+                ]
+                for p in procs:
+                    p.start()
+                for p in procs:
+                    p.join()
+                samples = sorted(latencies)
+        finally:
+            proc.terminate()
+            proc.wait()
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+    print(f"{label:<24} polite p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  abuser requests shed {rejected.value}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--abusers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8182)
+    args = parser.parse_args()
+
+    run("no abuse", 0, args.seconds, args.port, {})
+    run("abuse, no admission", args.abusers, args.seconds, args.port, {})
+    run("abuse, admission on", args.abusers, args.seconds, args.port, LIMITS)
+
+
+if __name__ == "__main__":
+    main()
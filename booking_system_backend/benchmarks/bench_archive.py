@@ -0,0 +1,112 @@
+"""Hot-path booking query latency before and after archiving.
+
+Usage (from a scratch directory, which gets its own bookings database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_archive.py --bookings 1000000
+
+Fills `bookings` with a history where most rows belong to departed flights
+or are old cancellations, then times get_bookings per user and a scan of
+active bookings, runs the archival job and times them again.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from models import Base, Booking, Flight, User
+from services import archive, booking
+
+START = datetime(2000, 1, 1)
+
+
+def populate(engine, bookings, users, past_share):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    flights = 2000
+    past = int(flights * past_share)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": f"User {i}", "email": f"user{i}@example.com"} for i in range(users)])
+        rows = []
+        for i in range(flights):
+            departure = START + timedelta(days=i * 7000 // past) if i < past else datetime(2099, 1, 1) + timedelta(hours=i)
+            rows.append({
+                "origin": "Earth",
+                "destination": "Mars",
+                "departure_time": departure.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "arrival_time": (departure + timedelta(hours=8)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "base_price": 1000000,
+                "economy_seats_available": 60,
+                "business_seats_available": 30,
+                "galaxium_seats_available": 10,
+            })
+        conn.execute(insert(Flight), rows)
+        rows = []
+        for _ in range(bookings):
+            flight_id = rng.randrange(1, flights + 1)
+            if flight_id <= past:
+                status = "completed" if rng.random() < 0.9 else "cancelled"
+            else:
+                status = "booked" if rng.random() < 0.9 else "cancelled"
+            rows.append({
+                "user_id": rng.randrange(1, users + 1),
+                "flight_id": flight_id,
+                "status": status,
+                "booking_time": "1999-12-01T00:00:00",
+                "seat_class": "economy",
+                "price_paid": 1000000,
+            })
+            if len(rows) == 50000:
+                conn.execute(insert(Booking), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Booking), rows)
+
+
+def timed(Session, queries, users, rng):
+    latencies = []
+    with Session() as db:
+        for _ in range(queries):
+            user_id = rng.randrange(1, users + 1)
+            started = time.perf_counter()
+            booking.get_bookings(db, user_id)
+            latencies.append(time.perf_counter() - started)
+            db.expunge_all()
+        started = time.perf_counter()
+        active = db.scalar(select(func.count()).select_from(Booking).where(Booking.status == "booked"))
+        scan = time.perf_counter() - started
+        rows = db.scalar(select(func.count()).select_from(Booking))
+    return statistics.median(latencies), sorted(latencies)[int(len(latencies) * 0.99)], scan, active, rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--past-share", type=float, default=0.8, help="Share of flights that have departed")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    Path("archive_bench.db").unlink(missing_ok=True)
+    engine = create_engine("sqlite:///archive_bench.db")
+    populate(engine, args.bookings, args.users, args.past_share)
+    Session = sessionmaker(bind=engine)
+
+    for label in ("before", "after"):
+        if label == "after":
+            started = time.perf_counter()
+            with Session() as db:
+                result = archive.archive_bookings(db)
+            print(f"archived {result.archived} bookings in {result.chunks} chunks in {time.perf_counter() - started:.1f}s")
+        p50, p99, scan, active, rows = timed(Session, args.queries, args.users, random.Random(7))
+        print(f"{label:6}  bookings rows {rows:>9}  get_bookings p50 {p50 * 1e3:.3f} ms  p99 {p99 * 1e3:.3f} ms"
+              f"  active scan {scan * 1e3:.1f} ms ({active} active)")
+
+
+if __name__ == "__main__":
+    main()
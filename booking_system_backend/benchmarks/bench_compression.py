@@ -0,0 +1,71 @@
+"""Size and CPU cost of each encoding and level on a GET /flights payload.
+
+Usage:
+    python benchmarks/bench_compression.py --flights 1000
+
+Use it to pick GALAXIUM_GZIP_LEVEL, GALAXIUM_BROTLI_QUALITY and
+GALAXIUM_ZSTD_LEVEL: past a certain level the size barely shrinks while
+compression time keeps growing.
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compression import brotli, zstandard
+
+LEVELS = {
+    "gzip": (lambda level: lambda body: gzip.compress(body, compresslevel=level, mtime=0), [1, 6, 9]),
+}
+if brotli is not None:
+    LEVELS["br"] = (lambda level: lambda body: brotli.compress(body, quality=level), [1, 5, 11])
+if zstandard is not None:
+    LEVELS["zstd"] = (lambda level: zstandard.ZstdCompressor(level=level).compress, [1, 3, 10, 19])
+
+
+def payload(flights):
+    places = ["Earth", "Moon", "Mars", "Venus", "Jupiter", "Europa", "Pluto"]
+    rows = []
+    for i in range(1, flights + 1):
+        base_price = 500000 + i * 1000
+        rows.append({
+            "flight_id": i,
+            "origin": places[i % len(places)],
+            "destination": places[(i * 3 + 1) % len(places)],
+            "departure_time": f"2099-01-{i % 28 + 1:02d}T09:00:00Z",
+            "arrival_time": f"2099-01-{i % 28 + 1:02d}T17:00:00Z",
+            "base_price": base_price,
+            "economy_seats_available": i % 7,
+            "business_seats_available": i % 4,
+            "galaxium_seats_available": i % 2,
+            "economy_price": base_price,
+            "business_price": int(base_price * 2.5),
+            "galaxium_price": base_price * 5,
+        })
+    return json.dumps(rows).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    body = payload(args.flights)
+    print(f"identity {len(body):>10} bytes")
+    for name, (make, levels) in LEVELS.items():
+        for level in levels:
+            encode = make(level)
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                compressed = encode(body)
+            elapsed = (time.perf_counter() - started) / args.repeat
+            print(f"{name:<5} {level:>2} {len(compressed):>10} bytes  {len(body) / len(compressed):5.1f}x  {elapsed * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Booking cost with no event log, a synchronous audit INSERT, and the batched event log.
+
+Usage (from a scratch directory, which gets its own database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_event_log.py --bookings 5000
+
+Books seats one at a time through services.booking.book_flight. The
+synchronous variant adds a BookingEvent row to every booking's own
+transaction; the batched variant runs event_log.EventLog.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from event_log import event_log
+from models import Base, BookingEvent, Flight, User
+from services import booking
+
+
+def fresh_database(path):
+    Path(path).unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    db = sessionmaker(bind=engine)()
+    db.add(User(name="Bench User", email="bench@example.com"))
+    db.add(Flight(origin="Earth", destination="Mars", departure_time="2099-01-01T09:00:00Z",
+                  arrival_time="2099-01-01T17:00:00Z", base_price=1000000,
+                  economy_seats_available=10 ** 6, business_seats_available=0, galaxium_seats_available=0))
+    db.commit()
+    return engine, db
+
+
+def synchronous_audit(session, flush_context, instances):
+    for obj in list(session.new):
+        if obj.__class__.__name__ == "Booking":
+            session.add(BookingEvent(kind="booked", booking_id=0, user_id=obj.user_id, flight_id=obj.flight_id,
+                                     seat_class=obj.seat_class, status=obj.status, price_paid=obj.price_paid,
+                                     recorded_at=obj.booking_time))
+
+
+def run(label, bookings, rounds, setup=None, teardown=None):
+    rates = []
+    for _ in range(rounds):
+        engine, db = fresh_database(f"{label}.db")
+        if setup:
+            setup(engine)
+        started = time.perf_counter()
+        for _ in range(bookings):
+            booking.book_flight(db, 1, "Bench User", 1)
+        if teardown:
+            teardown()
+        rates.append(bookings / (time.perf_counter() - started))
+        logged = db.query(BookingEvent).count()
+        db.close()
+    print(f"{label:12} best {max(rates):6.0f}  median {sorted(rates)[len(rates) // 2]:6.0f} bookings/s  ({logged} events)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    run("no_log", args.bookings, args.rounds)
+    event.listen(Session, "before_flush", synchronous_audit)
+    run("synchronous", args.bookings, args.rounds)
+    event.remove(Session, "before_flush", synchronous_audit)
+    run("batched", args.bookings, args.rounds, setup=event_log.start, teardown=event_log.stop)
+
+
+if __name__ == "__main__":
+    main()
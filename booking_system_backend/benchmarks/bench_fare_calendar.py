@@ -0,0 +1,119 @@
+"""Cheapest fare per day for a month of one route: fare calendar versus scanning.
+
+Usage (from a scratch directory, which gets its own flights database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_fare_calendar.py --flights 1000000
+
+Compares answering "cheapest economy fare per day over 31 days" by
+searching the route's flights in the inventory snapshot and taking each
+day's minimum (what an agent does with list_flights, minus the download)
+with a fare calendar lookup. Also times building the calendar and keeping
+it current while seats sell out and are released again.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from fares import DAY, FareCalendar, fare_calendar, to_day
+from inventory import inventory, to_epoch
+from models import Base, Flight
+
+PLACES = ["Earth", "Moon", "Mars", "Venus", "Jupiter", "Europa", "Pluto", "Titan"]
+START = datetime(2099, 1, 1)
+
+
+def populate(engine, flights):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        rows = []
+        for _ in range(flights):
+            origin, destination = rng.sample(PLACES, 2)
+            departure = START + timedelta(hours=rng.randrange(24 * 365))
+            rows.append({
+                "origin": origin,
+                "destination": destination,
+                "departure_time": departure.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "arrival_time": (departure + timedelta(hours=8)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "base_price": rng.randrange(500000, 5000000),
+                "economy_seats_available": rng.choice([0, 1, 60]),
+                "business_seats_available": 30,
+                "galaxium_seats_available": 10,
+            })
+            if len(rows) == 50000:
+                conn.execute(insert(Flight), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Flight), rows)
+
+
+def per_call(label, func, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / calls * 1e6:9.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--days", type=int, default=31)
+    args = parser.parse_args()
+
+    Path("fares_bench.db").unlink(missing_ok=True)
+    engine = create_engine("sqlite:///fares_bench.db")
+    populate(engine, args.flights)
+    db = sessionmaker(bind=engine)()
+    snapshot = inventory.get(db)
+
+    started = time.perf_counter()
+    FareCalendar.build(snapshot)
+    print(f"{'calendar build':<28} {time.perf_counter() - started:9.2f} s")
+
+    rng = random.Random(7)
+    queries = []
+    for _ in range(args.queries):
+        origin, destination = rng.sample(PLACES, 2)
+        queries.append((origin, destination, to_day(to_epoch((START + timedelta(days=rng.randrange(330))).isoformat()))))
+
+    def scan(i):
+        origin, destination, first_day = queries[i]
+        cheapest = {}
+        after = first_day * DAY
+        for pos in snapshot.find(origin, destination, after, after + args.days * DAY - 1, "economy"):
+            day = to_day(snapshot.departures[pos])
+            fare = (snapshot.price(pos, "economy"), snapshot.flight_ids[pos])
+            if day not in cheapest or fare < cheapest[day]:
+                cheapest[day] = fare
+        return sorted(cheapest.items())
+
+    def lookup(i):
+        origin, destination, first_day = queries[i]
+        return fare_calendar.cheapest(db, origin, destination, "economy", first_day, args.days)
+
+    lookup(0)  # Build and install the calendar outside the timing
+    assert [(d, p, f) for d, (p, f) in scan(0)] == lookup(0)
+    per_call(f"snapshot scan ({args.days} days)", scan, args.queries)
+    per_call(f"calendar lookup ({args.days} days)", lookup, args.queries)
+
+    ids = [rng.randrange(1, args.flights + 1) for _ in range(args.queries)]
+
+    def sell_out_and_release(i):
+        for economy in (0, 1):
+            inventory.apply_seats([{"flight_id": ids[i], "economy_seats_available": economy,
+                                    "business_seats_available": 30, "galaxium_seats_available": 10}])
+
+    per_call("seat update + calendar x2", sell_out_and_release, args.queries)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Booking throughput and latency with and without group commit.
+
+Usage (from a scratch directory, which gets its own booking.db):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_group_commit.py --bookings 2000 --clients 32
+
+Each client thread books economy seats on a flight with enough capacity for
+every request, either calling book_flight directly (one commit per booking)
+or through the write-behind queue (one commit per batch).
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import SessionLocal, engine, init_db
+from models import Base, Flight, User
+from services.booking import book_flight
+from services.booking_queue import BookingQueue
+
+
+def reset(bookings):
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    db = SessionLocal()
+    db.add(User(name="Bench", email="bench@example.com"))
+    db.add(Flight(
+        origin="Earth", destination="Mars",
+        departure_time="2099-01-01T09:00:00Z", arrival_time="2099-01-01T17:00:00Z",
+        base_price=1000000, economy_seats_available=bookings,
+        business_seats_available=0, galaxium_seats_available=0,
+    ))
+    db.commit()
+    db.close()
+
+
+def direct(_):
+    db = SessionLocal()
+    try:
+        return book_flight(db, 1, "Bench", 1)
+    finally:
+        db.close()
+
+
+def run(label, book, bookings, clients):
+    def timed(i):
+        started = time.perf_counter()
+        book(i)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = sorted(pool.map(timed, range(bookings)))
+    elapsed = time.perf_counter() - started
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<16} {bookings / elapsed:8.0f} bookings/s  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--max-delay-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    reset(args.bookings)
+    run("direct", direct, args.bookings, args.clients)
+
+    reset(args.bookings)
+    queue = BookingQueue(max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000)
+    queue.start(SessionLocal)
+    try:
+        run("group commit", lambda _: queue.book(1, "Bench", 1), args.bookings, args.clients)
+    finally:
+        queue.stop()
+
+
+if __name__ == "__main__":
+    main()
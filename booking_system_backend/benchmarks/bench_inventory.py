@@ -0,0 +1,141 @@
+"""Memory and latency of the inventory snapshot versus ORM reads.
+
+Usage (from a scratch directory, which gets its own flights database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_inventory.py --flights 1000000
+
+Compares loading the whole catalogue as ORM objects with building the
+snapshot (time and retained memory), a route + date-window search through
+the ORM and through the snapshot, and the cost of a copy-on-write seat update.
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from inventory import InventorySnapshot, to_epoch
+from models import Base, Flight
+
+PLACES = ["Earth", "Moon", "Mars", "Venus", "Jupiter", "Europa", "Pluto", "Titan"]
+START = datetime(2099, 1, 1)
+
+
+def populate(engine, flights):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        rows = []
+        for _ in range(flights):
+            origin, destination = rng.sample(PLACES, 2)
+            departure = START + timedelta(hours=rng.randrange(24 * 365))
+            rows.append({
+                "origin": origin,
+                "destination": destination,
+                "departure_time": departure.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "arrival_time": (departure + timedelta(hours=8)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "base_price": rng.randrange(500000, 5000000),
+                "economy_seats_available": 60,
+                "business_seats_available": 30,
+                "galaxium_seats_available": 10,
+            })
+            if len(rows) == 50000:
+                conn.execute(insert(Flight), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Flight), rows)
+
+
+def measure(label, load):
+    gc.collect()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:7.2f} s  {retained / 2 ** 20:8.1f} MiB retained")
+    return result
+
+
+def per_call(label, func, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / calls * 1e6:9.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    Path("inventory_bench.db").unlink(missing_ok=True)
+    engine = create_engine("sqlite:///inventory_bench.db")
+    populate(engine, args.flights)
+    Session = sessionmaker(bind=engine)
+    columns = (
+        Flight.flight_id, Flight.origin, Flight.destination, Flight.departure_time, Flight.arrival_time,
+        Flight.base_price, Flight.economy_seats_available, Flight.business_seats_available,
+        Flight.galaxium_seats_available,
+    )
+
+    def orm_load():
+        with Session() as db:
+            flights = db.query(Flight).all()
+            db.expunge_all()
+            return flights
+
+    def snapshot_load():
+        with Session() as db:
+            return InventorySnapshot.build(tuple(row) for row in db.execute(select(*columns)))
+
+    measure("ORM objects", orm_load)
+    snapshot = measure("snapshot", snapshot_load)
+    print(f"{'snapshot arrays':<28} {snapshot.nbytes() / 2 ** 20:18.1f} MiB")
+
+    rng = random.Random(7)
+    searches = []
+    for _ in range(args.queries):
+        origin, destination = rng.sample(PLACES, 2)
+        day = START + timedelta(days=rng.randrange(360))
+        searches.append((origin, destination, day.strftime("%Y-%m-%dT%H:%M:%SZ"), (day + timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")))
+
+    db = Session()
+
+    def orm_search(i):
+        origin, destination, after, before = searches[i]
+        db.query(Flight).filter(
+            Flight.origin == origin, Flight.destination == destination,
+            Flight.departure_time >= after, Flight.departure_time <= before,
+        ).order_by(Flight.departure_time).all()
+
+    def snapshot_search(i):
+        origin, destination, after, before = searches[i]
+        for pos in snapshot.find(origin, destination, to_epoch(after), to_epoch(before)):
+            snapshot.flight(pos)
+
+    per_call("ORM route+date search", orm_search, args.queries)
+    per_call("snapshot route+date search", snapshot_search, args.queries)
+    db.close()
+
+    ids = [rng.randrange(1, args.flights + 1) for _ in range(args.queries)]
+    per_call("snapshot seat update (COW)", lambda i: snapshot.with_seats([{
+        "flight_id": ids[i], "economy_seats_available": 59,
+        "business_seats_available": 30, "galaxium_seats_available": 10,
+    }]), args.queries)
+
+
+if __name__ == "__main__":
+    main()
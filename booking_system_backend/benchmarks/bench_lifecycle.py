@@ -0,0 +1,100 @@
+"""Throughput of the booking lifecycle job and booking latency while it runs.
+
+Usage (from a scratch directory, which gets its own bookings database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_lifecycle.py --bookings 2000000
+
+Fills the database with landed flights and their `booked` bookings, then
+runs services.lifecycle in one thread while another keeps booking seats on
+an upcoming flight, and reports bookings completed per second alongside the
+booking latencies (p50, p99, max) seen during the run.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, Booking, Flight, User
+from services import booking, lifecycle
+
+START = datetime(2000, 1, 1)
+
+
+def populate(engine, flights, bookings):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.execute(insert(User), [{"name": "Bench User", "email": "bench@example.com"}])
+        rows = []
+        for i in range(flights + 1):
+            departure = START + timedelta(hours=i) if i < flights else datetime(2099, 1, 1)
+            rows.append({
+                "origin": "Earth",
+                "destination": "Mars",
+                "departure_time": departure.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "arrival_time": (departure + timedelta(hours=8)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "base_price": 1000000,
+                "economy_seats_available": 10 ** 6,
+                "business_seats_available": 0,
+                "galaxium_seats_available": 0,
+            })
+        conn.execute(insert(Flight), rows)
+        rows = []
+        for i in range(bookings):
+            rows.append({
+                "user_id": 1,
+                "flight_id": i % flights + 1,
+                "status": "booked",
+                "booking_time": "1999-12-01T00:00:00",
+                "seat_class": "economy",
+                "price_paid": 1000000,
+            })
+            if len(rows) == 100000:
+                conn.execute(insert(Booking), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Booking), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=2000000)
+    parser.add_argument("--flights", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=lifecycle.LIFECYCLE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    Path("lifecycle_bench.db").unlink(missing_ok=True)
+    engine = create_engine("sqlite:///lifecycle_bench.db", connect_args={"timeout": 30})
+    populate(engine, args.flights, args.bookings)
+    Session = sessionmaker(bind=engine)
+
+    job = Session()
+    result = []
+    runner = threading.Thread(target=lambda: result.append(lifecycle.complete_landed_bookings(job, chunk_size=args.chunk_size)))
+    started = time.perf_counter()
+    runner.start()
+    latencies = []
+    with Session() as db:
+        while runner.is_alive():
+            booked = time.perf_counter()
+            booking.book_flight(db, 1, "Bench User", args.flights + 1)
+            latencies.append(time.perf_counter() - booked)
+    runner.join()
+    elapsed = time.perf_counter() - started
+    job.close()
+
+    latencies.sort()
+    print(f"completed {result[0].completed} bookings in {result[0].chunks} chunks in {elapsed:.1f}s "
+          f"({result[0].completed / elapsed:,.0f}/s)")
+    print(f"{len(latencies)} concurrent bookings: p50 {statistics.median(latencies) * 1e3:.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.1f} ms  max {latencies[-1] * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
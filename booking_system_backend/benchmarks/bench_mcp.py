@@ -0,0 +1,55 @@
+"""MCP tool-call throughput, for the success and the structured-error paths.
+
+Usage (from a scratch directory, which gets its own seeded booking.db):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_mcp.py --calls 2000
+
+Calls go through an in-process FastMCP client, so the numbers isolate tool
+dispatch, session handling and serialization from network overhead.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastmcp import Client
+import metrics
+from db import init_db
+from mcp_tools import mcp
+from seed import seed
+
+CASES = {
+    "list_flights": ("list_flights", {}),
+    "get_user_id": ("get_user_id", {"name": "Alice", "email": "alice@example.com"}),
+    "book_flight (NAME_MISMATCH)": ("book_flight", {"user_id": 1, "name": "Mallory", "flight_id": 1}),
+    "cancel_booking (BOOKING_NOT_FOUND)": ("cancel_booking", {"booking_id": 10 ** 9}),
+}
+
+
+async def run(calls):
+    async with Client(mcp) as client:
+        for label, (tool, arguments) in CASES.items():
+            started = time.perf_counter()
+            for _ in range(calls):
+                await client.call_tool(tool, arguments, raise_on_error=False)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<36} {calls / elapsed:8.0f} calls/s  {elapsed / calls * 1000:6.2f} ms/call")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    args = parser.parse_args()
+
+    init_db()
+    seed()
+    asyncio.run(run(args.calls))
+    print()
+    for name, timing in sorted(metrics.snapshot()["timings"].items()):
+        print(f"{name:<36} avg {timing['avg_ms']:.3f} ms  max {timing['max_ms']:.3f} ms (inside tool)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Time a full seat counter reconciliation pass.
+
+Usage (from a scratch directory, which gets its own database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_reconcile.py --flights 100000 --bookings 1000000
+
+Fills the database with flights and bookings whose counters agree, skews
+a few counters, then times a report-only pass and a repairing pass at
+several batch sizes.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+from models import Base, Booking, Flight, User
+from services import reconcile
+
+CLASSES = ["economy", "business", "galaxium"]
+
+
+def populate(engine, flights, bookings):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    held = {}
+    rows = []
+    for _ in range(bookings):
+        key = (rng.randrange(1, flights + 1), rng.choices(CLASSES, weights=[6, 3, 1])[0])
+        status = rng.choice(["booked", "booked", "completed", "cancelled"])
+        if status != "cancelled":
+            held[key] = held.get(key, 0) + 1
+        rows.append({"user_id": 1, "flight_id": key[0], "status": status, "booking_time": "2099-01-01T00:00:00",
+                     "seat_class": key[1], "price_paid": 1000000})
+    capacity = {"economy": 60, "business": 30, "galaxium": 10}
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": "Bench User", "email": "bench@example.com"}])
+        conn.execute(insert(Flight), [{
+            "origin": "Earth",
+            "destination": "Mars",
+            "departure_time": "2099-01-01T09:00:00Z",
+            "arrival_time": "2099-01-01T17:00:00Z",
+            "base_price": 1000000,
+            **{f"{c}_seats_total": capacity[c] + 50 for c in CLASSES},
+            **{f"{c}_seats_available": capacity[c] + 50 - held.get((i, c), 0) for c in CLASSES},
+        } for i in range(1, flights + 1)])
+        for start in range(0, len(rows), 100000):
+            conn.execute(insert(Booking), rows[start:start + 100000])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=100000)
+    parser.add_argument("--bookings", type=int, default=1000000)
+    parser.add_argument("--drift", type=int, default=100, help="Counters to skew before the passes")
+    args = parser.parse_args()
+
+    Path("reconcile_bench.db").unlink(missing_ok=True)
+    engine = create_engine("sqlite:///reconcile_bench.db")
+    populate(engine, args.flights, args.bookings)
+    Session = sessionmaker(bind=engine)
+
+    for batch_size in (1000, 5000, 20000):
+        with Session() as db:
+            for flight_id in random.Random(batch_size).sample(range(1, args.flights + 1), args.drift):
+                db.execute(update(Flight).where(Flight.flight_id == flight_id)
+                           .values(economy_seats_available=Flight.economy_seats_available - 1))
+            db.commit()
+            for repair in (False, True):
+                started = time.perf_counter()
+                result = reconcile.reconcile_seats(db, repair=repair, batch_size=batch_size)
+                elapsed = time.perf_counter() - started
+                print(f"batch {batch_size:>6}  {'repair' if repair else 'report'}  {result.flights_checked} flights "
+                      f"in {elapsed:.2f}s  drift {len(result.drift)}  repaired {result.repaired}")
+
+
+if __name__ == "__main__":
+    main()
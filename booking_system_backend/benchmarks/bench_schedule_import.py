@@ -0,0 +1,83 @@
+"""Time ingesting a large flight schedule.
+
+Usage (from a scratch directory, which gets its own database):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_schedule_import.py --flights 500000
+
+Writes a CSV schedule of `--flights` rows, imports it into an empty
+database (all inserts), then books seats on some flights and imports the
+same schedule again with new prices (all updates, some with seats kept).
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from models import Base, Booking, User
+from services import schedule
+
+PLACES = ["Earth", "Moon", "Mars", "Venus", "Jupiter", "Europa", "Pluto", "Titan"]
+START = datetime(2099, 1, 1)
+
+
+def write_schedule(path, flights, price_factor=1.0):
+    rng = random.Random(42)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(schedule.SCHEDULE_FIELDS)
+        for i in range(flights):
+            origin, destination = rng.sample(PLACES, 2)
+            # Unique per row: each minute of the season has at most one departure per route
+            departure = START + timedelta(minutes=i)
+            writer.writerow([
+                origin, destination,
+                departure.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                (departure + timedelta(hours=rng.randrange(2, 30))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                int(rng.randrange(500000, 5000000) * price_factor),
+                rng.choice([10, 100, 300]),
+            ])
+
+
+def run(Session, path, chunk_size):
+    with Session() as db, open(path, "rb") as f:
+        started = time.perf_counter()
+        result = schedule.import_schedule(db, schedule.read_schedule_bytes(f), chunk_size)
+        elapsed = time.perf_counter() - started
+    print(f"created {result.created:>7}  updated {result.updated:>7}  seats kept {result.seats_preserved:>5}  "
+          f"failed {result.failed}  in {elapsed:6.1f}s  ({(result.created + result.updated) / elapsed:,.0f} rows/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=500000)
+    parser.add_argument("--chunk-size", type=int, default=schedule.SCHEDULE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    Path("schedule_bench.db").unlink(missing_ok=True)
+    engine = create_engine("sqlite:///schedule_bench.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    Session = sessionmaker(bind=engine)
+
+    write_schedule("schedule.csv", args.flights)
+    run(Session, "schedule.csv", args.chunk_size)
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": "Bench User", "email": "bench@example.com"}])
+        conn.execute(insert(Booking), [{
+            "user_id": 1, "flight_id": flight_id, "status": "booked", "booking_time": "2099-01-01T00:00:00",
+            "seat_class": "economy", "price_paid": 1000000,
+        } for flight_id in range(1, args.flights + 1, 100)])
+    write_schedule("schedule.csv", args.flights, price_factor=1.1)
+    run(Session, "schedule.csv", args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Fan-out of seat availability updates to many subscribers in one process.
+
+Usage:
+    python benchmarks/bench_seat_stream.py --subscribers 10000 --bursts 20 --burst-size 500
+
+Each burst simulates `--burst-size` commits spread over `--flights` flights,
+published from a worker thread as services do. Reports how long it takes
+until every subscriber has received the coalesced batch, and how many
+updates were coalesced away.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metrics
+from live_updates import SeatBroadcaster
+
+
+async def run(args):
+    broadcaster = SeatBroadcaster(interval=args.interval)
+    await broadcaster.start()
+    received = 0
+    all_received = asyncio.Event()
+
+    async def consume(subscriber):
+        nonlocal received
+        while True:
+            await subscriber.next_batch()
+            received += 1
+            if received == args.subscribers:
+                all_received.set()
+
+    tasks = [asyncio.create_task(consume(broadcaster.subscribe())) for _ in range(args.subscribers)]
+    await asyncio.sleep(0)
+
+    latencies = []
+    for _ in range(args.bursts):
+        received = 0
+        all_received.clear()
+        updates = [
+            {'flight_id': random.randrange(args.flights), 'economy_seats_available': random.randrange(60)}
+            for _ in range(args.burst_size)
+        ]
+        started = time.perf_counter()
+        thread = threading.Thread(target=lambda: [broadcaster.publish([u]) for u in updates])
+        thread.start()
+        await all_received.wait()
+        latencies.append(time.perf_counter() - started)
+        thread.join()
+
+    for task in tasks:
+        task.cancel()
+    await broadcaster.stop()
+
+    latencies.sort()
+    counters = metrics.snapshot()['counters']
+    print(f"subscribers={args.subscribers} bursts={args.bursts} burst_size={args.burst_size} flights={args.flights}")
+    print(f"burst -> all subscribers delivered: median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"max {latencies[-1] * 1000:.1f} ms (includes {args.interval * 1000:.0f} ms coalescing window)")
+    print(f"updates published: {args.bursts * args.burst_size}, flight states sent per subscriber: "
+          f"{counters.get('seat_updates_sent', 0)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=500)
+    parser.add_argument("--flights", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
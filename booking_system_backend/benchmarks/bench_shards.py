@@ -0,0 +1,79 @@
+"""Booking throughput with the inventory split over 1..N SQLite shards.
+
+Usage (from a scratch directory; shard files are created in it):
+    cd $(mktemp -d) && python /path/to/benchmarks/bench_shards.py --shards 1 2 4 --clients 16
+
+Every client thread books random flights through its own session. SQLite
+admits one writer per database file, so bookings for flights on different
+shards commit in parallel instead of queueing on a single write lock.
+"""
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine
+from db import ShardRouter
+from models import Base, Flight, User
+from services.booking import book_flight
+
+
+def make_engine(path):
+    Path(path).unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    return engine
+
+
+def run(shards, flights, bookings, clients):
+    router = ShardRouter(make_engine("global.db"), [make_engine(f"shard{i}.db") for i in range(shards)])
+    Session = router.sessionmaker()
+    db = Session()
+    db.add(User(name="Bench", email="bench@example.com"))
+    for i in range(flights):
+        db.add(Flight(
+            origin=f"Port {i}", destination="Mars",
+            departure_time="2099-01-01T09:00:00Z", arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000, economy_seats_available=bookings,
+            business_seats_available=0, galaxium_seats_available=0,
+        ))
+    db.commit()
+    flight_ids = [f.flight_id for f in db.query(Flight).all()]
+    db.close()
+
+    def book(_):
+        session = Session()
+        try:
+            return book_flight(session, 1, "Bench", random.choice(flight_ids))
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(book, range(bookings)))
+    elapsed = time.perf_counter() - started
+    print(f"{shards} shard(s)  {bookings / elapsed:8.0f} bookings/s")
+    for engine in router.engines.values():
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--flights", type=int, default=64)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    args = parser.parse_args()
+
+    for shards in args.shards:
+        run(shards, args.flights, args.bookings, args.clients)
+
+
+if __name__ == "__main__":
+    main()
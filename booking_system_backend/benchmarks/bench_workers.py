@@ -0,0 +1,84 @@
+"""Throughput of GET /flights with 1..N server worker processes.
+
+Usage:
+    python benchmarks/bench_workers.py --workers 1 2 4 --clients 16 --seconds 5
+
+Each run starts `server.py --workers N` in a scratch directory (so it gets
+its own freshly seeded booking.db) and drives it from `--clients` client
+processes with keep-alive connections.
+"""
+import argparse
+import multiprocessing
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+SERVER = Path(__file__).resolve().parent.parent / "server.py"
+
+
+def _client(url, seconds, counts, index):
+    done = 0
+    deadline = time.perf_counter() + seconds
+    with httpx.Client() as client:
+        while time.perf_counter() < deadline:
+            client.get(url).raise_for_status()
+            done += 1
+    counts[index] = done
+
+
+def _wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run(workers, clients, seconds, port):
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.Popen(
+            [sys.executable, str(SERVER), "--workers", str(workers), "--port", str(port)],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            _wait_until_up(base + "/")
+            counts = multiprocessing.Array("l", clients)
+            procs = [
+                multiprocessing.Process(target=_client, args=(base + "/flights", seconds, counts, i))
+                for i in range(clients)
+            ]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            return sum(counts) / seconds
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8181)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        rps = run(workers, args.clients, args.seconds, args.port)
+        baseline = baseline or rps / workers
+        print(f"workers={workers:<3} {rps:9.0f} req/s  scaling={rps / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Replay or compact the booking event log.
+
+Usage:
+    python booking_events.py replay                    # Totals per flight and seat class as NDJSON
+    python booking_events.py replay --apply-seats      # Also rebuild the seat counters from the log
+    python booking_events.py compact --output events-2099-01.ndjson.gz
+    python booking_events.py compact --before 2099-02-01T00:00:00
+
+Rebuild seat counters only while the server is stopped; events still in
+a running server's queue are not in the log yet.
+"""
+import argparse
+import sys
+import time
+
+from db import SessionLocal, init_db
+from services import events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay or compact the booking event log.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="Fold the log into per flight and class totals")
+    replay.add_argument("--apply-seats", action="store_true", help="Set seat counters to capacity minus seats held")
+    compact = commands.add_parser("compact", help="Fold old events into checkpoints and delete them")
+    compact.add_argument("--before", help="Compact events recorded before this time (default: the retention period ago)")
+    compact.add_argument("--output", help="Append the compacted events to this gzipped NDJSON file first")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        if args.command == "replay":
+            result = events.replay_events(db, args.apply_seats)
+            for activity in result.flights:
+                print(activity.model_dump_json())
+            summary = f"Replayed {result.events} events through seq {result.last_seq}"
+            if args.apply_seats:
+                summary += f", rebuilt seat counters of {result.counters_updated} flights"
+        else:
+            result = events.compact_events(db, args.before, args.output)
+            summary = f"Compacted {result.compacted} events through seq {result.through_seq}"
+    finally:
+        db.close()
+    print(f"{summary} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Mark bookings of flights that have landed as completed.
+
+Usage:
+    python complete_bookings.py
+    python complete_bookings.py --landed-before 2099-01-05T00:00:00Z --chunk-size 500
+
+Updates one chunk of flights per transaction, so it is safe to run while
+the server is up, and to re-run.
+"""
+import argparse
+import sys
+import time
+
+from db import SessionLocal, init_db
+from services import lifecycle
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Complete bookings of landed flights.")
+    parser.add_argument("--landed-before", help="Complete bookings of flights arriving before this time (default: now)")
+    parser.add_argument("--chunk-size", type=int, default=lifecycle.LIFECYCLE_CHUNK_SIZE, help="Flights per transaction")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        result = lifecycle.complete_landed_bookings(db, args.landed_before, args.chunk_size)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print(f"Completed {result.completed} bookings in {result.chunks} chunks in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Response compression with Accept-Encoding negotiation.
+
+`CompressionMiddleware` compresses complete (non-streaming) responses of at
+least `minimum_size` bytes. It picks the best encoding that both sides
+support, in server preference order zstd, br, gzip; zstd needs the optional
+`zstandard` package and br the optional `brotli` package. Streaming
+responses (SSE, exports) and already-encoded responses pass through
+untouched.
+
+An ETag on a compressed response gets an encoding suffix (`"v-gzip"`), so
+every representation has its own strong tag; `versions.etag_matches`
+strips the suffix again when checking If-None-Match.
+"""
+import gzip
+from typing import Callable, Optional
+
+try:
+    import brotli
+except ImportError:  # br is optional; gzip always works
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip always works
+    zstandard = None
+
+import config
+import metrics
+
+
+def available_encoders() -> dict[str, Callable[[bytes], bytes]]:
+    """Encoders installed on this server, most preferred first."""
+    encoders = {}
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=config.ZSTD_LEVEL)
+        encoders['zstd'] = compressor.compress
+    if brotli is not None:
+        encoders['br'] = lambda body: brotli.compress(body, quality=config.BROTLI_QUALITY)
+    encoders['gzip'] = lambda body: gzip.compress(body, compresslevel=config.GZIP_LEVEL, mtime=0)
+    return encoders
+
+
+def negotiate(accept_encoding: str, encodings) -> Optional[str]:
+    """The first of `encodings` the client accepts (q > 0), or None for identity."""
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = config.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.encoders = available_encoders()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get('headers') or ())
+        encoding = negotiate(headers.get(b'accept-encoding', b'').decode('latin-1'), self.encoders)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message['type'] == 'http.response.start':
+                response_headers = dict(message.get('headers') or ())
+                if b'content-encoding' in response_headers or response_headers.get(b'content-type', b'').startswith(b'text/event-stream'):
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if message['type'] != 'http.response.body':
+                return await send(message)
+
+            body = message.get('body', b'')
+            if message.get('more_body') or len(body) < self.minimum_size:
+                # Streaming or small: send as is
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            compressed = self.encoders[encoding](body)
+            metrics.incr(f'compression.{encoding}')
+            metrics.incr('compression.bytes_saved', len(body) - len(compressed))
+            response_headers = [
+                (k, v) for k, v in start.get('headers', ())
+                if k not in (b'content-length', b'etag', b'vary')
+            ]
+            original = dict(start.get('headers', ()))
+            vary = original.get(b'vary')
+            response_headers += [
+                (b'content-encoding', encoding.encode()),
+                (b'content-length', str(len(compressed)).encode()),
+                (b'vary', vary + b', Accept-Encoding' if vary else b'Accept-Encoding'),
+            ]
+            etag = original.get(b'etag')
+            if etag is not None and etag.endswith(b'"'):
+                response_headers.append((b'etag', etag[:-1] + b'-' + encoding.encode() + b'"'))
+            await send({**start, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, send_compressed)
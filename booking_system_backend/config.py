@@ -0,0 +1,117 @@
+"""Runtime settings, read from environment variables (or a local .env file)."""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+HOST = os.getenv("GALAXIUM_HOST", "0.0.0.0")
+PORT = _env_int("GALAXIUM_PORT", 8080)
+
+# Number of server processes; >1 uses uvicorn's multi-process supervisor
+WORKERS = _env_int("GALAXIUM_WORKERS", 1)
+
+# Startup seeding: "if-empty" seeds demo data into an empty database, "always" wipes
+# and reseeds it, "never" leaves the database alone
+SEED_MODE = os.getenv("GALAXIUM_SEED", "if-empty")
+
+# MCP endpoint: "eager" builds it at startup, "lazy" defers importing FastMCP
+# until /mcp is first requested, "off" disables it
+MCP_MODE = os.getenv("GALAXIUM_MCP", "eager")
+
+# Seconds between checks of the shared invalidation log; 0 disables cross-process cache sync
+CACHE_SYNC_INTERVAL = _env_float("GALAXIUM_CACHE_SYNC_INTERVAL", 0.2)
+# Seconds between deletions of old invalidation log rows
+CACHE_PRUNE_INTERVAL = _env_float("GALAXIUM_CACHE_PRUNE_INTERVAL", 60)
+# Seconds after which the flight inventory snapshot is reloaded even if no change was seen; 0: never
+INVENTORY_MAX_AGE = _env_float("GALAXIUM_INVENTORY_MAX_AGE", 60)
+
+# Route bookings through the write-behind queue, committing them in groups of
+# up to GROUP_COMMIT_MAX_BATCH or every GROUP_COMMIT_MAX_DELAY_MS milliseconds
+BOOKING_PIPELINE = os.getenv("GALAXIUM_BOOKING_PIPELINE", "0") == "1"
+GROUP_COMMIT_MAX_BATCH = _env_int("GALAXIUM_GROUP_COMMIT_MAX_BATCH", 100)
+GROUP_COMMIT_MAX_DELAY_MS = _env_float("GALAXIUM_GROUP_COMMIT_MAX_DELAY_MS", 5)
+
+# Comma-separated database URLs for inventory shards. When set, flights, bookings and
+# waitlist entries are partitioned across them by flight; users stay in booking.db
+SHARDS = [url.strip() for url in os.getenv("GALAXIUM_SHARDS", "").split(",") if url.strip()]
+
+# Comma-separated database URLs of read replicas for the listing endpoints, refreshed
+# from booking.db every REPLICA_REFRESH_INTERVAL seconds (not combined with SHARDS)
+READ_REPLICAS = [url.strip() for url in os.getenv("GALAXIUM_READ_REPLICAS", "").split(",") if url.strip()]
+REPLICA_REFRESH_INTERVAL = _env_float("GALAXIUM_REPLICA_REFRESH_INTERVAL", 1.0)
+
+# Admission control: requests per second (and burst) allowed per MCP session, API key
+# or IP address (0 disables), and the number of writes allowed in flight at once, with
+# a bounded queue of WRITE_QUEUE_SIZE waiting at most WRITE_QUEUE_TIMEOUT seconds (0 disables)
+RATE_LIMIT_RPS = _env_float("GALAXIUM_RATE_LIMIT_RPS", 0)
+RATE_LIMIT_BURST = _env_int("GALAXIUM_RATE_LIMIT_BURST", 20)
+# All clients behind one IP address together get this many times the per-client rate and burst
+RATE_LIMIT_IP_FACTOR = _env_float("GALAXIUM_RATE_LIMIT_IP_FACTOR", 10)
+WRITE_CONCURRENCY = _env_int("GALAXIUM_WRITE_CONCURRENCY", 0)
+WRITE_QUEUE_SIZE = _env_int("GALAXIUM_WRITE_QUEUE_SIZE", 64)
+WRITE_QUEUE_TIMEOUT = _env_float("GALAXIUM_WRITE_QUEUE_TIMEOUT", 1.0)
+
+# Response compression: responses of at least COMPRESSION_MIN_SIZE bytes are encoded with
+# zstd, br or gzip (whichever the client accepts first); higher levels trade CPU for size
+COMPRESSION_MIN_SIZE = _env_int("GALAXIUM_COMPRESSION_MIN_SIZE", 1024)
+GZIP_LEVEL = _env_int("GALAXIUM_GZIP_LEVEL", 6)
+BROTLI_QUALITY = _env_int("GALAXIUM_BROTLI_QUALITY", 5)
+ZSTD_LEVEL = _env_int("GALAXIUM_ZSTD_LEVEL", 3)
+
+# Seconds between runs of the booking archival job in the server (0 disables; archive_bookings.py
+# runs it on demand)
+ARCHIVE_INTERVAL = _env_float("GALAXIUM_ARCHIVE_INTERVAL", 0)
+
+# Seconds between runs of the job marking bookings of landed flights completed (0 disables;
+# complete_bookings.py runs it on demand), flights per UPDATE, and the pause after each UPDATE
+# that lets bookings waiting for the write lock in
+LIFECYCLE_INTERVAL = _env_float("GALAXIUM_LIFECYCLE_INTERVAL", 0)
+LIFECYCLE_CHUNK_SIZE = _env_int("GALAXIUM_LIFECYCLE_CHUNK_SIZE", 50)
+LIFECYCLE_PAUSE = _env_float("GALAXIUM_LIFECYCLE_PAUSE", 0.01)
+
+# Seconds between seat counter reconciliation runs in the server (0 disables; reconcile_seats.py
+# runs it on demand), and whether those runs repair the drift they find or only report it
+RECONCILE_INTERVAL = _env_float("GALAXIUM_RECONCILE_INTERVAL", 0)
+RECONCILE_REPAIR = os.getenv("GALAXIUM_RECONCILE_REPAIR", "0") == "1"
+
+# Booking event log: "1" records every seat claim, release and status change in booking_events,
+# written in batches of up to EVENT_LOG_MAX_BATCH events or every EVENT_LOG_MAX_DELAY_MS. Events
+# older than EVENT_LOG_RETENTION_DAYS are compacted every EVENT_LOG_COMPACT_INTERVAL seconds
+# (0 keeps them forever)
+EVENT_LOG = os.getenv("GALAXIUM_EVENT_LOG", "0") == "1"
+EVENT_LOG_MAX_BATCH = _env_int("GALAXIUM_EVENT_LOG_MAX_BATCH", 500)
+EVENT_LOG_MAX_DELAY_MS = _env_float("GALAXIUM_EVENT_LOG_MAX_DELAY_MS", 50)
+EVENT_LOG_RETENTION_DAYS = _env_float("GALAXIUM_EVENT_LOG_RETENTION_DAYS", 30)
+EVENT_LOG_COMPACT_INTERVAL = _env_float("GALAXIUM_EVENT_LOG_COMPACT_INTERVAL", 3600)
+
+# Admin endpoints (/admin/*: profiling, memory diffs, slow request traces) are enabled only when
+# ADMIN_TOKEN is set, and require it in an X-Admin-Token or "Authorization: Bearer" header.
+# Requests slower than SLOW_REQUEST_MS are kept with their SQL statements, the latest
+# SLOW_REQUEST_TRACES per route (0 disables tracing)
+ADMIN_TOKEN = os.getenv("GALAXIUM_ADMIN_TOKEN", "")
+SLOW_REQUEST_MS = _env_float("GALAXIUM_SLOW_REQUEST_MS", 0)
+SLOW_REQUEST_TRACES = _env_int("GALAXIUM_SLOW_REQUEST_TRACES", 20)
+
+# Request deadlines: milliseconds a REST request or MCP tool call may take (0: no deadline),
+# overridden per route ("POST /book") or tool ("book_flight") by DEADLINES, e.g.
+# GALAXIUM_DEADLINES="POST /book=2000,book_flight=2000". Callers can set their own with the
+# X-Request-Timeout-Ms header or the tools' timeout_ms argument, up to MAX_DEADLINE_MS.
+# DB_BUSY_TIMEOUT_MS is how long SQLite statements wait for another writer's lock without one
+DEADLINE_MS = _env_float("GALAXIUM_DEADLINE_MS", 0)
+DEADLINES = {
+    key.strip(): float(ms)
+    for key, _, ms in (item.rpartition("=") for item in os.getenv("GALAXIUM_DEADLINES", "").split(","))
+    if key.strip()
+}
+MAX_DEADLINE_MS = _env_float("GALAXIUM_MAX_DEADLINE_MS", 60000)
+DB_BUSY_TIMEOUT_MS = _env_int("GALAXIUM_DB_BUSY_TIMEOUT_MS", 5000)
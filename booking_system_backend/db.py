@@ -1,22 +1,426 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base
+import itertools
+import logging
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, insert, inspect, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlalchemy.sql.util import find_tables
+import config
+import deadlines  # Installs the deadline hooks on every engine
+import metrics
+from models import Base, Booking, BookingChange, Flight, IdSequence, User, WaitlistEntry
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process only, no startup lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = 'sqlite:///./booking.db'
+STARTUP_LOCK_PATH = './booking.db.lock'
+
+GLOBAL_SHARD = 'global'
+SHARDED_TABLES = {'flights', 'bookings', 'bookings_archive', 'waitlist', 'booking_changes'}
+# Columns whose value identifies the shard of a row (see ShardRouter.shard_for_id)
+ROUTING_COLUMNS = {
+    ('flights', 'flight_id'),
+    ('bookings', 'flight_id'),
+    ('bookings', 'booking_id'),
+    ('bookings_archive', 'flight_id'),
+    ('bookings_archive', 'booking_id'),
+    ('waitlist', 'flight_id'),
+    ('waitlist', 'waitlist_id'),
+    ('booking_changes', 'flight_id'),
+    ('booking_changes', 'change_id'),
+}
+ID_BLOCK_SIZE = 1000
+
+
+class ShardRouter:
+    """Partition the flight inventory across several databases.
+
+    Users (and other global tables) stay on the `global` engine. A flight is
+    placed on a shard by hashing its route, so all flights of one route live
+    together, and its bookings and waitlist entries follow it. Ids of
+    sharded rows are drawn from global sequences and encode their shard
+    (`id % shard count`), so a flight_id, booking_id or waitlist_id is enough
+    to route a lookup; queries without one (list_flights, get_bookings by
+    user) are sent to every shard and the results concatenated.
+
+    Writes within one flight stay on one shard. A transaction that also
+    writes global tables commits each database in turn, without two-phase
+    commit.
+    """
+
+    def __init__(self, global_engine: Engine, shard_engines: list[Engine]):
+        self.global_engine = global_engine
+        self.shard_ids = [f'shard{i}' for i in range(len(shard_engines))]
+        self.engines = {GLOBAL_SHARD: global_engine, **dict(zip(self.shard_ids, shard_engines))}
+        self._lock = threading.Lock()
+        self._blocks: dict[str, tuple[int, int]] = {}
+
+    def shard_for_id(self, row_id: int) -> str:
+        return self.shard_ids[row_id % len(self.shard_ids)]
+
+    def shard_for_route(self, origin: str, destination: str) -> str:
+        return self.shard_ids[zlib.crc32(f'{origin}:{destination}'.encode()) % len(self.shard_ids)]
+
+    def next_id(self, name: str, shard_id: str) -> int:
+        """Return a new globally unique id that routes to `shard_id`."""
+        return self._next_sequence(name) * len(self.shard_ids) + self.shard_ids.index(shard_id)
+
+    def _next_sequence(self, name: str) -> int:
+        with self._lock:
+            start, end = self._blocks.get(name, (0, 0))
+            if start >= end:
+                start, end = self._reserve_block(name)
+            self._blocks[name] = (start + 1, end)
+            return start
+
+    def _reserve_block(self, name: str) -> tuple[int, int]:
+        # Each process reserves ids in blocks, so allocation rarely touches the database
+        with self.global_engine.begin() as conn:
+            end = conn.execute(
+                update(IdSequence).where(IdSequence.name == name)
+                .values(next_value=IdSequence.next_value + ID_BLOCK_SIZE)
+                .returning(IdSequence.next_value)
+            ).scalar()
+            if end is None:
+                end = 1 + ID_BLOCK_SIZE
+                conn.execute(insert(IdSequence).values(name=name, next_value=end))
+        return end - ID_BLOCK_SIZE, end
+
+    def assign_ids(self, session, flush_context, instances) -> None:
+        """Give new sharded rows their routing ids before they are flushed."""
+        for obj in session.new:
+            if isinstance(obj, Flight) and obj.flight_id is None:
+                obj.flight_id = self.next_id('flights', self.shard_for_route(obj.origin, obj.destination))
+            elif isinstance(obj, Booking) and obj.booking_id is None:
+                obj.booking_id = self.next_id('bookings', self.shard_for_id(obj.flight_id))
+            elif isinstance(obj, WaitlistEntry) and obj.waitlist_id is None:
+                obj.waitlist_id = self.next_id('waitlist', self.shard_for_id(obj.flight_id))
+            elif isinstance(obj, BookingChange) and obj.change_id is None:
+                obj.change_id = self.next_id('booking_changes', self.shard_for_id(obj.flight_id))
+
+    def shards_for_table(self, name: str) -> list[str]:
+        """The shards holding rows of table `name`."""
+        return self.shard_ids if name in SHARDED_TABLES else [GLOBAL_SHARD]
+
+    def shard_chooser(self, mapper, instance, clause=None) -> str:
+        if mapper is None or mapper.local_table.name not in SHARDED_TABLES:
+            return GLOBAL_SHARD
+        row_id = getattr(instance, 'flight_id', None) if instance is not None else None
+        return self.shard_for_id(row_id) if row_id is not None else self.shard_ids[0]
+
+    def identity_chooser(self, mapper, primary_key, **kw) -> list[str]:
+        if mapper.local_table.name not in SHARDED_TABLES:
+            return [GLOBAL_SHARD]
+        return [self.shard_for_id(primary_key[0])]
+
+    def execute_chooser(self, context: ORMExecuteState) -> list[str]:
+        statement = context.statement
+        tables = {t.name for t in find_tables(statement, include_crud=True)}
+        if not tables & SHARDED_TABLES:
+            return [GLOBAL_SHARD]
+        shards = {self.shard_for_id(value) for value in _routing_values(statement, context.parameters)}
+        return sorted(shards) if shards else self.shard_ids
+
+    def sessionmaker(self) -> sessionmaker:
+        factory = sessionmaker(
+            class_=ShardedSession,
+            autocommit=False,
+            autoflush=False,
+            shards=self.engines,
+            shard_chooser=self.shard_chooser,
+            identity_chooser=self.identity_chooser,
+            execute_chooser=self.execute_chooser,
+            info={'shard_router': self},  # For bulk writes that must pick shards themselves
+        )
+        event.listen(factory, 'before_flush', self.assign_ids)
+        return factory
+
+
+def _routing_values(statement, parameters=None):
+    """Yield the values `statement` compares routing columns against (subqueries included).
+
+    Binds without a value of their own, like the primary key of a
+    populate_existing get(), are looked up in the execution `parameters`.
+    """
+    parameters = parameters if isinstance(parameters, dict) else {}
+    for node in visitors.iterate(statement):
+        if not isinstance(node, BinaryExpression) or not isinstance(node.right, BindParameter):
+            continue
+        table = getattr(node.left, 'table', None)
+        if table is None or (table.name, node.left.key) not in ROUTING_COLUMNS:
+            continue
+        value = parameters.get(node.right.key, node.right.effective_value)
+        if node.operator is operators.eq:
+            yield value
+        elif node.operator is operators.in_op:
+            yield from value
+
+
+class Replica:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.synced_at: Optional[float] = None  # time.monotonic() when its data was copied
+        self.refreshes = 0
+
+
+class ReplicaSet:
+    """Read-only copies of the primary SQLite database for the listing endpoints.
+
+    A background thread copies the primary into every replica with SQLite's
+    online backup API whenever the primary has changed (checked cheaply via
+    `PRAGMA data_version`). Reads are spread over the replicas round-robin.
+
+    Replicas lag the primary by up to one refresh interval, so a caller
+    that has just written would not see its own change. Committed bookings,
+    waitlist entries and users are therefore recorded per user id and email,
+    and a read for that user goes to the primary until every replica has
+    been refreshed past the write. The record is per process.
+    """
+
+    def __init__(self, primary: Engine, replica_engines: list[Engine], interval: float = 1.0):
+        self.primary = primary
+        self.PrimarySession = sessionmaker(autocommit=False, autoflush=False, bind=primary)
+        self.replicas = [Replica(e) for e in replica_engines]
+        self.interval = interval
+        self._next = itertools.cycle(self.replicas)
+        self._writes: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Copy the primary into every replica if it changed; returns True if copied."""
+        if self._conn is None:
+            # A dedicated connection, so data_version reflects other connections' commits
+            self._conn = self.primary.connect()
+        version = self._conn.exec_driver_sql('PRAGMA data_version').scalar()
+        self._conn.rollback()
+        if version == self._data_version and not force:
+            return False
+        self._data_version = version
+        for replica in self.replicas:
+            started = time.monotonic()
+            if replica.synced_at is not None:
+                # The replica may have missed commits for this long
+                metrics.observe('replica.lag', started - replica.synced_at)
+            self._copy(replica.engine)
+            replica.synced_at = started
+            replica.refreshes += 1
+            metrics.observe('replica.refresh', time.monotonic() - started)
+        synced = self.synced_at()
+        with self._lock:
+            self._writes = {k: t for k, t in self._writes.items() if t >= synced}
+        return True
+
+    def _copy(self, replica_engine: Engine) -> None:
+        source = self.primary.raw_connection()
+        target = replica_engine.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+
+    def synced_at(self) -> float:
+        """Oldest copy time across the replicas (data committed before it is on all of them)."""
+        return min((r.synced_at for r in self.replicas if r.synced_at is not None), default=float('-inf'))
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    def note_writes(self, keys) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._writes[key] = now
+
+    def has_unsynced_write(self, key: str) -> bool:
+        with self._lock:
+            written = self._writes.get(key)
+        return written is not None and written >= self.synced_at()
+
+    def session(self, key: Optional[str] = None) -> Session:
+        """Session on the next replica, or on the primary if `key` wrote since the last sync."""
+        if key is not None and self.has_unsynced_write(key):
+            metrics.incr('reads.primary')
+            return self.PrimarySession()
+        metrics.incr('reads.replica')
+        return next(self._next).SessionLocal()
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            'replicas': len(self.replicas),
+            'seconds_since_sync': [
+                round(now - r.synced_at, 3) if r.synced_at is not None else None for r in self.replicas
+            ],
+            'refreshes': [r.refreshes for r in self.replicas],
+            'tracked_writers': len(self._writes),
+        }
+
+    def _collect_writes(self, session, flush_context) -> None:
+        keys = session.info.setdefault('replica_write_keys', set())
+        for obj in itertools.chain(session.new, session.dirty):
+            if isinstance(obj, (Booking, WaitlistEntry)):
+                keys.add(f'user:{obj.user_id}')
+            elif isinstance(obj, User):
+                keys.update((f'user:{obj.user_id}', f'email:{obj.email.lower()}'))
+
+    def _after_commit(self, session) -> None:
+        keys = session.info.pop('replica_write_keys', None)
+        if keys:
+            self.note_writes(keys)
+
+    def _after_rollback(self, session, previous_transaction) -> None:
+        session.info.pop('replica_write_keys', None)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Replica refresh failed")
+
+    def start(self) -> None:
+        event.listen(Session, 'after_flush', self._collect_writes)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_soft_rollback', self._after_rollback)
+        self.refresh(force=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='replica-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        event.remove(Session, 'after_flush', self._collect_writes)
+        event.remove(Session, 'after_commit', self._after_commit)
+        event.remove(Session, 'after_soft_rollback', self._after_rollback)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _create_engine(url: str) -> Engine:
+    return create_engine(url, connect_args={"check_same_thread": False, "timeout": config.DB_BUSY_TIMEOUT_MS / 1000})
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+if config.SHARDS:
+    router = ShardRouter(engine, [_create_engine(url) for url in config.SHARDS])
+    SessionLocal = router.sessionmaker()
+else:
+    router = None
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if config.READ_REPLICAS and router is None:
+    replicas = ReplicaSet(engine, [_create_engine(url) for url in config.READ_REPLICAS], config.REPLICA_REFRESH_INTERVAL)
+    metrics.register('read_replicas', replicas.status)
+else:
+    replicas = None
 
 # Dependency for FastAPI
 
+def _migrate(target: Engine) -> None:
+    """Add columns and indexes introduced since the database was created.
+
+    create_all skips existing tables, so new nullable columns are added with
+    ALTER TABLE and missing indexes are created here.
+    """
+    existing = inspect(target)
+    tables = set(existing.get_table_names())
+    with target.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            present = {c['name'] for c in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present and column.nullable:
+                    column_type = column.type.compile(dialect=target.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                    logger.info("Added column %s.%s", table.name, column.name)
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    engines = router.engines.values() if router is not None else [engine]
+    for target in engines:
+        Base.metadata.create_all(bind=target)
+        _migrate(target)
+        if target.url.get_backend_name() == 'sqlite':
+            # WAL lets readers in other worker processes proceed while one process writes
+            with target.connect() as conn:
+                conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+
+
+def has_data() -> bool:
+    """Return True if the database already holds users or flights."""
+    db = SessionLocal()
+    try:
+        return db.query(User.user_id).first() is not None or db.query(Flight.flight_id).first() is not None
+    finally:
+        db.close()
+
+
+@contextmanager
+def startup_lock(path: str = STARTUP_LOCK_PATH):
+    """Serialize database setup (migrations, seeding) across server processes."""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(request: Request):
+    """Like get_db, but served by a read replica when replicas are configured.
+
+    The caller is identified by a `user_id` path parameter or an `email`
+    query parameter; if that user wrote since the replicas last synced, the
+    primary is used instead so they see their own changes.
+    """
+    if replicas is None:
+        yield from get_db()
+        return
+    if 'user_id' in request.path_params:
+        key = f"user:{request.path_params['user_id']}"
+    elif 'email' in request.query_params:
+        # Emails are stored lowercased, and looked up case-insensitively
+        key = f"email:{request.query_params['email'].lower()}"
+    else:
+        key = None
+    db = replicas.session(key)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,157 @@
+"""Request deadlines, carried into database work through a context variable.
+
+A REST request (`request_deadline` dependency) or MCP tool call
+(`deadline`) gets a time budget:
+- the caller's own, from the `X-Request-Timeout-Ms` header or the
+  `timeout_ms` tool argument, capped at config.MAX_DEADLINE_MS;
+- otherwise the operation's entry in config.DEADLINES, keyed by the route
+  ("POST /book") or the tool name ("book_flight");
+- otherwise config.DEADLINE_MS.
+No budget (0, the default) means no deadline.
+
+Services do not pass the deadline around. The context variable follows the
+request into the threadpool worker that runs the service, and the engine
+hooks below read it before every SQL statement:
+- a statement started after the deadline fails at once;
+- on SQLite, the connection's busy_timeout is cut to the time left, so
+  waiting for another writer's lock ends at the deadline instead of after
+  the default busy wait;
+- a progress handler interrupts statements still running at the deadline,
+  SQLite's counterpart of statement_timeout.
+Lock waits and interrupted statements that end at the deadline are raised
+as `DeadlineExceeded`. The REST app and the MCP tool wrapper turn it into
+a DEADLINE_EXCEEDED `ErrorResponse`, and the session is rolled back when
+it closes. Connections get their usual busy timeout back when they return
+to the pool.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+import config
+import metrics
+from schemas import ErrorResponse
+
+TIMEOUT_HEADER = 'x-request-timeout-ms'
+PROGRESS_INTERVAL = 10000  # SQLite VM instructions between deadline checks in long statements
+_LOCK_ERRORS = ('database is locked', 'database table is locked', 'interrupted')
+_INFO_KEY = 'deadline'  # Connection record info: the deadline its busy timeout was set for
+
+# (deadline on the time.monotonic() clock, operation name) of the current request
+_current: contextvars.ContextVar[Optional[tuple[float, str]]] = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The current request ran out of time."""
+
+
+def budget(operation: str, requested_ms: Optional[float] = None) -> Optional[float]:
+    """Seconds allowed for `operation`, or None for no deadline."""
+    if requested_ms is not None and requested_ms > 0:
+        ms = min(requested_ms, config.MAX_DEADLINE_MS)
+    else:
+        ms = config.DEADLINES.get(operation, config.DEADLINE_MS)
+    return ms / 1000 if ms > 0 else None
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (negative once it has passed), or None."""
+    current = _current.get()
+    return current[0] - time.monotonic() if current is not None else None
+
+
+@contextmanager
+def deadline(operation: str, requested_ms: Optional[float] = None):
+    """Run the block under `operation`'s deadline (or the caller's `requested_ms`)."""
+    seconds = budget(operation, requested_ms)
+    if seconds is None:
+        yield
+        return
+    token = _current.set((time.monotonic() + seconds, operation))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+async def request_deadline(request: Request) -> None:
+    """FastAPI dependency giving the endpoint its deadline.
+
+    Async so that it runs in the request's task: the sync endpoint's
+    threadpool worker then starts with a copy of the context that holds it.
+    """
+    route = request.scope.get('route')
+    operation = f"{request.method} {route.path if route is not None else request.url.path}"
+    try:
+        requested_ms = float(request.headers[TIMEOUT_HEADER])
+    except (KeyError, ValueError):
+        requested_ms = None
+    seconds = budget(operation, requested_ms)
+    if seconds is not None:
+        _current.set((time.monotonic() + seconds, operation))
+
+
+def exceeded_error() -> ErrorResponse:
+    """The error for a request that ran out of time, counted in GET /metrics."""
+    current = _current.get()
+    operation = current[1] if current is not None else 'unknown'
+    metrics.incr('deadlines.exceeded')
+    metrics.incr(f'deadlines.exceeded.{operation}')
+    return ErrorResponse(
+        error="Deadline exceeded",
+        error_code="DEADLINE_EXCEEDED",
+        details=f"{operation} did not finish within its deadline, probably waiting for a database lock. "
+                "Nothing was changed; please retry."
+    )
+
+
+def _past(deadline_at: float) -> bool:
+    return time.monotonic() >= deadline_at
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _apply_deadline(conn, cursor, statement, parameters, context, executemany) -> None:
+    current = _current.get()
+    if current is None:
+        if _INFO_KEY in conn.info:
+            # Still set up for a finished request whose session kept the connection
+            _reset(cursor.connection, conn.info)
+        return
+    deadline_at = current[0]
+    left = deadline_at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded()
+    if conn.dialect.name != 'sqlite':
+        return
+    dbapi_connection = cursor.connection
+    dbapi_connection.execute(f'PRAGMA busy_timeout = {max(1, int(left * 1000))}')
+    if conn.info.get(_INFO_KEY) != deadline_at:
+        dbapi_connection.set_progress_handler(lambda: _past(deadline_at), PROGRESS_INTERVAL)
+        conn.info[_INFO_KEY] = deadline_at
+
+
+@event.listens_for(Engine, 'handle_error')
+def _lock_wait_to_deadline(context) -> None:
+    current = _current.get()
+    if current is None or not isinstance(context.original_exception, context.dialect.loaded_dbapi.OperationalError):
+        return
+    # The busy timeout gives up at the deadline, give or take SQLite's sleep granularity
+    if str(context.original_exception) in _LOCK_ERRORS and time.monotonic() >= current[0] - 0.01:
+        raise DeadlineExceeded() from context.original_exception
+
+
+def _reset(dbapi_connection, info: dict) -> None:
+    if info.pop(_INFO_KEY, None) is not None:
+        dbapi_connection.set_progress_handler(None, 0)
+        dbapi_connection.execute(f'PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT_MS}')
+
+
+@event.listens_for(Pool, 'checkin')
+def _restore_connection(dbapi_connection, connection_record) -> None:
+    if dbapi_connection is not None:
+        _reset(dbapi_connection, connection_record.info)
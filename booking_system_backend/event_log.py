@@ -0,0 +1,176 @@
+"""Append-only booking event log, written in batches off the request path.
+
+Every committed seat claim (new booking), release (cancellation) and other
+status change (e.g. completed) becomes one row in `booking_events`; a
+booking changed to another flight or class is a release plus a claim. The
+sequence number (`seq`) gives the order. Session events collect the
+changes during a flush and hand them to the `EventLog` writer after
+commit. The writer inserts them in batches on its own thread and
+connection, so a booking pays for neither an extra INSERT nor an fsync.
+Events of a transaction that rolls back are dropped.
+
+The log can lose the last few milliseconds of events if the process
+crashes; services.reconcile checks the counters against `bookings`
+itself. Replay and compaction are in services.events.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import metrics
+from models import Booking, BookingEvent, BookingStatus
+
+logger = logging.getLogger(__name__)
+
+EVENT_BOOKED = 'booked'  # A seat was claimed
+EVENT_CANCELLED = 'cancelled'  # The seat was released
+EVENT_STATUS = 'status'  # Any other status change; the seat stays taken
+_SESSION_KEY = 'booking_events'
+_STOP = object()
+WRITE_ATTEMPTS = 3
+
+
+class EventLog:
+    def __init__(self, max_batch: int = 500, max_delay: float = 0.05):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._engine: Optional[Engine] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def record(self, session: Session, kind: str, booking_id: int, user_id: int, flight_id: int,
+               seat_class: str, status: str, price_paid: int) -> None:
+        """Add an event to the session's transaction; it is logged once the session commits."""
+        if not self.running:
+            return
+        session.info.setdefault(_SESSION_KEY, []).append({
+            'kind': kind,
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'flight_id': flight_id,
+            'seat_class': seat_class,
+            'status': status,
+            'price_paid': price_paid,
+            'recorded_at': datetime.utcnow().isoformat(),
+        })
+
+    def submit(self, events: list[dict]) -> None:
+        """Queue one committed transaction's events for writing."""
+        self._queue.put(events)
+
+    def flush(self) -> None:
+        """Block until every event submitted so far has been written."""
+        self._queue.join()
+
+    def start(self, engine: Engine) -> None:
+        self._engine = engine
+        self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write everything already queued, then stop the writer."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _next_batch(self) -> tuple[list, int, bool]:
+        """Events of the transactions queued within `max_delay` of the first one."""
+        first = self._queue.get()
+        if first is _STOP:
+            self._queue.task_done()
+            return [], 0, True
+        # Sleep instead of waiting on the queue, so busy periods cost one wakeup per batch
+        # rather than one per transaction
+        time.sleep(self.max_delay)
+        batch = list(first)
+        taken = 1
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            taken += 1
+            if item is _STOP:
+                return batch, taken, True
+            batch.extend(item)
+        return batch, taken, False
+
+    def _run(self) -> None:
+        while True:
+            batch, taken, stopping = self._next_batch()
+            if batch:
+                self._write(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+            if stopping:
+                return
+
+    def _write(self, batch: list) -> None:
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                with self._engine.begin() as conn:
+                    conn.execute(insert(BookingEvent), batch)
+            except Exception:
+                logger.warning("Writing %d booking events failed (attempt %d)", len(batch), attempt, exc_info=True)
+                time.sleep(0.1 * attempt)
+                continue
+            metrics.incr('event_log.batches')
+            metrics.incr('event_log.events', len(batch))
+            return
+        logger.error("Dropped %d booking events", len(batch))
+        metrics.incr('event_log.dropped', len(batch))
+
+
+event_log = EventLog()
+metrics.register('event_log', lambda: {
+    'running': event_log.running,
+    'queued': event_log._queue.qsize(),
+})
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session: Session, flush_context) -> None:
+    if not event_log.running:
+        return
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            kind = EVENT_BOOKED if obj.status == BookingStatus.BOOKED.value else EVENT_STATUS
+            event_log.record(session, kind, obj.booking_id, obj.user_id, obj.flight_id, obj.seat_class, obj.status, obj.price_paid)
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        attrs = inspect(obj).attrs
+        if attrs.status.history.has_changes():
+            kind = EVENT_CANCELLED if obj.status == BookingStatus.CANCELLED.value else EVENT_STATUS
+            event_log.record(session, kind, obj.booking_id, obj.user_id, obj.flight_id, obj.seat_class, obj.status, obj.price_paid)
+        elif attrs.flight_id.history.has_changes() or attrs.seat_class.history.has_changes():
+            # Changed to another flight or class: the old seat is released and the new one claimed
+            old = {key: (getattr(attrs, key).history.deleted or [getattr(obj, key)])[0]
+                   for key in ('flight_id', 'seat_class', 'price_paid')}
+            event_log.record(session, EVENT_CANCELLED, obj.booking_id, obj.user_id, old['flight_id'],
+                             old['seat_class'], obj.status, old['price_paid'])
+            event_log.record(session, EVENT_BOOKED, obj.booking_id, obj.user_id, obj.flight_id, obj.seat_class, obj.status, obj.price_paid)
+
+
+@event.listens_for(Session, 'after_commit')
+def _submit_after_commit(session: Session) -> None:
+    events = session.info.pop(_SESSION_KEY, None)
+    if events:
+        event_log.submit(events)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_SESSION_KEY, None)
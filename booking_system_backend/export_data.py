@@ -0,0 +1,53 @@
+"""Bulk export of users, flights, bookings and archived bookings for the data warehouse.
+
+Usage:
+    python export_data.py bookings --format parquet --output bookings.parquet
+    python export_data.py bookings --format csv --since-id 41234 > new_bookings.csv
+
+The highest exported primary key is printed to stderr; pass it as --since-id
+on the next run for an incremental export.
+"""
+import argparse
+import sys
+
+from db import SessionLocal
+from services import export
+from schemas import ErrorResponse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a table in chunks from a server-side cursor.")
+    parser.add_argument("table", choices=list(export.EXPORT_TABLES))
+    parser.add_argument("--format", choices=list(export.MEDIA_TYPES), default="csv")
+    parser.add_argument("--output", "-o", help="Output file (defaults to stdout)")
+    parser.add_argument("--since-id", type=int, help="Only export rows with a primary key above this watermark")
+    parser.add_argument("--since-booking-time", help="Only export bookings made after this ISO timestamp")
+    parser.add_argument("--chunk-size", type=int, default=export.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        watermark = export.get_watermark(db, args.table)
+        result = export.export_table(
+            db, args.table, args.format, args.since_id, watermark, args.since_booking_time, args.chunk_size
+        )
+        if isinstance(result, ErrorResponse):
+            print(f"{result.error_code}: {result.details}", file=sys.stderr)
+            return 1
+
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for data in result:
+                out.write(data)
+        finally:
+            if args.output:
+                out.close()
+    finally:
+        db.close()
+
+    print(f"Exported {args.table} up to watermark {watermark}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
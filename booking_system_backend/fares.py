@@ -0,0 +1,136 @@
+"""Fare calendar: the cheapest available fare per route, departure day and seat class.
+
+For every (origin, destination, seat class) the calendar maps each UTC
+departure day to the sorted (price, flight_id) pairs of that day's flights
+that still have a seat in the class. The cheapest fare of a day is the
+first pair, so a month of a route costs one dict lookup per day instead
+of a scan over its flights.
+
+The calendar is built from the inventory snapshot on first use and then
+follows the snapshot's seat updates (see Inventory.subscribe). Only a
+counter that drops to zero or recovers from zero moves a flight in or
+out of its day. Bookings, cancellations, changes and waitlist promotions
+all arrive this way, including those made by other workers. When the
+snapshot is dropped (flights added or re-priced, or the snapshot reached
+its max age), the calendar is dropped with it and rebuilt on the next lookup.
+"""
+import bisect
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+import metrics
+from inventory import SEAT_CLASSES, InventorySnapshot, inventory
+
+DAY = 24 * 60 * 60
+MAX_DAYS = 366  # Longest calendar one lookup returns
+
+# (origin, destination, seat class) -> departure day -> sorted (price, flight_id)
+Calendar = dict[tuple[str, str, str], dict[int, list[tuple[int, int]]]]
+
+
+def to_day(epoch_seconds: int) -> int:
+    return epoch_seconds // DAY
+
+
+def day_to_date(day: int) -> str:
+    return datetime.fromtimestamp(day * DAY, timezone.utc).date().isoformat()
+
+
+def _key(snapshot: InventorySnapshot, pos: int, seat_class: str) -> tuple[str, str, str]:
+    return snapshot.places[snapshot.origins[pos]], snapshot.places[snapshot.destinations[pos]], seat_class
+
+
+class FareCalendar:
+    """Cheapest fares per route and day, kept in step with the inventory snapshot."""
+
+    def __init__(self):
+        self._calendar: Optional[Calendar] = None
+        self._source: Optional[InventorySnapshot] = None  # The snapshot the calendar matches
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    @staticmethod
+    def build(snapshot: InventorySnapshot) -> Calendar:
+        calendar: Calendar = {}
+        for pos in range(len(snapshot)):
+            day = to_day(snapshot.departures[pos])
+            for seat_class in SEAT_CLASSES:
+                if snapshot.seats_available(pos, seat_class) > 0:
+                    fares = calendar.setdefault(_key(snapshot, pos, seat_class), {}).setdefault(day, [])
+                    fares.append((snapshot.price(pos, seat_class), snapshot.flight_ids[pos]))
+        for days in calendar.values():
+            for fares in days.values():
+                fares.sort()
+        return calendar
+
+    def _load(self, db: Session) -> Calendar:
+        snapshot = inventory.get(db)
+        calendar = self.build(snapshot)
+        with self._lock:
+            # Install only if no seat update slipped in meanwhile; either way the
+            # calendar is consistent with `snapshot` for this lookup
+            if inventory.current is snapshot:
+                self._calendar, self._source = calendar, snapshot
+        self.builds += 1
+        metrics.incr('fares.builds')
+        return calendar
+
+    def cheapest(self, db: Session, origin: str, destination: str, seat_class: str,
+                 first_day: int, days: int) -> list[tuple[int, int, int]]:
+        """(day, price, flight_id) of the cheapest available fare on each of `days` days with one."""
+        inventory.expire()  # Drops the calendar with an expired snapshot
+        with self._lock:
+            calendar = self._calendar
+        if calendar is None:
+            calendar = self._load(db)
+        with self._lock:
+            by_day = calendar.get((origin, destination, seat_class), {})
+            result = []
+            for day in range(first_day, first_day + days):
+                fares = by_day.get(day)
+                if fares:
+                    result.append((day, *fares[0]))
+            return result
+
+    def _on_seats(self, old: InventorySnapshot, new: Optional[InventorySnapshot], updates: list[dict]) -> None:
+        with self._lock:
+            if self._calendar is None:
+                return
+            if new is None or old is not self._source:
+                self._calendar = self._source = None
+                return
+            available: dict[tuple[int, str], bool] = {}
+            for update in updates:
+                pos = old.position(update['flight_id'])
+                for seat_class in SEAT_CLASSES:
+                    before = available.get((pos, seat_class), old.seats_available(pos, seat_class) > 0)
+                    after = available[(pos, seat_class)] = update[f'{seat_class}_seats_available'] > 0
+                    if before != after:
+                        self._move(old, pos, seat_class, after)
+            self._source = new
+
+    def _move(self, snapshot: InventorySnapshot, pos: int, seat_class: str, available: bool) -> None:
+        days = self._calendar.setdefault(_key(snapshot, pos, seat_class), {})
+        day = to_day(snapshot.departures[pos])
+        fare = (snapshot.price(pos, seat_class), snapshot.flight_ids[pos])
+        fares = days.setdefault(day, [])
+        if available:
+            bisect.insort(fares, fare)
+        elif fare in fares:
+            fares.remove(fare)
+        if not fares:
+            del days[day]
+
+    def __len__(self) -> int:
+        calendar = self._calendar
+        return len(calendar) if calendar is not None else 0
+
+
+fare_calendar = FareCalendar()
+inventory.subscribe(fare_calendar._on_seats)
+metrics.register('fare_calendar', lambda: {
+    'route_classes': len(fare_calendar),
+    'builds': fare_calendar.builds,
+})
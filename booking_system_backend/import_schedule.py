@@ -0,0 +1,50 @@
+"""Bulk import of a flight schedule from a CSV or NDJSON file.
+
+Usage:
+    python import_schedule.py summer_2099.csv
+    python import_schedule.py summer_2099.ndjson --errors rejected.ndjson
+
+Rows need origin, destination, departure_time, arrival_time, base_price
+and total_seats (CSV header or NDJSON keys). Flights are matched on
+origin, destination and departure time: new ones are created, existing
+ones updated. Seats are split 60/30/10 between economy, business and
+galaxium; flights with bookings keep their seat counts.
+"""
+import argparse
+import sys
+import time
+
+from db import SessionLocal, init_db
+from services import schedule
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a flight schedule in bulk.")
+    parser.add_argument("path", help="CSV or NDJSON (.ndjson/.jsonl) schedule file")
+    parser.add_argument("--chunk-size", type=int, default=schedule.SCHEDULE_CHUNK_SIZE)
+    parser.add_argument("--errors", help="Write rejected rows as NDJSON to this file")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        with open(args.path, "rb") as f:
+            fmt = "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+            result = schedule.import_schedule(db, schedule.read_schedule_bytes(f, fmt), args.chunk_size)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as f:
+            for error in result.errors:
+                f.write(error.model_dump_json() + "\n")
+    print(f"Created {result.created} flights, updated {result.updated} "
+          f"({result.seats_preserved} with bookings kept their seats), {result.failed} rejected "
+          f"in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Bulk import of users from a CSV or NDJSON file.
+
+Usage:
+    python import_users.py partner_customers.csv
+    python import_users.py partner_customers.ndjson --errors rejected.ndjson
+
+CSV files need a header with `name` and `email` columns; NDJSON files need
+one object with `name` and `email` keys per line. Rows that fail validation
+are reported with their row index and error code.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from db import SessionLocal, init_db
+from services import user
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row.get("name"), row.get("email")
+        else:
+            for row in csv.DictReader(f):
+                yield row.get("name"), row.get("email")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import users in bulk.")
+    parser.add_argument("path", help="CSV or NDJSON file with name and email fields")
+    parser.add_argument("--chunk-size", type=int, default=user.BATCH_CHUNK_SIZE)
+    parser.add_argument("--errors", help="Write rejected rows as NDJSON to this file")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        result = user.register_users(db, read_rows(args.path), args.chunk_size, return_users=False)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as f:
+            for error in result.errors:
+                f.write(error.model_dump_json() + "\n")
+    print(f"Imported {result.created} users, {result.failed} rejected in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Cross-process cache invalidation through the shared database.
+
+Each server process keeps its own in-memory caches. Writers `publish` an
+invalidation row in the same transaction as the change they make, and an
+`InvalidationListener` thread in every process picks new rows up and calls
+the handlers `subscribe`d for that scope, skipping rows the process wrote
+itself. On SQLite the listener first checks `PRAGMA data_version`, so idle
+polls never touch the log table.
+
+Nothing is published unless cross-process sync is `enabled`: the servers
+poll the log (GALAXIUM_CACHE_SYNC_INTERVAL) or run several workers. The
+servers `prune` old rows on a timer of their own.
+"""
+import logging
+import threading
+import uuid
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import config
+import metrics
+from models import CacheInvalidation
+
+logger = logging.getLogger(__name__)
+
+# Log rows kept behind the newest one; older rows are deleted by `prune`
+RETAIN_ROWS = 10000
+
+# Marks the rows this process publishes, so its own listener skips them
+PROCESS_ID = uuid.uuid4().hex
+
+_handlers: dict[str, list[Callable[[str], None]]] = {}
+
+
+def subscribe(scope: str, handler: Callable[[str], None]) -> None:
+    """Call `handler(key)` whenever an invalidation for `scope` is seen."""
+    _handlers.setdefault(scope, []).append(handler)
+
+
+def enabled() -> bool:
+    """Whether other processes may be listening for invalidations."""
+    return config.CACHE_SYNC_INTERVAL > 0 or config.WORKERS > 1
+
+
+def publish(db: Session, scope: str, key: str) -> None:
+    """Record an invalidation; it becomes visible when the caller commits."""
+    if enabled():
+        db.add(CacheInvalidation(scope=scope, key=key, origin=PROCESS_ID))
+
+
+def prune(engine: Engine) -> int:
+    """Delete log rows more than RETAIN_ROWS behind the newest; returns how many."""
+    with engine.begin() as conn:
+        newest = conn.execute(select(func.max(CacheInvalidation.id))).scalar()
+        if newest is None:
+            return 0
+        pruned = conn.execute(delete(CacheInvalidation).where(CacheInvalidation.id <= newest - RETAIN_ROWS)).rowcount
+    metrics.incr('cache_invalidations_pruned', pruned)
+    return pruned
+
+
+def dispatch(scope: str, key: str) -> None:
+    for handler in _handlers.get(scope, ()):
+        handler(key)
+
+
+class InvalidationListener:
+    """Polls the invalidation log and dispatches new rows to local handlers."""
+
+    def __init__(self, engine: Engine, interval: float = 0.2):
+        self.engine = engine
+        self.interval = interval
+        self._use_data_version = engine.url.get_backend_name() == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+        self._conn = None
+        self._data_version = None
+        self._last_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> int:
+        """Apply invalidations committed since the last poll; returns how many were applied."""
+        if self._conn is None:
+            # A dedicated connection, so data_version reflects other connections' commits
+            self._conn = self.engine.connect()
+        conn = self._conn
+        try:
+            if self._use_data_version:
+                version = conn.exec_driver_sql('PRAGMA data_version').scalar()
+                if version == self._data_version:
+                    return 0
+                self._data_version = version
+
+            if self._last_id is None:
+                self._last_id = conn.execute(select(func.max(CacheInvalidation.id))).scalar() or 0
+                return 0
+
+            rows = conn.execute(
+                select(CacheInvalidation.id, CacheInvalidation.scope, CacheInvalidation.key, CacheInvalidation.origin)
+                .where(CacheInvalidation.id > self._last_id)
+                .order_by(CacheInvalidation.id)
+            ).all()
+            if rows:
+                self._last_id = rows[-1].id
+            # This process applied its own changes when it committed them
+            rows = [row for row in rows if row.origin != PROCESS_ID]
+        finally:
+            # Never hold a read transaction open between polls
+            conn.rollback()
+
+        for row in rows:
+            dispatch(row.scope, row.key)
+        metrics.incr('cache_invalidations_applied', len(rows))
+        return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Cache invalidation poll failed")
+
+    def start(self) -> None:
+        self.poll()
+        self._thread = threading.Thread(target=self._run, name='cache-invalidation', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,362 @@
+"""Compact in-memory snapshot of the flight catalogue for lock-free reads.
+
+The snapshot stores flights as parallel arrays ordered by flight_id:
+- ids;
+- origin and destination as codes into a shared list of place names;
+- departure and arrival as epoch seconds;
+- base prices;
+- seats per class.
+
+Reading it never touches the database or builds ORM objects. Route/date
+lookups use per-route arrays sorted by departure, searched with bisect.
+
+Snapshots are immutable. Readers take `inventory.current` once and use it
+for the whole request. After a commit changes seat counts (see
+live_updates.announce_seats), a new snapshot is swapped in. It shares every
+array with the old one except the changed pages of seat counters, so an
+update copies a few kilobytes rather than the whole catalogue. Adding,
+deleting or re-pricing flights drops the snapshot, once per transaction and
+in every worker; the next read rebuilds it. Changes that bypass the ORM
+(Core statements on the flights table) are not seen, so a snapshot is also
+reloaded once it is `max_age` seconds old.
+"""
+import bisect
+import itertools
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+import config
+import invalidation
+import metrics
+from models import Flight
+
+PAGE_BITS = 12  # Seat counters are copied on write in pages of 4096 flights
+PAGE_SIZE = 1 << PAGE_BITS
+SEAT_CLASSES = ('economy', 'business', 'galaxium')
+SEAT_COLUMNS = {f'{c}_seats_available' for c in SEAT_CLASSES}
+_SESSION_KEY = 'inventory_stale'
+# Execution option marking a bulk UPDATE that only changes seat counters; the caller
+# passes the new counts to live_updates.announce_seats, so the snapshot is kept
+SEATS_ONLY = 'inventory_seats_only'
+
+
+def to_epoch(value: str) -> int:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def from_epoch(seconds: int) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class InventorySnapshot:
+    """Immutable struct-of-arrays view of all flights."""
+
+    def __init__(self, flight_ids, origins, destinations, departures, arrivals, base_prices, seats, places, routes, by_departure, version=0):
+        self.flight_ids: array = flight_ids
+        self.origins: array = origins
+        self.destinations: array = destinations
+        self.departures: array = departures
+        self.arrivals: array = arrivals
+        self.base_prices: array = base_prices
+        self.seats: dict[str, list[array]] = seats  # seat class -> pages
+        self.places: list[str] = places
+        self._codes = {name: code for code, name in enumerate(places)}
+        # (origin code, destination code) -> (sorted departures, positions)
+        self.routes: dict[tuple[int, int], tuple[array, array]] = routes
+        self.by_departure: tuple[array, array] = by_departure
+        self.version = version
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple]) -> 'InventorySnapshot':
+        """Build from (flight_id, origin, destination, departure_time, arrival_time,
+        base_price, economy, business, galaxium) rows."""
+        rows = sorted(rows)
+        places: list[str] = []
+        codes: dict[str, int] = {}
+
+        def intern(name: str) -> int:
+            code = codes.get(name)
+            if code is None:
+                code = codes[name] = len(places)
+                places.append(name)
+            return code
+
+        parsed_times: dict[str, int] = {}
+
+        def epoch(value: str) -> int:
+            # Schedules repeat departure times, so each distinct string is parsed once
+            seconds = parsed_times.get(value)
+            if seconds is None:
+                seconds = parsed_times[value] = to_epoch(value)
+            return seconds
+
+        flight_ids, origins, destinations = array('q'), array('I'), array('I')
+        departures, arrivals, base_prices = array('q'), array('q'), array('q')
+        counters = {c: array('i') for c in SEAT_CLASSES}
+        for flight_id, origin, destination, departure, arrival, base_price, economy, business, galaxium in rows:
+            flight_ids.append(flight_id)
+            origins.append(intern(origin))
+            destinations.append(intern(destination))
+            departures.append(epoch(departure))
+            arrivals.append(epoch(arrival))
+            base_prices.append(base_price)
+            counters['economy'].append(economy)
+            counters['business'].append(business)
+            counters['galaxium'].append(galaxium)
+        seats = {c: [values[i:i + PAGE_SIZE] for i in range(0, len(values), PAGE_SIZE)] for c, values in counters.items()}
+
+        grouped: dict[tuple[int, int], list[int]] = {}
+        for pos, key in enumerate(zip(origins, destinations)):
+            grouped.setdefault(key, []).append(pos)
+        routes = {key: cls._departure_index(departures, positions) for key, positions in grouped.items()}
+        by_departure = cls._departure_index(departures, range(len(flight_ids)))
+        return cls(flight_ids, origins, destinations, departures, arrivals, base_prices, seats, places, routes, by_departure)
+
+    @staticmethod
+    def _departure_index(departures: array, positions: Iterable[int]) -> tuple[array, array]:
+        ordered = sorted(positions, key=departures.__getitem__)
+        return array('q', (departures[p] for p in ordered)), array('I', ordered)
+
+    def __len__(self) -> int:
+        return len(self.flight_ids)
+
+    def position(self, flight_id: int) -> Optional[int]:
+        pos = bisect.bisect_left(self.flight_ids, flight_id)
+        if pos < len(self.flight_ids) and self.flight_ids[pos] == flight_id:
+            return pos
+        return None
+
+    def seats_available(self, pos: int, seat_class: str) -> int:
+        return self.seats[seat_class][pos >> PAGE_BITS][pos & (PAGE_SIZE - 1)]
+
+    def find(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        departs_after: Optional[int] = None,
+        departs_before: Optional[int] = None,
+        seat_class: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> list[int]:
+        """Positions of matching flights ordered by departure.
+
+        Departure bounds are epoch seconds (inclusive); with `seat_class`,
+        only flights with a seat left in that class are returned.
+        """
+        if origin is not None or destination is not None:
+            origin_code = self._codes.get(origin) if origin is not None else None
+            destination_code = self._codes.get(destination) if destination is not None else None
+            if (origin is not None and origin_code is None) or (destination is not None and destination_code is None):
+                return []
+            indexes = [
+                index for (o, d), index in self.routes.items()
+                if origin_code in (None, o) and destination_code in (None, d)
+            ]
+        else:
+            indexes = [self.by_departure]
+
+        runs = []
+        for departures, positions in indexes:
+            start = 0 if departs_after is None else bisect.bisect_left(departures, departs_after)
+            stop = len(departures) if departs_before is None else bisect.bisect_right(departures, departs_before)
+            runs.append(zip(departures[start:stop], positions[start:stop]))
+        if len(runs) == 1:
+            matches = (pos for _, pos in runs[0])
+        else:
+            matches = (pos for _, pos in sorted(itertools.chain.from_iterable(runs)))
+        if seat_class is not None:
+            matches = (pos for pos in matches if self.seats_available(pos, seat_class) > 0)
+        return list(itertools.islice(matches, limit))
+
+    def price(self, pos: int, seat_class: str) -> int:
+        base_price = self.base_prices[pos]
+        if seat_class == 'business':
+            return int(base_price * 2.5)
+        return base_price * 5 if seat_class == 'galaxium' else base_price
+
+    def flight(self, pos: int) -> dict:
+        """The flight at `pos` in FlightOut's shape, prices included."""
+        base_price = self.base_prices[pos]
+        return {
+            'flight_id': self.flight_ids[pos],
+            'origin': self.places[self.origins[pos]],
+            'destination': self.places[self.destinations[pos]],
+            'departure_time': from_epoch(self.departures[pos]),
+            'arrival_time': from_epoch(self.arrivals[pos]),
+            'base_price': base_price,
+            'economy_seats_available': self.seats_available(pos, 'economy'),
+            'business_seats_available': self.seats_available(pos, 'business'),
+            'galaxium_seats_available': self.seats_available(pos, 'galaxium'),
+            'economy_price': self.price(pos, 'economy'),
+            'business_price': self.price(pos, 'business'),
+            'galaxium_price': self.price(pos, 'galaxium'),
+        }
+
+    def with_seats(self, updates: Iterable[dict]) -> Optional['InventorySnapshot']:
+        """A copy with the given seat counts applied, or None if a flight is unknown."""
+        seats = {c: list(pages) for c, pages in self.seats.items()}
+        copied: set[tuple[str, int]] = set()
+        for update in updates:
+            pos = self.position(update['flight_id'])
+            if pos is None:
+                return None
+            page = pos >> PAGE_BITS
+            for seat_class in SEAT_CLASSES:
+                if (seat_class, page) not in copied:
+                    seats[seat_class][page] = array('i', seats[seat_class][page])
+                    copied.add((seat_class, page))
+                seats[seat_class][page][pos & (PAGE_SIZE - 1)] = update[f'{seat_class}_seats_available']
+        return InventorySnapshot(
+            self.flight_ids, self.origins, self.destinations, self.departures, self.arrivals,
+            self.base_prices, seats, self.places, self.routes, self.by_departure, self.version + 1,
+        )
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the arrays."""
+        arrays = [self.flight_ids, self.origins, self.destinations, self.departures, self.arrivals, self.base_prices]
+        arrays += [page for pages in self.seats.values() for page in pages]
+        arrays += [a for index in (*self.routes.values(), self.by_departure) for a in index]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+class Inventory:
+    """Holds the current snapshot; readers never block, writers swap in copies.
+
+    A snapshot loaded more than `max_age` seconds ago (0: no limit) is dropped
+    by the next `get` or `expire`.
+    """
+
+    def __init__(self, max_age: float = 0):
+        self.max_age = max_age
+        self._snapshot: Optional[InventorySnapshot] = None
+        self._loaded_at = 0.0  # time.monotonic() of the load the current snapshot derives from
+        self._lock = threading.Lock()
+        self._listeners: list[Callable] = []
+        self.loads = 0
+
+    def subscribe(self, listener: Callable) -> None:
+        """Call `listener(old, new, updates)` after each seat update, under the inventory lock.
+
+        `new` is None when the update could not be applied and the snapshot
+        was dropped; `invalidate` calls `listener(old, None, [])`.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, old: InventorySnapshot, new: Optional[InventorySnapshot], updates: list[dict]) -> None:
+        for listener in self._listeners:
+            listener(old, new, updates)
+
+    @property
+    def current(self) -> Optional[InventorySnapshot]:
+        return self._snapshot
+
+    def _expired(self) -> bool:
+        return self.max_age > 0 and time.monotonic() - self._loaded_at >= self.max_age
+
+    def expire(self) -> None:
+        """Drop the snapshot if it is older than `max_age`."""
+        if self._snapshot is None or not self._expired():
+            return
+        with self._lock:
+            old = self._snapshot
+            if old is None or not self._expired():
+                return
+            self._snapshot = None
+            self._notify(old, None, [])
+        metrics.incr('inventory.expired')
+
+    def get(self, db: Session) -> InventorySnapshot:
+        """The current snapshot, loading it from the database if needed."""
+        self.expire()
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                rows = db.execute(select(
+                    Flight.flight_id, Flight.origin, Flight.destination, Flight.departure_time,
+                    Flight.arrival_time, Flight.base_price, Flight.economy_seats_available,
+                    Flight.business_seats_available, Flight.galaxium_seats_available,
+                )).all()
+                self._snapshot = InventorySnapshot.build(tuple(row) for row in rows)
+                self._loaded_at = time.monotonic()
+                self.loads += 1
+            return self._snapshot
+
+    def apply_seats(self, updates: Iterable[dict]) -> None:
+        """Swap in a copy with the committed seat counts (absolute, so replays are harmless)."""
+        updates = list(updates)
+        with self._lock:
+            old = self._snapshot
+            if old is None:
+                return
+            self._snapshot = old.with_seats(updates)
+            self._notify(old, self._snapshot, updates)
+        metrics.incr('inventory.updates')
+
+    def invalidate(self) -> None:
+        with self._lock:
+            old, self._snapshot = self._snapshot, None
+            if old is not None:
+                self._notify(old, None, [])
+
+
+inventory = Inventory(config.INVENTORY_MAX_AGE)
+metrics.register('inventory', lambda: {
+    'flights': len(inventory.current) if inventory.current is not None else None,
+    'bytes': inventory.current.nbytes() if inventory.current is not None else None,
+    'version': inventory.current.version if inventory.current is not None else None,
+    'loads': inventory.loads,
+})
+
+
+def _mark_stale(session: Session) -> None:
+    """Drop the snapshot once this transaction commits, in every server process that syncs caches."""
+    if session.info.get(_SESSION_KEY):
+        return
+    session.info[_SESSION_KEY] = True
+    invalidation.publish(session, 'inventory', 'flights')
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_catalogue_changes(session: Session, flush_context) -> None:
+    if any(isinstance(obj, Flight) for obj in itertools.chain(session.new, session.deleted)):
+        _mark_stale(session)
+        return
+    for obj in session.dirty:
+        if isinstance(obj, Flight):
+            changed = {a.key for a in inspect(obj).attrs if a.history.has_changes()}
+            # Seat counts arrive through apply_seats; anything else needs a reload
+            if changed - SEAT_COLUMNS:
+                _mark_stale(session)
+                return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_changes(orm_execute_state) -> None:
+    if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) \
+            and any(m.class_ is Flight for m in orm_execute_state.all_mappers) \
+            and not orm_execute_state.execution_options.get(SEATS_ONLY):
+        _mark_stale(orm_execute_state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop(_SESSION_KEY, False):
+        inventory.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+invalidation.subscribe('inventory', lambda key: inventory.invalidate())
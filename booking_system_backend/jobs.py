@@ -0,0 +1,51 @@
+"""Background maintenance jobs run on a fixed interval inside the server process."""
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Calls `func()` every `interval` seconds on a daemon thread.
+
+    Failures are logged and counted (`job.<name>.errors`) and the job keeps
+    running; run times are recorded under `job.<name>` in GET /metrics.
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], object]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> object:
+        started = time.perf_counter()
+        try:
+            self.last_result = self.func()
+        except Exception:
+            metrics.incr(f'job.{self.name}.errors')
+            logger.exception("Job %s failed", self.name)
+        finally:
+            metrics.observe(f'job.{self.name}', time.perf_counter() - started)
+        return self.last_result
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'job-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,167 @@
+"""Server-push seat availability updates for SSE and WebSocket clients.
+
+Services call `announce_seats(db, flight)` before committing a change to a
+flight's seat counters. The latest counts are attached to the session and
+handed to the broadcaster and the inventory snapshot only once the
+transaction commits (and dropped on rollback). When cross-process sync is
+enabled, the counts are also written to the invalidation log, so every
+worker's subscribers see every commit, including those of scripts such as
+reconcile_seats.py --repair.
+
+The broadcaster coalesces bursts: changes are collected for `interval`
+seconds and sent as one batch holding the latest counts per flight. Each
+subscriber has a pending map instead of a queue, so a slow consumer never
+accumulates more than one entry per flight; it simply receives the newest
+state once it catches up.
+"""
+import asyncio
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import invalidation
+import metrics
+from inventory import inventory
+from models import Flight
+
+_SESSION_KEY = 'seat_updates'
+
+
+class Subscriber:
+    def __init__(self, flight_ids: Optional[set[int]] = None):
+        self.flight_ids = flight_ids
+        self.pending: dict[int, dict] = {}
+        self.event = asyncio.Event()
+
+    async def next_batch(self, timeout: Optional[float] = None) -> list[dict]:
+        """Wait for updates and return them; an empty list means the timeout expired."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.event.clear()
+        batch, self.pending = self.pending, {}
+        return list(batch.values())
+
+
+class SeatBroadcaster:
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.subscribers: set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._pending: dict[int, dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(self, updates: Iterable[dict]) -> None:
+        """Queue seat counts for the next batch; safe to call from any thread."""
+        if self._loop is None:
+            return
+        with self._lock:
+            was_empty = not self._pending
+            for update in updates:
+                self._pending[update['flight_id']] = update
+        if was_empty:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def subscribe(self, flight_ids: Optional[set[int]] = None) -> Subscriber:
+        subscriber = Subscriber(flight_ids)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def flush(self) -> int:
+        """Fan the collected updates out to all subscribers; returns how many were sent."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        for subscriber in list(self.subscribers):
+            if subscriber.flight_ids is None:
+                updates = batch
+            else:
+                updates = {k: v for k, v in batch.items() if k in subscriber.flight_ids}
+                if not updates:
+                    continue
+            if subscriber.pending:
+                metrics.incr('seat_updates_coalesced', len(subscriber.pending.keys() & updates.keys()))
+            subscriber.pending.update(updates)
+            subscriber.event.set()
+        metrics.incr('seat_updates_sent', len(batch))
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Let a burst of commits accumulate before sending one batch
+            await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    async def start(self) -> None:
+        self._pending = {}
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+
+broadcaster = SeatBroadcaster()
+metrics.register('seat_stream', lambda: {'subscribers': len(broadcaster.subscribers)})
+
+
+def seat_counts(flight: Flight) -> dict:
+    return {
+        'flight_id': flight.flight_id,
+        'economy_seats_available': flight.economy_seats_available,
+        'business_seats_available': flight.business_seats_available,
+        'galaxium_seats_available': flight.galaxium_seats_available,
+    }
+
+
+def announce_seats(db: Session, flight: Flight) -> None:
+    """Broadcast the flight's seat counts once the session's transaction commits."""
+    counts = seat_counts(flight)
+    db.info.setdefault(_SESSION_KEY, {})[flight.flight_id] = counts
+    invalidation.publish(db, 'flight_seats', ':'.join(str(v) for v in counts.values()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session: Session) -> None:
+    pending = session.info.pop(_SESSION_KEY, None)
+    if pending:
+        inventory.apply_seats(pending.values())
+        broadcaster.publish(pending.values())
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _publish_from_other_worker(key: str) -> None:
+    flight_id, economy, business, galaxium = (int(v) for v in key.split(':'))
+    updates = [{
+        'flight_id': flight_id,
+        'economy_seats_available': economy,
+        'business_seats_available': business,
+        'galaxium_seats_available': galaxium,
+    }]
+    inventory.apply_seats(updates)
+    broadcaster.publish(updates)
+
+
+invalidation.subscribe('flight_seats', _publish_from_other_worker)
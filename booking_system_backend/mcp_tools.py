@@ -0,0 +1,209 @@
+"""MCP server exposing the booking services as tools for AI agents.
+
+Imported by server.py either at startup or, with GALAXIUM_MCP=lazy, on the
+first request to /mcp, so the FastMCP import cost is only paid when needed.
+"""
+import functools
+import inspect
+import time
+from typing import Annotated, Optional
+
+import admission
+import deadlines
+from fastmcp import FastMCP
+from fastmcp.tools import ToolResult
+from pydantic import Field
+from sqlalchemy.orm import Session
+import metrics
+from db import SessionLocal
+from services import flight, user, booking, waitlist
+from services.booking_queue import booking_queue
+from schemas import FlightOut, FareDay, BookingOut, BookingChangeOut, BookingWithFlightOut, UserOut, WaitlistOut, ErrorResponse
+
+
+mcp = FastMCP("Galaxium Booking System")
+
+# Tools that write, and so count against the write concurrency limit
+WRITE_TOOLS = {"book_flight", "cancel_booking", "change_booking", "join_waitlist", "register_user"}
+
+TimeoutMs = Annotated[Optional[int], Field(
+    ge=1, description="Give up with DEADLINE_EXCEEDED after this many milliseconds (default: server setting)."
+)]
+
+
+def service_tool(func):
+    """Register `func(db, ...)` as an MCP tool backed by a service call.
+
+    The wrapper opens one session for the tool call and closes it afterwards,
+    so tools only declare their arguments after `db`. An `ErrorResponse` is
+    returned as a structured error result (`isError` with `error_code` in
+    the structured content) instead of being raised, so agents can branch on
+    the code rather than parse a traceback. Call latency is recorded per tool
+    under `mcp.<tool name>` in GET /metrics. Write tools wait for a slot of
+    the write concurrency limit and fail fast with OVERLOADED if none frees up.
+    Every tool also takes an optional `timeout_ms`; calls that run out of time
+    (see deadlines.py) fail with DEADLINE_EXCEEDED.
+    """
+    name = func.__name__
+    signature = inspect.signature(func)
+    params = list(signature.parameters.values())[1:] + [
+        inspect.Parameter('timeout_ms', inspect.Parameter.KEYWORD_ONLY, default=None, annotation=TimeoutMs)
+    ]
+
+    @functools.wraps(func)
+    def wrapper(*args, timeout_ms: Optional[int] = None, **kwargs):
+        started = time.perf_counter()
+        limiter = admission.write_limiter if name in WRITE_TOOLS else None
+        if limiter is not None and not limiter.acquire():
+            result = admission.overloaded_error()
+        else:
+            with deadlines.deadline(name, timeout_ms):
+                db = SessionLocal()
+                try:
+                    result = func(db, *args, **kwargs)
+                except deadlines.DeadlineExceeded:
+                    result = deadlines.exceeded_error()
+                finally:
+                    db.close()
+                    if limiter is not None:
+                        limiter.release()
+                    metrics.observe(f"mcp.{name}", time.perf_counter() - started)
+        if isinstance(result, ErrorResponse):
+            metrics.incr(f"mcp.{name}.errors")
+            return ToolResult(
+                content=result.model_dump_json(),
+                structured_content=result.model_dump(),
+                is_error=True,
+            )
+        return result
+
+    # Hide the injected session from the tool's input schema
+    wrapper.__signature__ = signature.replace(parameters=params)
+    wrapper.__annotations__ = {**{k: v for k, v in func.__annotations__.items() if k != 'db'}, 'timeout_ms': TimeoutMs}
+    return mcp.tool()(wrapper)
+
+
+@service_tool
+def list_flights(db: Session) -> list[FlightOut]:
+    """List all available flights.
+    Returns a list of flights with origin, destination, times, price, and seats available."""
+    return flight.list_flights(db)
+
+
+@service_tool
+def search_flights(
+    db: Session,
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    departs_after: Optional[str] = None,
+    departs_before: Optional[str] = None,
+    seat_class: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> list[FlightOut]:
+    """Search flights by origin and/or destination and departure window, ordered by departure.
+    Dates are ISO 8601 (e.g. '2099-01-01' or '2099-01-01T09:00:00Z'); departs_before with a bare date
+    includes that whole day. With seat_class, only flights with seats left in that class are returned.
+    Prefer this over list_flights when looking for a specific route or date."""
+    return flight.search_flights(db, origin, destination, departs_after, departs_before, seat_class, limit)
+
+
+@service_tool
+def get_fare_calendar(
+    db: Session,
+    origin: str,
+    destination: str,
+    seat_class: str = "economy",
+    start: Optional[str] = None,
+    days: int = 31,
+) -> list[FareDay]:
+    """Cheapest available fare per departure day on a route, e.g. to answer
+    "when is the cheapest Earth to Mars flight this month?".
+    start is an ISO 8601 date (default today, UTC) and days the number of days covered (1-366).
+    Returns one entry per day that still has seats in seat_class, with that day's cheapest
+    flight_id and price; book it with book_flight. Much cheaper than scanning list_flights."""
+    return flight.get_fare_calendar(db, origin, destination, seat_class, start, days)
+
+
+@service_tool
+def book_flight(db: Session, user_id: int, name: str, flight_id: int, seat_class: str = "economy") -> BookingOut:
+    """Book a seat on a specific flight for a user in the specified seat class.
+    Requires user_id, name, and flight_id.
+    Optional seat_class: 'economy' (default), 'business', or 'galaxium'.
+    Decrements available seats for the selected class if successful.
+    Returns booking details, or an error result with an error_code
+    (e.g. NO_SEATS_AVAILABLE, NAME_MISMATCH) if booking is not possible."""
+    if booking_queue.running:
+        return booking_queue.book(user_id, name, flight_id, seat_class)
+    return booking.book_flight(db, user_id, name, flight_id, seat_class)
+
+
+@service_tool
+def get_bookings(db: Session, user_id: int, include_history: bool = False) -> list[BookingOut]:
+    """Retrieve all bookings for a specific user by user_id.
+    Returns a list of booking details for the user. Bookings of past flights and old
+    cancellations are archived; set include_history to include them."""
+    return booking.get_bookings(db, user_id, include_history)
+
+
+@service_tool
+def get_booking_details(db: Session, user_id: int) -> list[BookingWithFlightOut]:
+    """Retrieve a user's bookings, each with its flight's origin, destination, times and prices.
+    Use this instead of get_bookings followed by list_flights when showing a user's trips."""
+    return booking.get_bookings_with_flights(db, user_id)
+
+
+@service_tool
+def cancel_booking(db: Session, booking_id: int) -> BookingOut:
+    """Cancel an existing booking by its booking_id.
+    Increments available seats for the flight if successful.
+    Returns updated booking details, or an error result with an error_code
+    (BOOKING_NOT_FOUND, ALREADY_CANCELLED) if the booking cannot be cancelled."""
+    return booking.cancel_booking(db, booking_id)
+
+
+@service_tool
+def change_booking(
+    db: Session,
+    booking_id: int,
+    flight_id: Optional[int] = None,
+    seat_class: Optional[str] = None,
+) -> BookingChangeOut:
+    """Move an existing booking to another flight and/or seat class, keeping its booking_id.
+    Pass flight_id, seat_class or both; omitted ones stay as they are. The old seat is released
+    and the new one claimed in one step, so the booking is never lost if the new class is full.
+    Returns the updated booking with price_difference (new price minus the price paid; negative
+    means a refund), or an error result with an error_code (e.g. NO_SEATS_AVAILABLE,
+    BOOKING_NOT_CHANGEABLE, BOOKING_CHANGED)."""
+    return booking.change_booking(db, booking_id, flight_id, seat_class)
+
+
+@service_tool
+def join_waitlist(db: Session, user_id: int, name: str, flight_id: int, seat_class: str = "economy") -> WaitlistOut:
+    """Join the waitlist for a sold-out flight in the specified seat class.
+    Use this when book_flight returns NO_SEATS_AVAILABLE instead of polling list_flights:
+    the first waiting user is booked automatically when a seat in that class is cancelled.
+    Returns the waitlist entry with its waitlist_id and queue position."""
+    return waitlist.join_waitlist(db, user_id, name, flight_id, seat_class)
+
+
+@service_tool
+def get_waitlist_status(db: Session, waitlist_id: int) -> WaitlistOut:
+    """Check a waitlist entry by waitlist_id.
+    Returns status 'waiting' with the queue position, or 'promoted' with the booking_id
+    of the booking that was made automatically."""
+    return waitlist.get_waitlist_entry(db, waitlist_id)
+
+
+@service_tool
+def register_user(db: Session, name: str, email: str) -> UserOut:
+    """Register a new user with a name and unique email.
+    Returns the created user's details, or an error result with an error_code
+    (INVALID_EMAIL, EMAIL_EXISTS) if registration fails."""
+    return user.register_user(db, name, email)
+
+
+@service_tool
+def get_user_id(db: Session, name: str, email: str) -> UserOut:
+    """Retrieve a user's information, including user_id, by providing both name and email.
+    Returns user details, or an error result with error_code USER_NOT_FOUND."""
+    return user.get_user(db, name, email)
@@ -0,0 +1,59 @@
+"""In-process metrics registry, exposed at GET /metrics.
+
+Counters and timings are recorded with `incr`/`observe`; components that
+already track their own statistics (e.g. caches) `register` a provider
+callable that is evaluated on every snapshot.
+"""
+import threading
+from collections import defaultdict
+from typing import Callable
+
+_lock = threading.Lock()
+_counters: dict[str, int] = defaultdict(int)
+_timings: dict[str, list[float]] = {}  # name -> [count, total_seconds, max_seconds]
+_providers: dict[str, Callable[[], dict]] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, seconds: float) -> None:
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            _timings[name] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            if seconds > timing[2]:
+                timing[2] = seconds
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    with _lock:
+        result = {
+            'counters': dict(_counters),
+            'timings': {
+                name: {
+                    'count': int(count),
+                    'avg_ms': round(total / count * 1000, 3),
+                    'max_ms': round(peak * 1000, 3),
+                }
+                for name, (count, total, peak) in _timings.items()
+            },
+        }
+    for name, provider in _providers.items():
+        result[name] = provider()
+    return result
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timings.clear()
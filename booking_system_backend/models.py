@@ -1,6 +1,7 @@
 from enum import Enum
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
@@ -10,12 +11,22 @@ class BookingStatus(str, Enum):
     CANCELED = "cancelled"  # American spelling alias
     COMPLETED = "completed"
 
+class WaitlistStatus(str, Enum):
+    WAITING = "waiting"
+    PROMOTED = "promoted"  # A seat was freed and booked for the user
+    CANCELLED = "cancelled"
+
 class User(Base):
     __tablename__ = 'users'
     user_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
 
+def _initial_seats(column: str):
+    """Default a capacity column to the seats available when the flight is created."""
+    return lambda context: context.get_current_parameters()[column]
+
+
 class Flight(Base):
     __tablename__ = 'flights'
     flight_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -27,6 +38,18 @@ class Flight(Base):
     economy_seats_available = Column(Integer, nullable=False)  # 60% of total
     business_seats_available = Column(Integer, nullable=False)  # 30% of total
     galaxium_seats_available = Column(Integer, nullable=False)  # 10% of total
+    # Capacity per class, for reconciling the counters above (services.reconcile); nullable
+    # because db.init_db adds these columns to existing databases
+    economy_seats_total = Column(Integer, default=_initial_seats('economy_seats_available'))
+    business_seats_total = Column(Integer, default=_initial_seats('business_seats_available'))
+    galaxium_seats_total = Column(Integer, default=_initial_seats('galaxium_seats_available'))
+
+    __table_args__ = (
+        # Landed flights for the booking lifecycle job (services.lifecycle)
+        Index('ix_flights_arrival', 'arrival_time'),
+        # Matching schedule rows to existing flights (services.schedule)
+        Index('ix_flights_schedule', 'origin', 'destination', 'departure_time'),
+    )
 
 class Booking(Base):
     __tablename__ = 'bookings'
@@ -36,4 +59,97 @@ class Booking(Base):
     status = Column(String, nullable=False)
     booking_time = Column(String, nullable=False)
     seat_class = Column(String, nullable=False, default='economy')  # economy/business/galaxium
-    price_paid = Column(Integer, nullable=False)  # Actual price at booking time
\ No newline at end of file
+    price_paid = Column(Integer, nullable=False)  # Actual price at booking time
+    # Read-only: bookings are created and updated through flight_id; joinedload(Booking.flight)
+    # fetches the flight in the same query
+    flight = relationship('Flight', viewonly=True)
+
+    __table_args__ = (
+        # A flight's bookings in one status without scanning the table; seat_class makes it
+        # covering for the held-seat counts of services.reconcile
+        Index('ix_bookings_flight_status', 'flight_id', 'status', 'seat_class'),
+    )
+
+
+class BookingArchive(Base):
+    """Completed and cancelled bookings moved out of `bookings` by services.archive."""
+    __tablename__ = 'bookings_archive'
+    booking_id = Column(Integer, primary_key=True, autoincrement=False)  # Kept from `bookings`
+    user_id = Column(Integer, nullable=False, index=True)
+    flight_id = Column(Integer, nullable=False, index=True)
+    status = Column(String, nullable=False)
+    booking_time = Column(String, nullable=False)
+    seat_class = Column(String, nullable=False)
+    price_paid = Column(Integer, nullable=False)
+    archived_at = Column(String, nullable=False)
+
+
+class WaitlistEntry(Base):
+    __tablename__ = 'waitlist'
+    waitlist_id = Column(Integer, primary_key=True, index=True, autoincrement=True)  # Also the FIFO order
+    user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
+    flight_id = Column(Integer, ForeignKey('flights.flight_id'), nullable=False)
+    seat_class = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='waiting')
+    created_at = Column(String, nullable=False)
+    booking_id = Column(Integer, ForeignKey('bookings.booking_id'), nullable=True)  # Set on promotion
+
+    __table_args__ = (
+        # Head of the queue for a flight/class is a single index seek
+        Index('ix_waitlist_queue', 'flight_id', 'seat_class', 'status', 'waitlist_id'),
+    )
+
+
+class BookingChange(Base):
+    """A booking moved to another flight or seat class by services.booking.change_booking."""
+    __tablename__ = 'booking_changes'
+    change_id = Column(Integer, primary_key=True, autoincrement=True)
+    booking_id = Column(Integer, nullable=False, index=True)
+    flight_id = Column(Integer, nullable=False)  # New flight; also routes the row to the booking's shard
+    seat_class = Column(String, nullable=False)
+    from_flight_id = Column(Integer, nullable=False)
+    from_seat_class = Column(String, nullable=False)
+    price_difference = Column(Integer, nullable=False)  # New price minus the price paid before
+    changed_at = Column(String, nullable=False)
+
+
+class BookingEvent(Base):
+    """Append-only log of seat claims, releases and status changes, written by event_log.EventLog."""
+    __tablename__ = 'booking_events'
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)  # booked / cancelled / status
+    booking_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    flight_id = Column(Integer, nullable=False)
+    seat_class = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # Status after the event
+    price_paid = Column(Integer, nullable=False)
+    recorded_at = Column(String, nullable=False)
+
+
+class BookingEventCheckpoint(Base):
+    """Totals of booking events removed by compaction (services.events.compact_events)."""
+    __tablename__ = 'booking_event_checkpoints'
+    flight_id = Column(Integer, primary_key=True)
+    seat_class = Column(String, primary_key=True)
+    seats_held = Column(Integer, nullable=False, default=0)
+    claims = Column(Integer, nullable=False, default=0)
+    releases = Column(Integer, nullable=False, default=0)
+    completions = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+
+
+class CacheInvalidation(Base):
+    """Append-only log of cache invalidations, polled by every server process."""
+    __tablename__ = 'cache_invalidations'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    scope = Column(String, nullable=False)
+    key = Column(String, nullable=False)
+    origin = Column(String, nullable=True)  # invalidation.PROCESS_ID of the writer
+
+
+class IdSequence(Base):
+    """Global id counters for rows stored on inventory shards (see db.ShardRouter)."""
+    __tablename__ = 'id_sequences'
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)
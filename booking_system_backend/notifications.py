@@ -0,0 +1,45 @@
+"""In-process wake-ups for long-polling clients.
+
+Service code (running in worker threads) calls `notify(key)` after a
+commit; request handlers `await wait(key, timeout)` on the event loop.
+Notifications are a latency optimization only: waiters always re-read the
+database, so a change made by another worker process is still picked up
+when the wait times out.
+"""
+import asyncio
+import threading
+from typing import Hashable
+
+
+class Notifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: dict[Hashable, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def notify(self, key: Hashable) -> None:
+        """Wake every coroutine waiting on `key`; safe to call from any thread."""
+        with self._lock:
+            waiters = self._waiters.pop(key, ())
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, key: Hashable, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for `key` to be notified; True if it was."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+
+waitlist_notifier = Notifier()
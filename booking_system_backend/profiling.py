@@ -0,0 +1,277 @@
+"""On-demand profiling of the running server, for the admin endpoints.
+
+- `sample_stacks` is a sampling profiler. For a fixed number of seconds it
+  reads every thread's stack (`sys._current_frames`) at a fixed interval.
+  The result is a count per distinct stack, written out as collapsed
+  stacks ("thread;outer;...;inner count"), the input format of
+  flamegraph.pl and speedscope.
+- `memory_diff` takes a tracemalloc snapshot, waits, takes another one and
+  returns the source lines whose allocations grew the most. It starts
+  tracemalloc only for its run, so tracing costs nothing the rest of the
+  time.
+- `SlowRequestTracing` is an ASGI middleware. It keeps the latest requests
+  slower than a threshold per route in `slow_requests`, each with the SQL
+  statements it ran and their timings (without parameters, which may hold
+  personal data). Work handed to another thread is traced if it runs under
+  `recording(request_sql())`, as the booking pipeline's writer does.
+
+Nothing here runs unless asked. With `slow_requests` None (the default),
+the middleware passes requests straight through and no SQL hooks are
+installed.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import config
+import metrics
+
+MAX_TRACE_STATEMENTS = 100  # SQL statements kept per traced request
+MAX_STATEMENT_LENGTH = 2000
+
+# Leaf frames of threads that are only waiting for work; left out of profiles by default
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+}
+
+# Only one profile or memory diff at a time: they would skew each other
+_busy = threading.Lock()
+
+
+def collapsed_stacks(counts: Counter) -> str:
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> Optional[Counter]:
+    """Stack samples of all other threads for `seconds`; None if a profile is already running."""
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        counts: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if not include_idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                counts[';'.join(reversed(stack))] += 1
+            time.sleep(interval)
+        metrics.incr('profiling.profiles')
+        return counts
+    finally:
+        _busy.release()
+
+
+def memory_diff(seconds: float, limit: int = 25, frames: int = 1) -> Optional[dict]:
+    """Allocation growth per source line over `seconds`; None if a profile is already running.
+
+    `frames` > 1 groups by call stack (that many frames deep) instead of by line.
+    """
+    if not _busy.acquire(blocking=False):
+        return None
+    started = not tracemalloc.is_tracing()
+    try:
+        if started:
+            tracemalloc.start(frames)
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+        _busy.release()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>')]
+    key = 'traceback' if frames > 1 else 'lineno'
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), key)
+    metrics.incr('profiling.memory_diffs')
+    return {
+        'seconds': seconds,
+        'traced_peak_bytes': peak,
+        'top': [
+            {
+                'location': [f'{frame.filename}:{frame.lineno}' for frame in stat.traceback],
+                'size_diff_bytes': stat.size_diff,
+                'count_diff': stat.count_diff,
+                'size_bytes': stat.size,
+                'count': stat.count,
+            }
+            for stat in stats[:limit]
+        ],
+    }
+
+
+class _RequestSQL:
+    __slots__ = ('statements', 'total')
+
+    def __init__(self):
+        self.statements: list[dict] = []
+        self.total = 0
+
+    def add(self, statement: dict) -> None:
+        self.total += 1
+        if len(self.statements) < MAX_TRACE_STATEMENTS:
+            self.statements.append(statement)
+
+
+class _SharedSQL:
+    """Statements run once on behalf of several traced requests, e.g. a group commit."""
+    __slots__ = ('logs',)
+
+    def __init__(self, logs: list[_RequestSQL]):
+        self.logs = logs
+
+    def add(self, statement: dict) -> None:
+        for log in self.logs:
+            log.add(statement)
+
+
+# The SQL log of the request being traced in this context; the executor threads running
+# sync endpoints get a copy of the context, so they append to the same log
+_current: contextvars.ContextVar[Optional[_RequestSQL | _SharedSQL]] = contextvars.ContextVar('traced_request_sql', default=None)
+
+
+def request_sql() -> Optional[_RequestSQL]:
+    """The SQL log of the request traced in this context, for handing work to another thread."""
+    log = _current.get()
+    return log if isinstance(log, _RequestSQL) else None
+
+
+@contextmanager
+def recording(*logs: Optional[_RequestSQL]):
+    """Record the SQL run in the block into the given request logs (None: not traced)."""
+    logs = [log for log in logs if log is not None]
+    if not logs:
+        yield
+        return
+    token = _current.set(logs[0] if len(logs) == 1 else _SharedSQL(logs))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('profiling_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = _current.get()
+    started = conn.info.get('profiling_started')
+    if log is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    log.add({
+        'sql': statement[:MAX_STATEMENT_LENGTH],
+        'ms': round(elapsed * 1000, 3),
+        'executemany': executemany,
+    })
+
+
+def _install_sql_hooks() -> None:
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+class SlowRequestLog:
+    """The latest `per_route` requests per route that took at least `threshold` seconds."""
+
+    def __init__(self, threshold: float, per_route: int = 20):
+        self.threshold = threshold
+        self.per_route = per_route
+        self._traces: dict[str, deque] = {}
+        self._lock = threading.Lock()
+        _install_sql_hooks()
+
+    def record(self, route: str, path: str, status: int, seconds: float, sql: _RequestSQL) -> None:
+        if seconds < self.threshold:
+            return
+        metrics.incr('profiling.slow_requests')
+        trace = {
+            'path': path,
+            'status': status,
+            'ms': round(seconds * 1000, 3),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'sql_count': sql.total,
+            'sql_ms': round(sum(s['ms'] for s in sql.statements), 3),
+            'sql': sql.statements,
+        }
+        with self._lock:
+            traces = self._traces.get(route)
+            if traces is None:
+                traces = self._traces[route] = deque(maxlen=self.per_route)
+            traces.appendleft(trace)
+
+    def traces(self) -> dict[str, list[dict]]:
+        """Traces per route ("METHOD /path/{param}"), newest first."""
+        with self._lock:
+            return {route: list(traces) for route, traces in self._traces.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+def _untraced(scope) -> bool:
+    path = scope['path']
+    # Admin calls and open-ended streams (SSE, the MCP GET stream) would only add noise
+    return path.startswith('/admin/') or path == '/flights/stream' or (path.startswith('/mcp') and scope['method'] == 'GET')
+
+
+class SlowRequestTracing:
+    """ASGI middleware recording slow requests in the module's `slow_requests` (None disables it)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        log = slow_requests
+        if log is None or scope['type'] != 'http' or _untraced(scope):
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_and_note_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        sql = _RequestSQL()
+        token = _current.set(sql)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_note_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = scope.get('route')
+            log.record(f"{scope['method']} {getattr(route, 'path', scope['path'])}", scope['path'], status, elapsed, sql)
+
+
+slow_requests = (
+    SlowRequestLog(config.SLOW_REQUEST_MS / 1000, config.SLOW_REQUEST_TRACES)
+    if config.SLOW_REQUEST_MS > 0 else None
+)
@@ -0,0 +1,45 @@
+"""Check flight seat counters against the bookings, and optionally repair them.
+
+Usage:
+    python reconcile_seats.py
+    python reconcile_seats.py --repair
+
+Prints one JSON line per drifted counter to stdout and a summary to stderr;
+exits with status 1 if drift was found and not repaired. Safe to run while
+the server is up.
+"""
+import argparse
+import sys
+import time
+
+from db import SessionLocal, init_db
+from services import reconcile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile seat counters with bookings.")
+    parser.add_argument("--repair", action="store_true", help="Reset drifted counters to the expected values")
+    parser.add_argument("--batch-size", type=int, default=reconcile.RECONCILE_BATCH_SIZE, help="Flights per query")
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        result = reconcile.reconcile_seats(db, args.repair, args.batch_size)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    for drift in result.drift:
+        print(drift.model_dump_json())
+    print(f"Checked {result.flights_checked} flights in {elapsed:.1f}s: {len(result.drift)} drifted counters, "
+          f"{result.repaired} flights repaired", file=sys.stderr)
+    if result.capacity_unchecked:
+        print(f"{result.capacity_unchecked} flights without recorded capacity could not be checked"
+              + (f"; capacity backfilled for {result.capacity_backfilled}" if args.repair else "; run with --repair to backfill it"),
+              file=sys.stderr)
+    return 1 if result.drift and not args.repair else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
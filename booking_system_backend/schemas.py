@@ -24,6 +24,12 @@ class FlightOut(BaseModel):
         from_attributes = True
 
 
+class FareDay(BaseModel):
+    date: str  # Departure day (UTC), YYYY-MM-DD
+    flight_id: int  # Cheapest flight of the day with a seat left in the class
+    price: int
+
+
 class BookingRequest(BaseModel):
     user_id: int
     name: str
@@ -44,6 +50,40 @@ class BookingOut(BaseModel):
         from_attributes = True
 
 
+class BookingWithFlightOut(BookingOut):
+    flight: Optional[FlightOut] = None  # None if the flight no longer exists
+
+
+class BookingChangeRequest(BaseModel):
+    flight_id: Optional[int] = None  # Keep the current flight if omitted
+    seat_class: Optional[SeatClass] = None  # Keep the current class if omitted
+
+
+class BookingChangeOut(BookingOut):
+    price_difference: int  # New price minus the price paid before; negative means a refund
+
+
+class WaitlistRequest(BaseModel):
+    user_id: int
+    name: str
+    flight_id: int
+    seat_class: SeatClass = 'economy'
+
+
+class WaitlistOut(BaseModel):
+    waitlist_id: int
+    user_id: int
+    flight_id: int
+    seat_class: str
+    status: str
+    created_at: str
+    position: Optional[int] = None  # 1-based place in the queue while waiting
+    booking_id: Optional[int] = None  # Booking created on promotion
+
+    class Config:
+        from_attributes = True
+
+
 class UserRegistration(BaseModel):
     name: str
     email: EmailStr
@@ -58,6 +98,99 @@ class UserOut(BaseModel):
         from_attributes = True
 
 
+class UserBatchEntry(BaseModel):
+    name: str
+    email: str  # Validated per row so one bad address doesn't reject the whole batch
+
+
+class UserBatchRegistration(BaseModel):
+    users: list[UserBatchEntry]
+
+
+class BatchRowError(BaseModel):
+    index: int  # Position of the row in the submitted batch
+    email: Optional[str]  # None when the row has no email
+    error: str
+    error_code: str
+    details: Optional[str] = None
+
+
+class BatchRegistrationOut(BaseModel):
+    created: int
+    failed: int
+    users: list[UserOut] = []
+    errors: list[BatchRowError] = []
+
+
+class ScheduleRowError(BaseModel):
+    index: int  # Position of the row in the schedule, header excluded
+    error: str
+    error_code: str
+    details: Optional[str] = None
+
+
+class ScheduleImportOut(BaseModel):
+    created: int = 0
+    updated: int = 0
+    seats_preserved: int = 0  # Updated flights whose seat counts were kept because of bookings
+    failed: int = 0
+    chunks: int = 0
+    errors: list[ScheduleRowError] = []  # The first rejected rows
+
+
+class ArchiveOut(BaseModel):
+    archived: int
+    chunks: int
+    departed_before: str
+    cancelled_before: str
+
+
+class LifecycleOut(BaseModel):
+    completed: int
+    chunks: int
+    landed_before: str
+
+
+class SeatDrift(BaseModel):
+    flight_id: int
+    seat_class: str
+    seats_held: int  # Booked or completed bookings in this class
+    # None when the flight or seat class does not exist, so no counter can match
+    seats_available: Optional[int] = None
+    expected_available: Optional[int] = None
+
+
+class ReconcileOut(BaseModel):
+    flights_checked: int
+    drift: list[SeatDrift]
+    repaired: int  # Flights whose counters were reset to the expected values
+    capacity_unchecked: int  # Flights without recorded capacity, which could not be checked
+    capacity_backfilled: int  # Of those, flights whose capacity was recorded in this run (repair only)
+
+
+class FlightActivity(BaseModel):
+    flight_id: int
+    seat_class: str
+    seats_held: int
+    claims: int
+    releases: int
+    completions: int
+    revenue: int  # Price of claimed seats not released again
+
+
+class ReplayOut(BaseModel):
+    events: int
+    last_seq: Optional[int] = None
+    flights: list[FlightActivity]
+    counters_updated: int = 0  # Flights whose seat counters were rebuilt from the events
+
+
+class CompactOut(BaseModel):
+    compacted: int
+    through_seq: Optional[int] = None
+    output: Optional[str] = None
+
+
 class ErrorResponse(BaseModel):
     success: bool = False
     error: str
@@ -1,15 +1,18 @@
-from models import Base, User, Flight, Booking
-from db import engine, SessionLocal
+from models import (
+    User, Flight, Booking, BookingArchive, BookingChange, BookingEvent, BookingEventCheckpoint, WaitlistEntry,
+)
+from db import init_db, SessionLocal
+from services.schedule import seat_distribution
 from datetime import datetime, timedelta
 import random
 
 def seed():
-    Base.metadata.create_all(bind=engine)
+    init_db()
     db = SessionLocal()
-    # Clear existing data
-    db.query(Booking).delete()
-    db.query(User).delete()
-    db.query(Flight).delete()
+    # Clear existing data, including everything that refers to flights or users:
+    # the new flights reuse their ids, and old rows would attach to them
+    for model in (BookingChange, BookingEvent, BookingEventCheckpoint, WaitlistEntry, BookingArchive, Booking, User, Flight):
+        db.query(model).delete()
     db.commit()
     # Add demo users
     users = [
@@ -42,36 +45,23 @@ def seed():
     
     flights = []
     for origin, destination, departure, arrival, base_price, total_seats in flight_data:
-        # Calculate seat distribution: 60% economy, 30% business, 10% galaxium
-        economy_seats = int(total_seats * 0.6)
-        business_seats = int(total_seats * 0.3)
-        galaxium_seats = int(total_seats * 0.1)
-        
-        # Ensure at least 1 seat in each class if total_seats >= 3
-        if total_seats >= 3:
-            if economy_seats == 0:
-                economy_seats = 1
-            if business_seats == 0:
-                business_seats = 1
-            if galaxium_seats == 0:
-                galaxium_seats = 1
-        
+        seats = seat_distribution(total_seats)
         flights.append(Flight(
             origin=origin,
             destination=destination,
             departure_time=departure,
             arrival_time=arrival,
             base_price=base_price,
-            economy_seats_available=economy_seats,
-            business_seats_available=business_seats,
-            galaxium_seats_available=galaxium_seats
+            economy_seats_available=seats['economy'],
+            business_seats_available=seats['business'],
+            galaxium_seats_available=seats['galaxium']
         ))
     db.add_all(flights)
     db.commit()
     # Add demo bookings with seat classes
     user_ids = [user.user_id for user in db.query(User).all()]
     flight_ids = [flight.flight_id for flight in db.query(Flight).all()]
-    statuses = ["booked", "cancelled", "completed"]
+    statuses = ["booked", "cancelled"]  # Bookings become completed once their flight lands (services.lifecycle)
     seat_classes = ["economy", "business", "galaxium"]
     seat_class_weights = [0.6, 0.3, 0.1]  # 60% economy, 30% business, 10% galaxium
     
@@ -93,6 +83,13 @@ def seed():
         else:  # galaxium
             price_paid = flight.base_price * 5
         
+        if status == "booked":
+            # Keep the seat counters consistent with the bookings (see services.reconcile)
+            counter = f"{seat_class}_seats_available"
+            if getattr(flight, counter) < 1:
+                continue
+            setattr(flight, counter, getattr(flight, counter) - 1)
+
         bookings.append(Booking(
             user_id=user_id,
             flight_id=flight_id,
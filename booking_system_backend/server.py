@@ -1,116 +1,220 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import functools
+import hmac
+import json
+import logging
+import tempfile
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import FastAPI, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastmcp import FastMCP
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Union
-from db import SessionLocal, init_db, get_db
+from typing import Optional, Union
+import config
+import metrics
+import profiling
+from admission import AdmissionControl
+from compression import CompressionMiddleware
+from event_log import event_log
+from deadlines import DeadlineExceeded, exceeded_error, request_deadline
+from db import SessionLocal, engine, has_data, init_db, get_db, get_read_db, replicas, startup_lock
+from fares import MAX_DAYS as MAX_FARE_DAYS
+import invalidation
+from invalidation import InvalidationListener
+from jobs import PeriodicJob
+from live_updates import broadcaster
+from notifications import waitlist_notifier
 from seed import seed
-from services import flight, user, booking
-from schemas import FlightOut, BookingOut, UserOut, ErrorResponse, BookingRequest, UserRegistration
+from services import flight, user, booking, export, waitlist, archive, lifecycle, reconcile, events, schedule
+from services.booking_queue import booking_queue
+from versions import data_versions, etag_matches
+from schemas import (
+    FlightOut, FareDay, BookingOut, BookingWithFlightOut, UserOut, ErrorResponse, BookingRequest, UserRegistration,
+    BookingChangeRequest, BookingChangeOut, ScheduleImportOut, UserBatchRegistration, BatchRegistrationOut, WaitlistRequest, WaitlistOut,
+)
 
+logger = logging.getLogger(__name__)
 
-# ==================== MCP SERVER (for AI agents) ====================
-# NOTE: MCP server must be created before FastAPI app to properly combine lifespans
+# Long-polling waiters re-read the database at least this often (seconds),
+# so promotions made by another worker process are noticed too
+WAITLIST_RECHECK_INTERVAL = 2.0
 
-mcp = FastMCP("Galaxium Booking System")
+# Schedule uploads larger than this are spooled to disk while they arrive
+SCHEDULE_SPOOL_SIZE = 8 * 1024 * 1024
 
+# Seconds between keep-alives on idle seat availability streams
+SEAT_STREAM_KEEPALIVE = 15.0
 
-@mcp.tool()
-def list_flights() -> list[FlightOut]:
-    """List all available flights.
-    Returns a list of flights with origin, destination, times, price, and seats available."""
-    db = SessionLocal()
-    try:
-        return flight.list_flights(db)
-    finally:
-        db.close()
+# Milliseconds spent in each startup phase, reported at GET /metrics
+startup_phases: dict[str, float] = {}
+metrics.register('startup', lambda: dict(startup_phases))
 
 
-@mcp.tool()
-def book_flight(user_id: int, name: str, flight_id: int, seat_class: str = "economy") -> BookingOut:
-    """Book a seat on a specific flight for a user in the specified seat class.
-    Requires user_id, name, and flight_id.
-    Optional seat_class: 'economy' (default), 'business', or 'galaxium'.
-    Decrements available seats for the selected class if successful.
-    Returns booking details or raises an error if booking is not possible."""
-    db = SessionLocal()
-    try:
-        result = booking.book_flight(db, user_id, name, flight_id, seat_class)
-        if isinstance(result, ErrorResponse):
-            raise Exception(result.details or result.error)
-        return result
-    finally:
-        db.close()
+def _record_phase(name: str, started: float) -> None:
+    startup_phases[name] = round((time.perf_counter() - started) * 1000, 1)
 
 
-@mcp.tool()
-def get_bookings(user_id: int) -> list[BookingOut]:
-    """Retrieve all bookings for a specific user by user_id.
-    Returns a list of booking details for the user."""
-    db = SessionLocal()
-    try:
-        return booking.get_bookings(db, user_id)
-    finally:
-        db.close()
+_record_phase("import_modules", _import_started)
 
 
-@mcp.tool()
-def cancel_booking(booking_id: int) -> BookingOut:
-    """Cancel an existing booking by its booking_id.
-    Increments available seats for the flight if successful.
-    Returns updated booking details or raises an error if already cancelled or not found."""
-    db = SessionLocal()
-    try:
-        result = booking.cancel_booking(db, booking_id)
-        if isinstance(result, ErrorResponse):
-            raise Exception(result.details or result.error)
-        return result
-    finally:
-        db.close()
+# ==================== MCP SERVER (for AI agents) ====================
+# Tools live in mcp_tools.py. GALAXIUM_MCP=eager (default) builds the MCP app
+# at import time, "lazy" defers importing FastMCP until /mcp is first hit,
+# and "off" leaves /mcp unmounted.
 
+def load_mcp_app():
+    started = time.perf_counter()
+    from mcp_tools import mcp
+    mcp_app = mcp.http_app()
+    _record_phase("import_mcp", started)
+    return mcp_app
 
-@mcp.tool()
-def register_user(name: str, email: str) -> UserOut:
-    """Register a new user with a name and unique email.
-    Returns the created user's details or raises an error if the email is already registered."""
-    db = SessionLocal()
-    try:
-        result = user.register_user(db, name, email)
-        if isinstance(result, ErrorResponse):
-            raise Exception(result.details or result.error)
-        return result
-    finally:
-        db.close()
 
+class LazyMCPApp:
+    """ASGI app that imports and starts the MCP server on its first request.
 
-@mcp.tool()
-def get_user_id(name: str, email: str) -> UserOut:
-    """Retrieve a user's information, including user_id, by providing both name and email.
-    Returns user details or raises an error if not found."""
-    db = SessionLocal()
-    try:
-        result = user.get_user(db, name, email)
-        if isinstance(result, ErrorResponse):
-            raise Exception(result.details or result.error)
-        return result
-    finally:
-        db.close()
-
+    The MCP app's lifespan (which owns its session task group) runs in a
+    dedicated task so it is entered and exited in the same task.
+    """
 
-# Create the MCP HTTP app for mounting
-mcp_app = mcp.http_app()
+    def __init__(self):
+        self._app = None
+        self._task = None
+        self._stop = None
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if self._app is None:
+            await self._start()
+        await self._app(scope, receive, send)
+
+    async def _start(self):
+        async with self._lock:
+            if self._app is not None:
+                return
+            mcp_app = load_mcp_app()
+            started = asyncio.Event()
+            self._stop = asyncio.Event()
+
+            async def run():
+                async with mcp_app.lifespan(mcp_app):
+                    started.set()
+                    await self._stop.wait()
+
+            self._task = asyncio.create_task(run())
+            await started.wait()
+            self._app = mcp_app
+
+    async def aclose(self):
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+            self._app = None
+
+
+mcp_app = None
+if config.MCP_MODE == "eager":
+    mcp_app = load_mcp_app()
+elif config.MCP_MODE == "lazy":
+    mcp_app = LazyMCPApp()
 
 
 # ==================== LIFESPAN ====================
 
+def prepare_database():
+    """Create tables and seed demo data, once across all worker processes."""
+    with startup_lock():
+        started = time.perf_counter()
+        init_db()
+        _record_phase("init_db", started)
+        if config.SEED_MODE == "always" or (config.SEED_MODE == "if-empty" and not has_data()):
+            started = time.perf_counter()
+            seed()
+            _record_phase("seed", started)
+        if config.EVENT_LOG:
+            # Bookings made before the event log was enabled start out as its checkpoint
+            db = SessionLocal()
+            try:
+                events.ensure_baseline(db)
+            finally:
+                db.close()
+
+
+def _in_session(job):
+    """Wrap `job(db)` for PeriodicJob, with a fresh session per run."""
+    def run():
+        db = SessionLocal()
+        try:
+            return job(db)
+        finally:
+            db.close()
+    return run
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    init_db()
-    seed()
-    yield
-    # Shutdown (nothing to do)
+    async with AsyncExitStack() as stack:
+        prepare_database()
+        if isinstance(mcp_app, LazyMCPApp):
+            stack.push_async_callback(mcp_app.aclose)
+        elif mcp_app is not None:
+            started = time.perf_counter()
+            await stack.enter_async_context(mcp_app.lifespan(mcp_app))
+            _record_phase("start_mcp", started)
+        await broadcaster.start()
+        stack.push_async_callback(broadcaster.stop)
+        if config.EVENT_LOG:
+            # Started before the booking queue, so it is stopped (and drained) after it
+            event_log.max_batch = config.EVENT_LOG_MAX_BATCH
+            event_log.max_delay = config.EVENT_LOG_MAX_DELAY_MS / 1000
+            event_log.start(engine)
+            stack.callback(event_log.stop)
+            if config.EVENT_LOG_RETENTION_DAYS > 0:
+                compactor = PeriodicJob("compact_events", config.EVENT_LOG_COMPACT_INTERVAL, _in_session(events.compact_events))
+                compactor.start()
+                stack.callback(compactor.stop)
+        if config.BOOKING_PIPELINE:
+            booking_queue.max_batch = config.GROUP_COMMIT_MAX_BATCH
+            booking_queue.max_delay = config.GROUP_COMMIT_MAX_DELAY_MS / 1000
+            booking_queue.start(SessionLocal)
+            stack.callback(booking_queue.stop)
+        if replicas is not None:
+            replicas.start()
+            stack.callback(replicas.stop)
+        if config.ARCHIVE_INTERVAL > 0:
+            archiver = PeriodicJob("archive_bookings", config.ARCHIVE_INTERVAL, _in_session(archive.archive_bookings))
+            archiver.start()
+            stack.callback(archiver.stop)
+        if config.LIFECYCLE_INTERVAL > 0:
+            completer = PeriodicJob("complete_bookings", config.LIFECYCLE_INTERVAL, _in_session(lifecycle.complete_landed_bookings))
+            completer.start()
+            stack.callback(completer.stop)
+        if config.RECONCILE_INTERVAL > 0:
+            reconciler = PeriodicJob(
+                "reconcile_seats", config.RECONCILE_INTERVAL,
+                _in_session(functools.partial(reconcile.reconcile_seats, repair=config.RECONCILE_REPAIR)),
+            )
+            reconciler.start()
+            stack.callback(reconciler.stop)
+        if config.CACHE_SYNC_INTERVAL > 0:
+            listener = InvalidationListener(engine, config.CACHE_SYNC_INTERVAL)
+            listener.start()
+            stack.callback(listener.stop)
+        if invalidation.enabled() and config.CACHE_PRUNE_INTERVAL > 0:
+            pruner = PeriodicJob("prune_invalidations", config.CACHE_PRUNE_INTERVAL, functools.partial(invalidation.prune, engine))
+            pruner.start()
+            stack.callback(pruner.stop)
+        _record_phase("ready", _import_started)
+        logger.info("Startup phases (ms): %s", startup_phases)
+        yield
+    # Shutdown happens as the exit stack unwinds
 
 
 # ==================== FASTAPI APP (REST + Swagger UI) ====================
@@ -122,6 +226,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Middleware added first runs innermost: compression sees the endpoint's response, and
+# admission control sits inside CORS so that rejections still carry CORS headers. Slow
+# request traces include time spent queueing for admission
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionControl)
+app.add_middleware(profiling.SlowRequestTracing)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -131,36 +241,202 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    """Requests that run out of time fail with 504 DEADLINE_EXCEEDED (see deadlines.py)."""
+    return JSONResponse(status_code=504, content=exceeded_error().model_dump())
+
+
 @app.get("/", tags=["Health"])
 def health_check():
     """Health check endpoint."""
     return {"status": "OK"}
 
 
-@app.get("/flights", response_model=list[FlightOut], tags=["Flights"])
-def get_flights(db: Session = Depends(get_db)):
-    """List all available flights with origin, destination, times, price, and seats available."""
+@app.get("/metrics", tags=["Health"])
+def get_metrics():
+    """In-process counters, timings and cache statistics."""
+    return metrics.snapshot()
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """A 304 if the client already holds `etag`; otherwise tag `response` with it."""
+    if replicas is not None:
+        # Replica data may be older than the version the tag names
+        return None
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        metrics.incr('etag.not_modified')
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+@app.get("/flights", response_model=list[FlightOut], tags=["Flights"], dependencies=[Depends(request_deadline)])
+def get_flights(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    """List all available flights with origin, destination, times, price, and seats available.
+
+    Responses carry an ETag; send it back in If-None-Match to get 304 while nothing changed.
+    """
+    not_modified = _not_modified(request, response, data_versions.flights_etag())
+    if not_modified is not None:
+        return not_modified
     return flight.list_flights(db)
 
 
-@app.post("/book", response_model=Union[BookingOut, ErrorResponse], tags=["Bookings"])
-def book_flight_endpoint(request: BookingRequest, db: Session = Depends(get_db)):
+@app.get("/flights/search", response_model=Union[list[FlightOut], ErrorResponse], tags=["Flights"], dependencies=[Depends(request_deadline)])
+def search_flights_endpoint(
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    departs_after: Optional[str] = None,
+    departs_before: Optional[str] = None,
+    seat_class: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    """Search flights by route and departure window, ordered by departure.
+
+    Answered from the in-memory inventory snapshot. With `seat_class`, only
+    flights with seats left in that class are returned.
+    """
+    return flight.search_flights(db, origin, destination, departs_after, departs_before, seat_class, limit)
+
+
+@app.post("/flights/schedule", response_model=ScheduleImportOut, tags=["Flights"])
+async def import_schedule_endpoint(
+    request: Request,
+    format: schedule.ScheduleFormat = "csv",
+    chunk_size: int = Query(schedule.SCHEDULE_CHUNK_SIZE, ge=1, le=50000),
+    db: Session = Depends(get_db),
+):
+    """Create or update flights from a CSV or NDJSON schedule sent as the request body.
+
+    Rows need origin, destination, departure_time, arrival_time, base_price
+    and total_seats; flights are matched on origin, destination and
+    departure time. The body is spooled to a temporary file rather than held
+    in memory. Rejected rows are reported in `errors` with their index.
+    Requires the admin token (`GALAXIUM_ADMIN_TOKEN`) in an X-Admin-Token header.
+    """
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    with tempfile.SpooledTemporaryFile(max_size=SCHEDULE_SPOOL_SIZE) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        return await run_in_threadpool(
+            schedule.import_schedule, db, schedule.read_schedule_bytes(body, format), chunk_size
+        )
+
+
+@app.get("/fares/calendar", response_model=Union[list[FareDay], ErrorResponse], tags=["Flights"], dependencies=[Depends(request_deadline)])
+def fare_calendar_endpoint(
+    origin: str,
+    destination: str,
+    seat_class: str = 'economy',
+    start: Optional[str] = None,
+    days: int = Query(31, ge=1, le=MAX_FARE_DAYS),
+    db: Session = Depends(get_db),
+):
+    """Cheapest available fare per departure day on a route.
+
+    Covers `days` days from `start` (an ISO 8601 date, default today in
+    UTC); days without a seat left in the class are omitted. Answered from
+    the precomputed fare calendar in time proportional to `days`.
+    """
+    return flight.get_fare_calendar(db, origin, destination, seat_class, start, days)
+
+
+@app.get("/flights/stream", tags=["Flights"])
+async def stream_seat_availability(flight_ids: Optional[list[int]] = Query(None)):
+    """Server-Sent Events stream of seat availability changes.
+
+    Each `seats` event carries a JSON list with the latest seat counts of every
+    flight that changed since the previous event; bursts of bookings are
+    coalesced. Optionally restrict to the given `flight_ids`.
+    """
+    subscriber = broadcaster.subscribe(set(flight_ids) if flight_ids else None)
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                batch = await subscriber.next_batch(SEAT_STREAM_KEEPALIVE)
+                if batch:
+                    yield f"event: seats\ndata: {json.dumps(batch)}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/flights/ws")
+async def seat_availability_websocket(websocket: WebSocket, flight_ids: Optional[list[int]] = Query(None)):
+    """WebSocket stream of seat availability changes (same batches as /flights/stream)."""
+    subscriber = broadcaster.subscribe(set(flight_ids) if flight_ids else None)
+    try:
+        await websocket.accept()
+        while True:
+            batch = await subscriber.next_batch(SEAT_STREAM_KEEPALIVE)
+            await websocket.send_json(batch)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@app.post("/book", response_model=Union[BookingOut, ErrorResponse], tags=["Bookings"], dependencies=[Depends(request_deadline)])
+async def book_flight_endpoint(request: BookingRequest, db: Session = Depends(get_db)):
     """Book a seat on a specific flight for a user in the specified seat class.
 
     Requires user_id, name, and flight_id.
     Optional seat_class: 'economy' (default), 'business', or 'galaxium'.
     Decrements available seats for the selected class if successful.
     """
-    return booking.book_flight(db, request.user_id, request.name, request.flight_id, request.seat_class)
+    if booking_queue.running:
+        future = booking_queue.submit(request.user_id, request.name, request.flight_id, request.seat_class)
+        return await asyncio.wrap_future(future)
+    return await run_in_threadpool(
+        booking.book_flight, db, request.user_id, request.name, request.flight_id, request.seat_class
+    )
+
+
+@app.get("/bookings/{user_id}", response_model=list[BookingOut], tags=["Bookings"], dependencies=[Depends(request_deadline)])
+def get_user_bookings(
+    user_id: int,
+    request: Request,
+    response: Response,
+    history: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    """Retrieve all bookings for a specific user by user_id.
 
+    With `history=true`, archived bookings of past flights and old
+    cancellations are included too. Responses carry an ETag; send it back in
+    If-None-Match to get 304 while nothing changed.
+    """
+    not_modified = _not_modified(request, response, data_versions.bookings_etag(user_id))
+    if not_modified is not None:
+        return not_modified
+    return booking.get_bookings(db, user_id, include_history=history)
 
-@app.get("/bookings/{user_id}", response_model=list[BookingOut], tags=["Bookings"])
-def get_user_bookings(user_id: int, db: Session = Depends(get_db)):
-    """Retrieve all bookings for a specific user by user_id."""
-    return booking.get_bookings(db, user_id)
 
+@app.get("/bookings/{user_id}/details", response_model=list[BookingWithFlightOut], tags=["Bookings"], dependencies=[Depends(request_deadline)])
+def get_user_booking_details(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    """Retrieve a user's bookings, each with its flight's route, times and prices.
 
-@app.post("/cancel/{booking_id}", response_model=Union[BookingOut, ErrorResponse], tags=["Bookings"])
+    One request (and one SQL query) instead of GET /bookings/{user_id} plus
+    GET /flights. Responses carry an ETag like GET /bookings/{user_id}.
+    """
+    not_modified = _not_modified(request, response, data_versions.booking_details_etag(user_id))
+    if not_modified is not None:
+        return not_modified
+    return booking.get_bookings_with_flights(db, user_id)
+
+
+@app.post("/cancel/{booking_id}", response_model=Union[BookingOut, ErrorResponse], tags=["Bookings"], dependencies=[Depends(request_deadline)])
 def cancel_booking_endpoint(booking_id: int, db: Session = Depends(get_db)):
     """Cancel an existing booking by its booking_id.
 
@@ -169,25 +445,231 @@ def cancel_booking_endpoint(booking_id: int, db: Session = Depends(get_db)):
     return booking.cancel_booking(db, booking_id)
 
 
-@app.post("/register", response_model=Union[UserOut, ErrorResponse], tags=["Users"])
+@app.post("/bookings/{booking_id}/change", response_model=Union[BookingChangeOut, ErrorResponse], tags=["Bookings"], dependencies=[Depends(request_deadline)])
+def change_booking_endpoint(booking_id: int, request: BookingChangeRequest, db: Session = Depends(get_db)):
+    """Move a booking to another flight and/or seat class.
+
+    The old seat is released and the new one claimed in one transaction;
+    if the new class is sold out, the booking stays as it was. The response
+    carries `price_difference`, the new price minus the price paid before.
+    """
+    return booking.change_booking(db, booking_id, request.flight_id, request.seat_class)
+
+
+@app.post("/waitlist", response_model=Union[WaitlistOut, ErrorResponse], tags=["Waitlist"])
+def join_waitlist_endpoint(request: WaitlistRequest, db: Session = Depends(get_db)):
+    """Join the waitlist for a sold-out flight and seat class.
+
+    When a booking in that class is cancelled, the first waiting user is
+    booked automatically in the same transaction.
+    """
+    return waitlist.join_waitlist(db, request.user_id, request.name, request.flight_id, request.seat_class)
+
+
+def _get_waitlist_entry(waitlist_id: int) -> Union[WaitlistOut, ErrorResponse]:
+    # A session per check: a long-poll must not hold a pooled connection while it waits
+    db = SessionLocal()
+    try:
+        return waitlist.get_waitlist_entry(db, waitlist_id)
+    finally:
+        db.close()
+
+
+@app.get("/waitlist/{waitlist_id}", response_model=Union[WaitlistOut, ErrorResponse], tags=["Waitlist"])
+async def get_waitlist_endpoint(
+    waitlist_id: int,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for a promotion before returning"),
+):
+    """Get a waitlist entry's status and queue position.
+
+    With `wait`, the request is held open until the entry is promoted to a
+    booking (or cancelled) or the timeout expires, so clients don't have to poll.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    result = await run_in_threadpool(_get_waitlist_entry, waitlist_id)
+    while isinstance(result, WaitlistOut) and result.status == "waiting":
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        await waitlist_notifier.wait(waitlist_id, min(remaining, WAITLIST_RECHECK_INTERVAL))
+        result = await run_in_threadpool(_get_waitlist_entry, waitlist_id)
+    return result
+
+
+@app.post("/waitlist/{waitlist_id}/cancel", response_model=Union[WaitlistOut, ErrorResponse], tags=["Waitlist"])
+def leave_waitlist_endpoint(waitlist_id: int, db: Session = Depends(get_db)):
+    """Leave the waitlist."""
+    return waitlist.leave_waitlist(db, waitlist_id)
+
+
+@app.post("/register", response_model=Union[UserOut, ErrorResponse], tags=["Users"], dependencies=[Depends(request_deadline)])
 def register_user_endpoint(request: UserRegistration, db: Session = Depends(get_db)):
     """Register a new user with a name and unique email."""
     return user.register_user(db, request.name, request.email)
 
 
-@app.get("/user", response_model=Union[UserOut, ErrorResponse], tags=["Users"])
-def get_user_endpoint(name: str, email: str, db: Session = Depends(get_db)):
+@app.post("/register/batch", response_model=BatchRegistrationOut, tags=["Users"], dependencies=[Depends(request_deadline)])
+def register_users_batch_endpoint(request: UserBatchRegistration, db: Session = Depends(get_db)):
+    """Register many users in one request.
+
+    Rows with an invalid or already registered email are skipped and reported
+    in `errors` with their index and an `INVALID_EMAIL`/`EMAIL_EXISTS` code.
+    """
+    return user.register_users(db, ((u.name, u.email) for u in request.users))
+
+
+@app.get("/user", response_model=Union[UserOut, ErrorResponse], tags=["Users"], dependencies=[Depends(request_deadline)])
+def get_user_endpoint(name: str, email: str, db: Session = Depends(get_read_db)):
     """Retrieve a user's information by providing both name and email."""
     return user.get_user(db, name, email)
 
 
+@app.get("/export/{table}", response_model=None, tags=["Export"])
+def export_endpoint(
+    request: Request,
+    table: export.ExportTable,
+    format: export.ExportFormat = "csv",
+    since_id: Optional[int] = None,
+    since_booking_time: Optional[str] = None,
+    chunk_size: int = Query(export.DEFAULT_CHUNK_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db),
+):
+    """Stream a full or incremental dump of users, flights, bookings or archived bookings.
+
+    Supports CSV, Arrow IPC stream and Parquet (the latter two require pyarrow).
+    Pass the `X-Export-Watermark` header of the previous export as `since_id`
+    to fetch only rows added since then (safe with a single writer process only).
+    Requires the admin token (`GALAXIUM_ADMIN_TOKEN`) in an X-Admin-Token header,
+    since the dumps hold every user's email and booking ids.
+    """
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    watermark = export.get_watermark(db, table)
+    result = export.export_table(db, table, format, since_id, watermark, since_booking_time, chunk_size)
+    if isinstance(result, ErrorResponse):
+        return result
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        result,
+        media_type=export.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{table}.{extension}"',
+            "X-Export-Watermark": str(watermark),
+        },
+    )
+
+
+# ==================== ADMIN ====================
+
+def _admin_denied(request: Request) -> Optional[Response]:
+    """A 404 while no admin token is configured, a 401 without the right token, else None."""
+    if not config.ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    token = request.headers.get("x-admin-token")
+    if token is None:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else ""
+    if not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        error = ErrorResponse(
+            error="Unauthorized",
+            error_code="ADMIN_TOKEN_REQUIRED",
+            details="Send the admin token in an X-Admin-Token or Authorization: Bearer header."
+        )
+        return JSONResponse(status_code=401, content=error.model_dump())
+    return None
+
+
+def _profile_running() -> JSONResponse:
+    error = ErrorResponse(
+        error="Profile running",
+        error_code="PROFILE_RUNNING",
+        details="Another profile or memory diff is in progress. Retry when it has finished."
+    )
+    return JSONResponse(status_code=409, content=error.model_dump())
+
+
+@app.get("/admin/profile", response_model=None, include_in_schema=False)
+def profile_endpoint(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    include_idle: bool = False,
+):
+    """Sample every thread's stack for `seconds` and return collapsed stacks for a flame graph."""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    counts = profiling.sample_stacks(seconds, interval_ms / 1000, include_idle)
+    if counts is None:
+        return _profile_running()
+    return PlainTextResponse(profiling.collapsed_stacks(counts))
+
+
+@app.get("/admin/memory", response_model=None, include_in_schema=False)
+def memory_endpoint(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=60),
+    limit: int = Query(25, ge=1, le=500),
+    frames: int = Query(1, ge=1, le=25),
+):
+    """The source lines whose allocations grew most over `seconds` (tracemalloc)."""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    result = profiling.memory_diff(seconds, limit, frames)
+    return _profile_running() if result is None else result
+
+
+@app.get("/admin/slow-requests", response_model=None, include_in_schema=False)
+def slow_requests_endpoint(request: Request, clear: bool = False):
+    """The latest slow requests per route, with the SQL each of them ran; `clear` empties the log."""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    log = profiling.slow_requests
+    if log is None:
+        return ErrorResponse(
+            error="Slow request tracing disabled",
+            error_code="TRACING_DISABLED",
+            details="Set GALAXIUM_SLOW_REQUEST_MS to trace requests slower than that many milliseconds."
+        )
+    traces = log.traces()
+    if clear:
+        log.clear()
+    return {"threshold_ms": log.threshold * 1000, "routes": traces}
+
+
 # ==================== MOUNT MCP INTO FASTAPI ====================
 
-app.mount("/mcp", mcp_app)
+if mcp_app is not None:
+    app.mount("/mcp", mcp_app)
 
 
 # ==================== MAIN ====================
 
-if __name__ == "__main__":
+def main(argv=None):
+    import argparse
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+
+    parser = argparse.ArgumentParser(description="Run the Galaxium booking server.")
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+        return
+
+    # Seed once in the supervisor; workers inherit the environment and skip it
+    prepare_database()
+    os.environ["GALAXIUM_SEED"] = "never"
+    os.environ["GALAXIUM_WORKERS"] = str(args.workers)
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
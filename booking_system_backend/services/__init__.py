@@ -1,3 +1,3 @@
-from . import flight, user, booking
+from . import flight, user, booking, export, waitlist, archive, lifecycle, reconcile, events
 
-__all__ = ["flight", "user", "booking"]
+__all__ = ["flight", "user", "booking", "export", "waitlist", "archive", "lifecycle", "reconcile", "events"]
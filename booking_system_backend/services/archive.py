@@ -0,0 +1,69 @@
+"""Move finished bookings out of the hot `bookings` table.
+
+Bookings that are completed or cancelled once their flight has departed,
+and cancellations older than the retention period, are copied to
+`bookings_archive` and deleted from `bookings`. Each chunk is one
+transaction, so the job can be interrupted at any point and the write lock
+is never held for long. `get_bookings(..., include_history=True)` reads
+both tables.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, insert, literal, or_, select
+from sqlalchemy.orm import Session
+import metrics
+from models import Booking, BookingArchive, Flight
+from schemas import ArchiveOut
+
+ARCHIVE_CHUNK_SIZE = 1000
+# Cancellations are kept in `bookings` this long even if the flight has not departed
+CANCELLED_RETENTION_DAYS = 30
+
+_COLUMNS = ['booking_id', 'user_id', 'flight_id', 'status', 'booking_time', 'seat_class', 'price_paid']
+
+
+def archive_bookings(
+    db: Session,
+    departed_before: Optional[str] = None,
+    cancelled_before: Optional[str] = None,
+    chunk_size: int = ARCHIVE_CHUNK_SIZE,
+) -> ArchiveOut:
+    """Archive finished bookings in chunks of `chunk_size`.
+
+    Moves completed or cancelled bookings of flights departing before
+    `departed_before` (default: now) and cancellations booked before
+    `cancelled_before` (default: CANCELLED_RETENTION_DAYS ago).
+    """
+    now = datetime.utcnow()
+    departed_before = departed_before or now.strftime('%Y-%m-%dT%H:%M:%SZ')
+    cancelled_before = cancelled_before or (now - timedelta(days=CANCELLED_RETENTION_DAYS)).isoformat()
+
+    candidates = (
+        select(Booking.booking_id)
+        .join(Flight, Flight.flight_id == Booking.flight_id)
+        .where(or_(
+            and_(Booking.status.in_(("completed", "cancelled")), Flight.departure_time < departed_before),
+            and_(Booking.status == "cancelled", Booking.booking_time < cancelled_before),
+        ))
+        .order_by(Booking.booking_id)
+        .limit(chunk_size)
+    )
+
+    archived = chunks = 0
+    while True:
+        ids = sorted(db.execute(candidates).scalars().all())[:chunk_size]
+        if not ids:
+            break
+        archived_at = datetime.utcnow().isoformat()
+        db.execute(insert(BookingArchive).from_select(
+            _COLUMNS + ['archived_at'],
+            select(*(getattr(Booking, c) for c in _COLUMNS), literal(archived_at)).where(Booking.booking_id.in_(ids)),
+        ))
+        db.execute(delete(Booking).where(Booking.booking_id.in_(ids)))
+        db.commit()
+        archived += len(ids)
+        chunks += 1
+
+    metrics.incr('archive.bookings', archived)
+    return ArchiveOut(archived=archived, chunks=chunks, departed_before=departed_before, cancelled_before=cancelled_before)
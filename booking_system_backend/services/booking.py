@@ -1,8 +1,18 @@
-from sqlalchemy.orm import Session
+import logging
+from typing import Optional
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
-from models import User, Flight, Booking
-from schemas import BookingOut, ErrorResponse, SeatClass
+import metrics
+from inventory import SEATS_ONLY
+from live_updates import announce_seats
+from models import Flight, Booking, BookingArchive, BookingChange, BookingStatus, WaitlistEntry
+from notifications import waitlist_notifier
+from schemas import BookingChangeOut, BookingOut, BookingWithFlightOut, ErrorResponse, SeatClass
+from services.flight import flight_out
+from services.user import lookup_user
 
+logger = logging.getLogger(__name__)
 
 # Price multipliers for each seat class
 SEAT_CLASS_MULTIPLIERS = {
@@ -11,9 +21,31 @@ SEAT_CLASS_MULTIPLIERS = {
     'galaxium': 5.0
 }
 
+# Flight column holding the seat counter for each class
+SEAT_COUNTER_COLUMNS = {
+    'economy': 'economy_seats_available',
+    'business': 'business_seats_available',
+    'galaxium': 'galaxium_seats_available'
+}
+
 
 def book_flight(db: Session, user_id: int, name: str, flight_id: int, seat_class: SeatClass = 'economy') -> BookingOut | ErrorResponse:
     """Book a seat on a specific flight for a user in the specified seat class."""
+    result = stage_booking(db, user_id, name, flight_id, seat_class)
+    if isinstance(result, ErrorResponse):
+        return result
+    db.commit()
+    db.refresh(result)
+    return BookingOut.model_validate(result)
+
+
+def stage_booking(db: Session, user_id: int, name: str, flight_id: int, seat_class: SeatClass = 'economy') -> Booking | ErrorResponse:
+    """Validate a booking and apply it to the session without committing.
+
+    All checks happen before anything is modified, so an ErrorResponse
+    leaves the session untouched. Used by `book_flight` and by the group
+    commit queue, which stages many bookings before a single commit.
+    """
     # Validate seat class
     if seat_class not in SEAT_CLASS_MULTIPLIERS:
         return ErrorResponse(
@@ -43,13 +75,17 @@ def book_flight(db: Session, user_id: int, name: str, flight_id: int, seat_class
         return ErrorResponse(
             error=f"No {seat_class} seats available",
             error_code="NO_SEATS_AVAILABLE",
-            details=f"The flight has no available seats in {seat_class} class. Please try a different class or check other flights."
+            details=f"The flight has no available seats in {seat_class} class. Please try a different class, check other flights, or use join_waitlist to be booked automatically when a seat is freed."
         )
 
     # Check user exists and name matches
-    user = db.query(User).filter(User.user_id == user_id, User.name == name).first()
-    if not user:
-        existing_user = db.query(User).filter(User.user_id == user_id).first()
+    # Renames made by other processes evict the cached entry through the invalidation log
+    user = lookup_user(db, user_id)
+    if user is not None and user.name != name:
+        # The cached entry may predate a rename; only trust the database for a mismatch
+        user = lookup_user(db, user_id, use_cache=False)
+    if user is None or user.name != name:
+        existing_user = user
         if existing_user:
             return ErrorResponse(
                 error="Name mismatch",
@@ -84,9 +120,8 @@ def book_flight(db: Session, user_id: int, name: str, flight_id: int, seat_class
         price_paid=price_paid
     )
     db.add(new_booking)
-    db.commit()
-    db.refresh(new_booking)
-    return BookingOut.model_validate(new_booking)
+    announce_seats(db, flight)
+    return new_booking
 
 
 def cancel_booking(db: Session, booking_id: int) -> BookingOut | ErrorResponse:
@@ -108,6 +143,7 @@ def cancel_booking(db: Session, booking_id: int) -> BookingOut | ErrorResponse:
 
     # Restore seat to the correct class
     flight = db.query(Flight).filter(Flight.flight_id == booking.flight_id).first()
+    promoted = None
     if flight:
         if booking.seat_class == 'economy':
             flight.economy_seats_available += 1
@@ -115,14 +151,226 @@ def cancel_booking(db: Session, booking_id: int) -> BookingOut | ErrorResponse:
             flight.business_seats_available += 1
         elif booking.seat_class == 'galaxium':
             flight.galaxium_seats_available += 1
+        if booking.seat_class in SEAT_COUNTER_COLUMNS:
+            promoted = promote_from_waitlist(db, flight, booking.seat_class)
+        announce_seats(db, flight)
+    if flight is None or booking.seat_class not in SEAT_COUNTER_COLUMNS:
+        # No counter to restore; services.reconcile reports such bookings
+        logger.warning("Cancelled booking %d without restoring a seat (flight %d, seat class %r)",
+                       booking_id, booking.flight_id, booking.seat_class)
+        metrics.incr('bookings.seat_not_restored')
 
     booking.status = "cancelled"
     db.commit()
+    if promoted is not None:
+        waitlist_notifier.notify(promoted.waitlist_id)
     db.refresh(booking)
     return BookingOut.model_validate(booking)
 
 
-def get_bookings(db: Session, user_id: int) -> list[BookingOut]:
-    """Retrieve all bookings for a specific user."""
+def change_booking(
+    db: Session,
+    booking_id: int,
+    flight_id: Optional[int] = None,
+    seat_class: Optional[SeatClass] = None,
+) -> BookingChangeOut | ErrorResponse:
+    """Move a booking to another flight and/or seat class, keeping its booking_id.
+
+    One short transaction releases the old seat, claims the new one and
+    records the price difference in `booking_changes`. Every write is a
+    conditional UPDATE: the booking must still be booked on its old flight
+    and class, and the new class must still have a seat, so a lost race
+    fails with an error instead of overbooking or releasing a seat twice.
+    The booking row is written first and flights in ascending flight_id
+    order, so two users swapping between the same pair of flights never
+    wait for each other in a cycle.
+    """
+    booking = db.query(Booking).filter(Booking.booking_id == booking_id).first()
+    if not booking:
+        return ErrorResponse(
+            error="Booking not found",
+            error_code="BOOKING_NOT_FOUND",
+            details=f"Booking with ID {booking_id} not found. The booking may have been deleted or the booking_id may be incorrect. Please verify the booking_id or check if the booking exists."
+        )
+
+    if booking.status != BookingStatus.BOOKED.value:
+        return ErrorResponse(
+            error="Booking cannot be changed",
+            error_code="BOOKING_NOT_CHANGEABLE",
+            details=f"Booking {booking_id} is '{booking.status}'; only active bookings can be changed. Please make a new booking instead."
+        )
+
+    new_flight_id = booking.flight_id if flight_id is None else flight_id
+    new_class = booking.seat_class if seat_class is None else seat_class
+    if new_class not in SEAT_CLASS_MULTIPLIERS:
+        return ErrorResponse(
+            error="Invalid seat class",
+            error_code="INVALID_SEAT_CLASS",
+            details=f"Seat class '{new_class}' is not valid. Valid options are: economy, business, galaxium."
+        )
+    if (new_flight_id, new_class) == (booking.flight_id, booking.seat_class):
+        return ErrorResponse(
+            error="Nothing to change",
+            error_code="NO_CHANGE",
+            details=f"Booking {booking_id} is already on flight {new_flight_id} in {new_class} class. Pass a different flight_id or seat_class."
+        )
+
+    new_flight = db.query(Flight).filter(Flight.flight_id == new_flight_id).first()
+    if not new_flight:
+        return ErrorResponse(
+            error="Flight not found",
+            error_code="FLIGHT_NOT_FOUND",
+            details=f"The specified flight_id {new_flight_id} does not exist in our system. Please check the flight_id or use list_flights to see available flights."
+        )
+    if inspect(new_flight).identity_token != inspect(booking).identity_token:
+        # With sharding, a booking lives on its flight's shard, and a change must stay one local transaction
+        return ErrorResponse(
+            error="Change not supported",
+            error_code="CROSS_SHARD_CHANGE",
+            details=f"Booking {booking_id} cannot be moved to flight {new_flight_id} in one step. Please book the new flight, then cancel this booking."
+        )
+
+    claim = SEAT_COUNTER_COLUMNS[new_class]
+    no_seats = ErrorResponse(
+        error=f"No {new_class} seats available",
+        error_code="NO_SEATS_AVAILABLE",
+        details=f"Flight {new_flight_id} has no available seats in {new_class} class. The booking was not changed. Please try a different class or flight."
+    )
+    if getattr(new_flight, claim) < 1:
+        return no_seats
+
+    old_flight_id, old_class, old_price = booking.flight_id, booking.seat_class, booking.price_paid
+    new_price = int(new_flight.base_price * SEAT_CLASS_MULTIPLIERS[new_class])
+
+    # Core rather than ORM: a bulk ORM UPDATE of bookings would reset every user's bookings ETag.
+    # The booking itself is updated through the unit of work below.
+    locked = db.execute(
+        update(Booking.__table__)
+        .where(
+            Booking.booking_id == booking_id,
+            Booking.flight_id == old_flight_id,
+            Booking.seat_class == old_class,
+            Booking.status == BookingStatus.BOOKED.value,
+        )
+        .values(status=BookingStatus.BOOKED.value)
+    ).rowcount
+    if not locked:
+        db.rollback()
+        metrics.incr('bookings.change_conflicts')
+        return ErrorResponse(
+            error="Booking changed concurrently",
+            error_code="BOOKING_CHANGED",
+            details=f"Booking {booking_id} was changed or cancelled by another request. Please check its current state and try again."
+        )
+
+    # Seat counter deltas per flight; a class change on the same flight is a single UPDATE
+    deltas: dict[int, dict[str, int]] = {}
+    release = SEAT_COUNTER_COLUMNS.get(old_class)
+    if release is not None:
+        deltas.setdefault(old_flight_id, {})[release] = 1
+    deltas.setdefault(new_flight_id, {})[claim] = -1
+    for changed_flight_id in sorted(deltas):
+        statement = (
+            update(Flight)
+            .where(Flight.flight_id == changed_flight_id)
+            .values({column: getattr(Flight, column) + delta for column, delta in deltas[changed_flight_id].items()})
+            .execution_options(synchronize_session=False, **{SEATS_ONLY: True})
+        )
+        if changed_flight_id == new_flight_id:
+            statement = statement.where(getattr(Flight, claim) > 0)
+        if not db.execute(statement).rowcount and changed_flight_id == new_flight_id:
+            db.rollback()
+            return no_seats
+
+    booking.flight_id = new_flight_id
+    booking.seat_class = new_class
+    booking.price_paid = new_price
+    db.add(BookingChange(
+        booking_id=booking_id,
+        flight_id=new_flight_id,
+        seat_class=new_class,
+        from_flight_id=old_flight_id,
+        from_seat_class=old_class,
+        price_difference=new_price - old_price,
+        changed_at=datetime.utcnow().isoformat(),
+    ))
+    promoted = None
+    for changed_flight_id in sorted(deltas):
+        flight = db.get(Flight, changed_flight_id, populate_existing=True)
+        if flight is None:
+            continue
+        if changed_flight_id == old_flight_id and release is not None:
+            promoted = promote_from_waitlist(db, flight, old_class)
+        announce_seats(db, flight)
+    db.commit()
+    metrics.incr('bookings.changed')
+    if promoted is not None:
+        waitlist_notifier.notify(promoted.waitlist_id)
+    db.refresh(booking)
+    return BookingChangeOut(**BookingOut.model_validate(booking).model_dump(), price_difference=new_price - old_price)
+
+
+def promote_from_waitlist(db: Session, flight: Flight, seat_class: str) -> WaitlistEntry | None:
+    """Book the freed seat for the first user waiting on this flight and class.
+
+    Runs inside the caller's transaction, so the seat is released and
+    re-claimed in the same commit and never becomes visible as available.
+    """
+    entry = (
+        db.query(WaitlistEntry)
+        .filter(
+            WaitlistEntry.flight_id == flight.flight_id,
+            WaitlistEntry.seat_class == seat_class,
+            WaitlistEntry.status == "waiting"
+        )
+        .order_by(WaitlistEntry.waitlist_id)
+        .first()
+    )
+    column = SEAT_COUNTER_COLUMNS[seat_class]
+    if entry is None or getattr(flight, column) < 1:
+        return None
+
+    setattr(flight, column, getattr(flight, column) - 1)
+    new_booking = Booking(
+        user_id=entry.user_id,
+        flight_id=flight.flight_id,
+        status="booked",
+        booking_time=datetime.utcnow().isoformat(),
+        seat_class=seat_class,
+        price_paid=int(flight.base_price * SEAT_CLASS_MULTIPLIERS[seat_class])
+    )
+    db.add(new_booking)
+    db.flush()
+    entry.status = "promoted"
+    entry.booking_id = new_booking.booking_id
+    return entry
+
+
+def get_bookings(db: Session, user_id: int, include_history: bool = False) -> list[BookingOut]:
+    """Retrieve all bookings for a specific user.
+
+    Archived (completed or cancelled) bookings are only included with `include_history`.
+    """
     bookings = db.query(Booking).filter(Booking.user_id == user_id).all()
+    if include_history:
+        bookings += db.query(BookingArchive).filter(BookingArchive.user_id == user_id).all()
+    bookings.sort(key=lambda b: b.booking_id)
     return [BookingOut.model_validate(b) for b in bookings]
+
+
+def get_bookings_with_flights(db: Session, user_id: int) -> list[BookingWithFlightOut]:
+    """Retrieve a user's bookings with their flights' details, in a single joined query."""
+    bookings = (
+        db.query(Booking)
+        .options(joinedload(Booking.flight))
+        .filter(Booking.user_id == user_id)
+        .all()
+    )
+    bookings.sort(key=lambda b: b.booking_id)
+    return [
+        BookingWithFlightOut(
+            **BookingOut.model_validate(b).model_dump(),
+            flight=flight_out(b.flight) if b.flight is not None else None,
+        )
+        for b in bookings
+    ]
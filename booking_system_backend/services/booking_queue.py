@@ -0,0 +1,153 @@
+"""Optional write-behind booking pipeline with group commit.
+
+Requests are queued and applied by a single writer thread, which stages up
+to `max_batch` bookings (or whatever arrived within `max_delay` seconds of
+the first one) in one session and commits them together, so SQLite pays
+one fsync per batch instead of one per booking. Because there is a single
+writer applying requests in arrival order, bookings for the same flight
+are processed in order and seat checks see every earlier booking of the
+batch. Callers wait on a Future for their own result.
+
+A booking submitted from a traced slow request (see profiling) records the
+SQL that stages it into that request's trace; the batch's shared flush and
+commit are recorded into the trace of every booking in it.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+import metrics
+import profiling
+from schemas import BookingOut, ErrorResponse, SeatClass
+from services.booking import book_flight, stage_booking
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BookingQueue:
+    def __init__(self, max_batch: int = 100, max_delay: float = 0.005):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def submit(self, user_id: int, name: str, flight_id: int, seat_class: SeatClass = 'economy') -> Future:
+        """Queue a booking; the Future resolves to BookingOut or ErrorResponse."""
+        future: Future = Future()
+        self._queue.put((future, time.perf_counter(), (user_id, name, flight_id, seat_class), profiling.request_sql()))
+        return future
+
+    def book(self, user_id: int, name: str, flight_id: int, seat_class: SeatClass = 'economy') -> BookingOut | ErrorResponse:
+        """Queue a booking and block until it has been committed (or rejected)."""
+        return self.submit(user_id, name, flight_id, seat_class).result()
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        self._session_factory = session_factory
+        self._thread = threading.Thread(target=self._run, name='booking-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Apply everything already queued, then stop the writer."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _next_batch(self) -> tuple[list, bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            batch, stopping = self._next_batch()
+            if batch:
+                try:
+                    self._apply(batch)
+                except Exception as exc:  # Never leave callers waiting forever
+                    logger.exception("Booking batch failed")
+                    for future, *_ in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+            if stopping:
+                return
+
+    def _apply(self, batch: list) -> None:
+        metrics.incr('booking_queue.batches')
+        metrics.incr('booking_queue.bookings', len(batch))
+        db = self._session_factory()
+        try:
+            try:
+                staged = []
+                for future, enqueued, args, sql in batch:
+                    with profiling.recording(sql):
+                        staged.append((future, enqueued, stage_booking(db, *args)))
+                with profiling.recording(*(sql for *_, sql in batch)):
+                    db.flush()
+                    results = [
+                        (future, enqueued, r if isinstance(r, ErrorResponse) else BookingOut.model_validate(r))
+                        for future, enqueued, r in staged
+                    ]
+                    db.commit()
+            except Exception:
+                # One bad row must not fail its neighbours: fall back to one commit per booking
+                db.rollback()
+                logger.warning("Group commit of %d bookings failed, retrying individually", len(batch), exc_info=True)
+                self._apply_individually(db, batch)
+                return
+        finally:
+            db.close()
+
+        for future, enqueued, result in results:
+            self._resolve(future, enqueued, result)
+
+    def _apply_individually(self, db: Session, batch: list) -> None:
+        """Commit each booking on its own, resolving its caller as soon as it is settled."""
+        for future, enqueued, args, sql in batch:
+            try:
+                with profiling.recording(sql):
+                    result = book_flight(db, *args)
+            except Exception as exc:
+                db.rollback()
+                logger.exception("Queued booking failed")
+                future.set_exception(exc)
+            else:
+                self._resolve(future, enqueued, result)
+
+    @staticmethod
+    def _resolve(future: Future, enqueued: float, result: BookingOut | ErrorResponse) -> None:
+        metrics.observe('booking_queue.latency', time.perf_counter() - enqueued)
+        future.set_result(result)
+
+
+booking_queue = BookingQueue()
+metrics.register('booking_queue', lambda: {
+    'running': booking_queue.running,
+    'queued': booking_queue._queue.qsize(),
+    'max_batch': booking_queue.max_batch,
+    'max_delay_ms': booking_queue.max_delay * 1000,
+})
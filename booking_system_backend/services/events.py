@@ -0,0 +1,176 @@
+"""Replay and compaction of the booking event log (see event_log.py).
+
+Replaying folds the checkpoint rows and every remaining event, in sequence
+order, into per flight and seat class totals: seats held, claims,
+releases, completions and revenue. From these totals the seat counters
+can be rebuilt (`capacity - seats held`).
+
+Compaction folds events older than the retention period into
+`booking_event_checkpoints` and deletes them. It can first append them
+to a gzipped NDJSON file for the audit trail. Each chunk is one
+transaction, and replay results are the same before and after.
+"""
+import gzip
+import json
+from datetime import datetime, timedelta
+from itertools import takewhile
+from typing import Optional
+
+from sqlalchemy import delete, func, select, union_all
+from sqlalchemy.orm import Session
+import config
+import metrics
+from event_log import EVENT_BOOKED, EVENT_CANCELLED
+from live_updates import announce_seats
+from models import Booking, BookingArchive, BookingEvent, BookingEventCheckpoint, BookingStatus, Flight
+from schemas import CompactOut, FlightActivity, ReplayOut
+from services.booking import SEAT_COUNTER_COLUMNS
+
+COMPACT_CHUNK_SIZE = 10000
+_TOTALS = ('seats_held', 'claims', 'releases', 'completions', 'revenue')
+_EVENT_COLUMNS = [c.name for c in BookingEvent.__table__.columns]
+
+
+def fold(totals: dict, kind: str, flight_id: int, seat_class: str, status: str, price_paid: int) -> None:
+    """Apply one event to `totals`, a dict of (flight_id, seat_class) -> totals dict."""
+    entry = totals.get((flight_id, seat_class))
+    if entry is None:
+        entry = totals[(flight_id, seat_class)] = dict.fromkeys(_TOTALS, 0)
+    if kind == EVENT_BOOKED:
+        entry['seats_held'] += 1
+        entry['claims'] += 1
+        entry['revenue'] += price_paid
+    elif kind == EVENT_CANCELLED:
+        entry['seats_held'] -= 1
+        entry['releases'] += 1
+        entry['revenue'] -= price_paid
+    elif status == BookingStatus.COMPLETED.value:
+        entry['completions'] += 1
+
+
+def replay_events(db: Session, apply_seats: bool = False) -> ReplayOut:
+    """Fold checkpoints and events into per flight and class totals.
+
+    With `apply_seats`, every flight's seat counters are set to capacity
+    minus the seats held according to the log. Only do this while no
+    bookings are being made, e.g. to recover counters after an incident.
+    """
+    totals: dict[tuple[int, str], dict] = {}
+    for checkpoint in db.query(BookingEventCheckpoint):
+        totals[(checkpoint.flight_id, checkpoint.seat_class)] = {t: getattr(checkpoint, t) for t in _TOTALS}
+    events = 0
+    last_seq = None
+    rows = db.execute(
+        select(BookingEvent.seq, BookingEvent.kind, BookingEvent.flight_id, BookingEvent.seat_class,
+               BookingEvent.status, BookingEvent.price_paid)
+        .order_by(BookingEvent.seq)
+        .execution_options(yield_per=10000)
+    )
+    for seq, kind, flight_id, seat_class, status, price_paid in rows:
+        fold(totals, kind, flight_id, seat_class, status, price_paid)
+        events += 1
+        last_seq = seq
+
+    updated = _apply_seat_counters(db, totals) if apply_seats else 0
+    flights = [FlightActivity(flight_id=f, seat_class=c, **t) for (f, c), t in sorted(totals.items())]
+    return ReplayOut(events=events, last_seq=last_seq, flights=flights, counters_updated=updated)
+
+
+def _apply_seat_counters(db: Session, totals: dict) -> int:
+    updated = 0
+    for flight in db.query(Flight).order_by(Flight.flight_id).yield_per(1000):
+        changed = False
+        for seat_class, counter in SEAT_COUNTER_COLUMNS.items():
+            total = getattr(flight, f'{seat_class}_seats_total')
+            if total is None:
+                continue
+            held = totals.get((flight.flight_id, seat_class), {}).get('seats_held', 0)
+            if getattr(flight, counter) != total - held:
+                setattr(flight, counter, total - held)
+                changed = True
+        if changed:
+            announce_seats(db, flight)
+            updated += 1
+    db.commit()
+    return updated
+
+
+def compact_events(
+    db: Session,
+    before: Optional[str] = None,
+    output: Optional[str] = None,
+    chunk_size: int = COMPACT_CHUNK_SIZE,
+) -> CompactOut:
+    """Fold events recorded before `before` (default: the retention period ago) into checkpoints.
+
+    Compaction stops at the first event, in seq order, recorded at or after `before`.
+    With `output`, the compacted events are first appended to that gzipped NDJSON file.
+    """
+    before = before or (datetime.utcnow() - timedelta(days=config.EVENT_LOG_RETENTION_DAYS)).isoformat()
+    compacted = 0
+    through_seq = None
+    while True:
+        query = select(BookingEvent).order_by(BookingEvent.seq).limit(chunk_size)
+        if through_seq is not None:
+            query = query.where(BookingEvent.seq > through_seq)
+        rows = db.execute(query).scalars().all()
+        # recorded_at is the flush time and seq follows commit order, so they can disagree:
+        # only fold the old events before the first newer one, to delete exactly what was folded
+        old = list(takewhile(lambda e: e.recorded_at < before, rows))
+        if not old:
+            break
+        if output is not None:
+            with gzip.open(output, 'at') as out:
+                for e in old:
+                    out.write(json.dumps({c: getattr(e, c) for c in _EVENT_COLUMNS}) + '\n')
+
+        totals: dict[tuple[int, str], dict] = {}
+        for e in old:
+            fold(totals, e.kind, e.flight_id, e.seat_class, e.status, e.price_paid)
+        for (flight_id, seat_class), delta in totals.items():
+            checkpoint = db.get(BookingEventCheckpoint, (flight_id, seat_class))
+            if checkpoint is None:
+                checkpoint = BookingEventCheckpoint(flight_id=flight_id, seat_class=seat_class, **dict.fromkeys(_TOTALS, 0))
+                db.add(checkpoint)
+            for total in _TOTALS:
+                setattr(checkpoint, total, getattr(checkpoint, total) + delta[total])
+        through_seq = old[-1].seq
+        db.execute(delete(BookingEvent).where(BookingEvent.seq <= through_seq))
+        db.commit()
+        db.expunge_all()
+        compacted += len(old)
+        if len(old) < len(rows):
+            break
+
+    metrics.incr('event_log.compacted', compacted)
+    return CompactOut(compacted=compacted, through_seq=through_seq, output=output if compacted else None)
+
+
+def ensure_baseline(db: Session) -> int:
+    """Seed the checkpoints from `bookings` when the log is enabled on a database with history.
+
+    Does nothing once the log holds any events or checkpoints. Returns the number of checkpoint rows written.
+    """
+    if db.query(BookingEvent.seq).first() is not None or db.query(BookingEventCheckpoint.flight_id).first() is not None:
+        return 0
+    rows = union_all(*(
+        select(model.flight_id, model.seat_class, model.status, model.price_paid) for model in (Booking, BookingArchive)
+    )).subquery()
+    grouped = db.execute(
+        select(rows.c.flight_id, rows.c.seat_class, rows.c.status, func.count(), func.sum(rows.c.price_paid))
+        .group_by(rows.c.flight_id, rows.c.seat_class, rows.c.status)
+    ).all()
+    totals: dict[tuple[int, str], dict] = {}
+    for flight_id, seat_class, status, count, revenue in grouped:
+        entry = totals.setdefault((flight_id, seat_class), dict.fromkeys(_TOTALS, 0))
+        entry['claims'] += count  # Every booking claimed a seat once
+        if status == BookingStatus.CANCELLED.value:
+            entry['releases'] += count
+        else:
+            entry['seats_held'] += count
+            entry['revenue'] += revenue
+            if status == BookingStatus.COMPLETED.value:
+                entry['completions'] += count
+    db.add_all(BookingEventCheckpoint(flight_id=f, seat_class=c, **t) for (f, c), t in totals.items())
+    db.commit()
+    return len(totals)
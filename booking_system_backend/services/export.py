@@ -0,0 +1,213 @@
+import csv
+import heapq
+import io
+from itertools import islice
+from operator import itemgetter
+from typing import Iterator, Literal, Optional
+
+from sqlalchemy import Integer, func, select
+from sqlalchemy.orm import Session
+from models import User, Flight, Booking, BookingArchive
+from schemas import ErrorResponse
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV export works without it
+    pa = None
+    pq = None
+
+
+ExportTable = Literal['users', 'flights', 'bookings', 'bookings_archive']
+ExportFormat = Literal['csv', 'arrow', 'parquet']
+
+EXPORT_TABLES = {
+    'users': User.__table__,
+    'flights': Flight.__table__,
+    'bookings': Booking.__table__,
+    # Finished bookings moved out of `bookings` by services.archive; the full history is both tables
+    'bookings_archive': BookingArchive.__table__,
+}
+BOOKING_TABLES = {'bookings', 'bookings_archive'}
+
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _primary_key(table):
+    return table.primary_key.columns.values()[0]
+
+
+def _shard_ids(db: Session, table) -> list[Optional[str]]:
+    """The shards to read `table` from one by one; [None] for an unsharded session."""
+    router = db.info.get('shard_router')
+    return router.shards_for_table(table.name) if router is not None else [None]
+
+
+def _execute(db: Session, stmt, shard_id: Optional[str]):
+    return db.execute(stmt, bind_arguments={'shard_id': shard_id} if shard_id is not None else None)
+
+
+def get_watermark(db: Session, table: ExportTable) -> int:
+    """Return the highest primary key currently in the table (0 when empty), over all shards.
+
+    The watermark is only safe for incremental exports with a single writer
+    process: ids are handed out in blocks per process (sharding) or become
+    visible in commit order, not id order, so a row committed after an export
+    can still get an id below its watermark and be skipped for good.
+    """
+    sql_table = EXPORT_TABLES[table]
+    stmt = select(func.max(_primary_key(sql_table)))
+    return max((_execute(db, stmt, shard_id).scalar() or 0 for shard_id in _shard_ids(db, sql_table)), default=0)
+
+
+def iter_row_chunks(
+    db: Session,
+    table: ExportTable,
+    since_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+    since_time: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[list[tuple]]:
+    """Stream rows of a table in primary key order, `chunk_size` rows at a time.
+
+    Rows are fetched through a server-side cursor (one per shard, merged in
+    primary key order), so only one chunk is held in memory at once.
+    `since_id`/`until_id` bound the primary key as
+    (since_id, until_id]; `since_time` filters bookings (live or archived) on booking_time.
+    """
+    sql_table = EXPORT_TABLES[table]
+    pk = _primary_key(sql_table)
+    stmt = select(*sql_table.columns).order_by(pk)
+    if since_id is not None:
+        stmt = stmt.where(pk > since_id)
+    if until_id is not None:
+        stmt = stmt.where(pk <= until_id)
+    if since_time is not None:
+        stmt = stmt.where(sql_table.c.booking_time > since_time)
+
+    stmt = stmt.execution_options(stream_results=True, yield_per=chunk_size)
+    results = [_execute(db, stmt, shard_id) for shard_id in _shard_ids(db, sql_table)]
+    try:
+        if len(results) == 1:
+            for partition in results[0].partitions():
+                yield [tuple(row) for row in partition]
+            return
+        rows = heapq.merge(*((tuple(row) for row in result) for result in results),
+                           key=itemgetter(list(sql_table.columns).index(pk)))
+        while chunk := list(islice(rows, chunk_size)):
+            yield chunk
+    finally:
+        for result in results:
+            result.close()
+
+
+def _csv_chunks(table: ExportTable, chunks: Iterator[list[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in EXPORT_TABLES[table].columns])
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Header-only output for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _arrow_schema(table: ExportTable):
+    return pa.schema([
+        pa.field(c.name, pa.int64() if isinstance(c.type, Integer) else pa.string(), nullable=c.nullable)
+        for c in EXPORT_TABLES[table].columns
+    ])
+
+
+def _record_batch(schema, rows: list[tuple]):
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def _columnar_chunks(table: ExportTable, fmt: ExportFormat, chunks: Iterator[list[tuple]]) -> Iterator[bytes]:
+    """Encode chunks as an Arrow IPC stream or Parquet file, one batch/row group per chunk.
+
+    Both formats are written strictly sequentially, so the sink is drained
+    after every chunk instead of buffering the whole file.
+    """
+    schema = _arrow_schema(table)
+    sink = io.BytesIO()
+    if fmt == 'arrow':
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        writer = pq.ParquetWriter(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    try:
+        for rows in chunks:
+            batch = _record_batch(schema, rows)
+            if fmt == 'arrow':
+                writer.write_batch(batch)
+            else:
+                writer.write_batch(batch, row_group_size=len(rows))
+            data = drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    data = drain()
+    if data:
+        yield data
+
+
+def export_table(
+    db: Session,
+    table: str,
+    fmt: str = 'csv',
+    since_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+    since_time: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[bytes] | ErrorResponse:
+    """Export a table as a stream of encoded byte chunks (CSV, Arrow IPC stream or Parquet)."""
+    if table not in EXPORT_TABLES:
+        return ErrorResponse(
+            error="Unknown export table",
+            error_code="INVALID_EXPORT_TABLE",
+            details=f"Table '{table}' cannot be exported. Valid options are: {', '.join(EXPORT_TABLES)}."
+        )
+    if fmt not in MEDIA_TYPES:
+        return ErrorResponse(
+            error="Unknown export format",
+            error_code="INVALID_EXPORT_FORMAT",
+            details=f"Format '{fmt}' is not supported. Valid options are: {', '.join(MEDIA_TYPES)}."
+        )
+    if fmt != 'csv' and pa is None:
+        return ErrorResponse(
+            error="Export format unavailable",
+            error_code="EXPORT_FORMAT_UNAVAILABLE",
+            details=f"Format '{fmt}' requires pyarrow, which is not installed on this server. Use format 'csv' or install pyarrow."
+        )
+    if since_time is not None and table not in BOOKING_TABLES:
+        return ErrorResponse(
+            error="Invalid export watermark",
+            error_code="INVALID_WATERMARK",
+            details="A booking_time watermark can only be used when exporting the 'bookings' or 'bookings_archive' table."
+        )
+
+    chunks = iter_row_chunks(db, table, since_id, until_id, since_time, chunk_size)
+    if fmt == 'csv':
+        return _csv_chunks(table, chunks)
+    return _columnar_chunks(table, fmt, chunks)
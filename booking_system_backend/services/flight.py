@@ -1,27 +1,110 @@
+from datetime import datetime, timezone
+from typing import Optional
 from sqlalchemy.orm import Session
+from fares import MAX_DAYS, day_to_date, fare_calendar, to_day
+from inventory import SEAT_CLASSES, inventory, to_epoch
 from models import Flight
-from schemas import FlightOut
+from schemas import FareDay, FlightOut, ErrorResponse
 
 
 def list_flights(db: Session) -> list[FlightOut]:
     """List all available flights with computed prices for all seat classes."""
-    flights = db.query(Flight).all()
-    result = []
-    for f in flights:
-        # Compute prices for all seat classes
-        flight_dict = {
-            'flight_id': f.flight_id,
-            'origin': f.origin,
-            'destination': f.destination,
-            'departure_time': f.departure_time,
-            'arrival_time': f.arrival_time,
-            'base_price': f.base_price,
-            'economy_seats_available': f.economy_seats_available,
-            'business_seats_available': f.business_seats_available,
-            'galaxium_seats_available': f.galaxium_seats_available,
-            'economy_price': f.base_price,  # 1x
-            'business_price': int(f.base_price * 2.5),  # 2.5x
-            'galaxium_price': f.base_price * 5  # 5x
-        }
-        result.append(FlightOut(**flight_dict))
-    return result
+    # With sharding each shard's rows arrive in turn; merge them back into id order
+    flights = sorted(db.query(Flight).all(), key=lambda f: f.flight_id)
+    return [flight_out(f) for f in flights]
+
+
+def flight_out(f: Flight) -> FlightOut:
+    """FlightOut for a Flight row, with computed prices for all seat classes."""
+    return FlightOut(
+        flight_id=f.flight_id,
+        origin=f.origin,
+        destination=f.destination,
+        departure_time=f.departure_time,
+        arrival_time=f.arrival_time,
+        base_price=f.base_price,
+        economy_seats_available=f.economy_seats_available,
+        business_seats_available=f.business_seats_available,
+        galaxium_seats_available=f.galaxium_seats_available,
+        economy_price=f.base_price,  # 1x
+        business_price=int(f.base_price * 2.5),  # 2.5x
+        galaxium_price=f.base_price * 5  # 5x
+    )
+
+
+def search_flights(
+    db: Session,
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    departs_after: Optional[str] = None,
+    departs_before: Optional[str] = None,
+    seat_class: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> list[FlightOut] | ErrorResponse:
+    """Find flights by route and departure window, ordered by departure.
+
+    Served from the in-memory inventory snapshot, so no flight rows are read
+    once it is loaded. Bounds are ISO 8601 times (a bare date in
+    `departs_before` covers that whole day); with `seat_class`, only flights
+    with a seat left in that class are returned.
+    """
+    if seat_class is not None and seat_class not in SEAT_CLASSES:
+        return ErrorResponse(
+            error="Invalid seat class",
+            error_code="INVALID_SEAT_CLASS",
+            details=f"Seat class '{seat_class}' is not valid. Valid options are: economy, business, galaxium."
+        )
+    try:
+        after = to_epoch(departs_after) if departs_after else None
+        before = to_epoch(departs_before) if departs_before else None
+    except ValueError:
+        return ErrorResponse(
+            error="Invalid date",
+            error_code="INVALID_DATE",
+            details="Departure bounds must be ISO 8601 dates or times, e.g. 2099-01-01 or 2099-01-01T09:00:00Z."
+        )
+    if before is not None and len(departs_before) == 10:
+        before += 24 * 60 * 60 - 1
+
+    snapshot = inventory.get(db)
+    positions = snapshot.find(origin, destination, after, before, seat_class, limit)
+    return [FlightOut(**snapshot.flight(pos)) for pos in positions]
+
+
+def get_fare_calendar(
+    db: Session,
+    origin: str,
+    destination: str,
+    seat_class: str = 'economy',
+    start: Optional[str] = None,
+    days: int = 31,
+) -> list[FareDay] | ErrorResponse:
+    """Cheapest available fare per departure day on a route, for `days` days from `start`.
+
+    `start` is an ISO 8601 date (default: today, UTC). Days without a seat
+    left in the class are omitted. Served from the fare calendar in
+    O(days), without looking at individual flights.
+    """
+    if seat_class not in SEAT_CLASSES:
+        return ErrorResponse(
+            error="Invalid seat class",
+            error_code="INVALID_SEAT_CLASS",
+            details=f"Seat class '{seat_class}' is not valid. Valid options are: economy, business, galaxium."
+        )
+    try:
+        first_day = to_day(to_epoch(start)) if start else to_day(int(datetime.now(timezone.utc).timestamp()))
+    except ValueError:
+        return ErrorResponse(
+            error="Invalid date",
+            error_code="INVALID_DATE",
+            details="The start must be an ISO 8601 date, e.g. 2099-01-01."
+        )
+    if not 1 <= days <= MAX_DAYS:
+        return ErrorResponse(
+            error="Invalid number of days",
+            error_code="INVALID_DAYS",
+            details=f"days must be between 1 and {MAX_DAYS}."
+        )
+
+    fares = fare_calendar.cheapest(db, origin, destination, seat_class, first_day, days)
+    return [FareDay(date=day_to_date(day), flight_id=flight_id, price=price) for day, price, flight_id in fares]
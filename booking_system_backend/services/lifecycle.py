@@ -0,0 +1,80 @@
+"""Mark bookings of landed flights completed.
+
+Flights are walked in (arrival_time, flight_id) order through the
+`ix_flights_arrival` index, and each chunk of landed flights gets one
+set-based UPDATE of their `booked` bookings (found through
+`ix_bookings_flight_status`). Every chunk is its own short transaction, so
+bookings on other flights only ever wait for one chunk, never for the
+whole run.
+"""
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+import config
+import metrics
+from event_log import EVENT_STATUS, event_log
+from models import Booking, BookingStatus, Flight
+from schemas import LifecycleOut
+
+LIFECYCLE_CHUNK_SIZE = config.LIFECYCLE_CHUNK_SIZE  # Flights per UPDATE
+LIFECYCLE_PAUSE = config.LIFECYCLE_PAUSE  # Seconds between chunks
+
+# Progress of the current (or last) run, reported under `lifecycle` in GET /metrics
+progress = {'running': False, 'landed_before': None, 'cursor': None, 'completed': 0, 'chunks': 0}
+metrics.register('lifecycle', lambda: dict(progress))
+
+
+def complete_landed_bookings(
+    db: Session,
+    landed_before: Optional[str] = None,
+    chunk_size: int = LIFECYCLE_CHUNK_SIZE,
+    pause: float = LIFECYCLE_PAUSE,
+) -> LifecycleOut:
+    """Mark `booked` bookings of flights arriving before `landed_before` (default: now) completed."""
+    landed_before = landed_before or datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    progress.update(running=True, landed_before=landed_before, cursor=None, completed=0, chunks=0)
+    cursor = None
+    try:
+        while True:
+            query = select(Flight.arrival_time, Flight.flight_id).where(Flight.arrival_time < landed_before)
+            if cursor is not None:
+                query = query.where(tuple_(Flight.arrival_time, Flight.flight_id) > cursor)
+            # Sharded sessions return up to `chunk_size` rows per shard; keep the first chunk overall
+            rows = sorted(db.execute(query.order_by(Flight.arrival_time, Flight.flight_id).limit(chunk_size)).all())
+            rows = rows[:chunk_size]
+            if not rows:
+                break
+            started = time.perf_counter()
+            statement = (
+                update(Booking)
+                .where(Booking.flight_id.in_([flight_id for _, flight_id in rows]))
+                .where(Booking.status == BookingStatus.BOOKED.value)
+                .values(status=BookingStatus.COMPLETED.value)
+                .execution_options(synchronize_session=False)
+            )
+            if event_log.running:
+                # A bulk UPDATE bypasses the flush, so the completions are logged from RETURNING
+                changed = db.execute(statement.returning(
+                    Booking.booking_id, Booking.user_id, Booking.flight_id, Booking.seat_class, Booking.price_paid
+                )).all()
+                for booking_id, user_id, flight_id, seat_class, price_paid in changed:
+                    event_log.record(db, EVENT_STATUS, booking_id, user_id, flight_id, seat_class,
+                                     BookingStatus.COMPLETED.value, price_paid)
+                count = len(changed)
+            else:
+                count = db.execute(statement).rowcount
+            db.commit()
+            metrics.observe('lifecycle.chunk', time.perf_counter() - started)
+            metrics.incr('lifecycle.completed', count)
+            cursor = tuple(rows[-1])
+            progress['cursor'] = cursor[0]
+            progress['completed'] += count
+            progress['chunks'] += 1
+            # Writers waiting on the lock poll with growing sleeps; leave them a window to get in
+            time.sleep(pause)
+    finally:
+        progress['running'] = False
+    return LifecycleOut(completed=progress['completed'], chunks=progress['chunks'], landed_before=landed_before)
@@ -0,0 +1,182 @@
+"""Check the denormalized seat counters on `flights` against `bookings`.
+
+A flight's expected availability per class is its capacity
+(`<class>_seats_total`) minus the bookings holding a seat: booked or
+completed, in `bookings` or `bookings_archive`. Flights are walked in
+flight_id ranges; per range, one grouped query counts the held seats of
+every flight and class, so a full pass costs a few queries per
+RECONCILE_BATCH_SIZE flights.
+
+The flight counters and the held counts are read by separate statements,
+which may see different commits. A booking committed in between would
+look like drift, so every flight that seems to drift is checked again with
+a single statement reading its counters and held seats together, and only
+drift that is still there is reported.
+
+Repairs are single UPDATE statements that recount the seats in a
+subquery, so a booking committed between the check and the repair is
+never lost. Flights created before capacity was tracked cannot be checked.
+They are counted in the report, and with `repair` their capacity is
+backfilled the same way, from the current counter plus held seats (which
+keeps any drift they already have).
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy import func, literal_column, select, union_all, update
+from sqlalchemy.orm import Session
+import metrics
+from inventory import SEATS_ONLY
+from live_updates import announce_seats
+from models import Booking, BookingArchive, BookingStatus, Flight
+from schemas import ReconcileOut, SeatDrift
+from services.booking import SEAT_COUNTER_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH_SIZE = 5000  # Flights per grouped query
+# Statuses whose bookings hold a seat
+HOLDING_STATUSES = (BookingStatus.BOOKED.value, BookingStatus.COMPLETED.value)
+
+
+def _total_column(seat_class: str) -> str:
+    return f'{seat_class}_seats_total'
+
+
+def _held_seats(model, flight_id, seat_class: str):
+    return (
+        select(func.count())
+        .select_from(model)
+        .where(model.flight_id == flight_id, model.seat_class == seat_class, model.status.in_(HOLDING_STATUSES))
+        .scalar_subquery()
+    )
+
+
+def _held_expr(seat_class: str):
+    """Seats held in `seat_class` on the flight being updated, as a correlated subquery."""
+    return _held_seats(Booking, Flight.flight_id, seat_class) + _held_seats(BookingArchive, Flight.flight_id, seat_class)
+
+
+def _held_counts(db: Session, low: int, high: Optional[int]) -> dict[tuple[int, str], int]:
+    """Held seats per (flight_id, seat_class) for flight_id in (low, high]."""
+    parts = []
+    for model in (Booking, BookingArchive):
+        query = select(model.flight_id, model.seat_class).where(model.flight_id > low, model.status.in_(HOLDING_STATUSES))
+        if high is not None:
+            query = query.where(model.flight_id <= high)
+        parts.append(query)
+    held = union_all(*parts).subquery()
+    rows = db.execute(
+        select(held.c.flight_id, held.c.seat_class, func.count(literal_column('*')))
+        .group_by(held.c.flight_id, held.c.seat_class)
+    ).all()
+    counts: dict[tuple[int, str], int] = {}
+    for flight_id, seat_class, count in rows:
+        # Sharded sessions return one row per shard holding rows of that flight
+        counts[(flight_id, seat_class)] = counts.get((flight_id, seat_class), 0) + count
+    return counts
+
+
+def _recheck(db: Session, flight_id: int) -> list[SeatDrift]:
+    """The flight's drifted counters, read with its held seats in a single statement."""
+    columns = []
+    for seat_class, counter in SEAT_COUNTER_COLUMNS.items():
+        columns += [getattr(Flight, counter), getattr(Flight, _total_column(seat_class)), _held_expr(seat_class)]
+    row = db.execute(select(*columns).where(Flight.flight_id == flight_id)).first()
+    if row is None:
+        return []
+    drift = []
+    for i, seat_class in enumerate(SEAT_COUNTER_COLUMNS):
+        available, total, held = row[3 * i:3 * i + 3]
+        if total is not None and available != total - held:
+            drift.append(SeatDrift(
+                flight_id=flight_id, seat_class=seat_class, seats_held=held,
+                seats_available=available, expected_available=total - held,
+            ))
+    return drift
+
+
+def reconcile_seats(db: Session, repair: bool = False, batch_size: int = RECONCILE_BATCH_SIZE) -> ReconcileOut:
+    """Report (and with `repair`, fix) seat counters that disagree with the bookings.
+
+    Bookings of unknown flights or seat classes cannot be matched to a
+    counter; they are reported with `seats_available` None and never repaired.
+    Flights without recorded capacity are not checked; they are counted in
+    `capacity_unchecked`, and with `repair` their capacity is backfilled.
+    """
+    columns = [Flight.flight_id]
+    for seat_class, counter in SEAT_COUNTER_COLUMNS.items():
+        columns += [getattr(Flight, counter), getattr(Flight, _total_column(seat_class))]
+
+    drift: list[SeatDrift] = []
+    checked = repaired = unchecked = backfilled = 0
+    low = 0
+    while True:
+        rows = sorted(db.execute(
+            select(*columns).where(Flight.flight_id > low).order_by(Flight.flight_id).limit(batch_size)
+        ).all())[:batch_size]
+        # The last range is open-ended, so bookings of flights above the last flight are seen too
+        high = rows[-1].flight_id if len(rows) == batch_size else None
+        counts = _held_counts(db, low, high)
+        suspect: set[int] = set()
+        missing_capacity: set[int] = set()
+        for row in rows:
+            for seat_class, counter in SEAT_COUNTER_COLUMNS.items():
+                held = counts.pop((row.flight_id, seat_class), 0)
+                total = getattr(row, _total_column(seat_class))
+                if total is None:
+                    missing_capacity.add(row.flight_id)
+                elif getattr(row, counter) != total - held:
+                    suspect.add(row.flight_id)
+        checked += len(rows) - len(missing_capacity)
+        unchecked += len(missing_capacity)
+        stale: set[int] = set()
+        for flight_id in sorted(suspect - missing_capacity):
+            flight_drift = _recheck(db, flight_id)
+            if flight_drift:
+                drift.extend(flight_drift)
+                stale.add(flight_id)
+        for (flight_id, seat_class), held in sorted(counts.items()):
+            # Left over: bookings whose flight or seat class does not exist
+            drift.append(SeatDrift(flight_id=flight_id, seat_class=seat_class, seats_held=held))
+
+        if repair and missing_capacity:
+            db.execute(
+                update(Flight)
+                .where(Flight.flight_id.in_(missing_capacity))
+                .values({
+                    _total_column(seat_class): getattr(Flight, counter) + _held_expr(seat_class)
+                    for seat_class, counter in SEAT_COUNTER_COLUMNS.items()
+                })
+                .execution_options(synchronize_session=False)
+            )
+            backfilled += len(missing_capacity)
+        if repair and stale:
+            for flight_id in sorted(stale):
+                db.execute(
+                    update(Flight)
+                    .where(Flight.flight_id == flight_id)
+                    .values({
+                        counter: getattr(Flight, _total_column(seat_class)) - _held_expr(seat_class)
+                        for seat_class, counter in SEAT_COUNTER_COLUMNS.items()
+                    })
+                    .execution_options(synchronize_session=False, **{SEATS_ONLY: True})
+                )
+                announce_seats(db, db.get(Flight, flight_id, populate_existing=True))
+            repaired += len(stale)
+        db.commit()
+        if high is None:
+            break
+        low = high
+
+    if drift:
+        logger.warning("Seat counters disagree with bookings in %d places%s", len(drift), " (repaired)" if repair else "")
+    if unchecked:
+        logger.warning("%d flights have no recorded capacity and could not be checked%s", unchecked,
+                       " (capacity backfilled)" if repair else "; run with repair to backfill it")
+    metrics.incr('reconcile.drift', len(drift))
+    metrics.incr('reconcile.repaired', repaired)
+    return ReconcileOut(
+        flights_checked=checked, drift=drift, repaired=repaired,
+        capacity_unchecked=unchecked, capacity_backfilled=backfilled,
+    )
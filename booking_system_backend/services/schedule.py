@@ -0,0 +1,241 @@
+"""Bulk ingestion of flight schedules from CSV or NDJSON.
+
+A schedule row is a flight: origin, destination, departure_time,
+arrival_time, base_price and total_seats. The seats are split 60/30/10
+between economy, business and galaxium like the demo data. Rows are
+validated one by one and upserted in chunks.
+
+A flight is matched on (origin, destination, departure_time) through
+`ix_flights_schedule`. Each chunk costs one lookup query, one executemany
+INSERT of the new flights and up to two executemany UPDATEs by primary key
+of the existing ones (per shard when sharded), and is committed on its
+own. Existing flights get the new arrival time and price. Their seat
+counts are reset to the new capacity only if no booking holds a seat on
+them, checked again in the UPDATE itself so a booking made meanwhile is
+never overwritten; otherwise seat counts and capacity are left as they are.
+
+The inventory snapshot (and with it the fare calendar) and the flights
+ETag are invalidated once per committed chunk, not per row.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from typing import IO, Iterable, Iterator, Literal, Optional
+
+from sqlalchemy import bindparam, exists, insert, literal, select, tuple_, update
+from sqlalchemy.orm import Session
+import metrics
+from inventory import from_epoch, to_epoch
+from models import Booking, BookingArchive, Flight
+from schemas import ScheduleImportOut, ScheduleRowError
+from services.reconcile import HOLDING_STATUSES
+
+ScheduleFormat = Literal['csv', 'ndjson']
+
+SCHEDULE_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000  # Rows rejected beyond this are only counted
+SCHEDULE_FIELDS = ('origin', 'destination', 'departure_time', 'arrival_time', 'base_price', 'total_seats')
+SEAT_CLASS_SHARES = {'economy': 0.6, 'business': 0.3, 'galaxium': 0.1}
+
+
+def seat_distribution(total_seats: int) -> dict[str, int]:
+    """Seats per class for a flight of `total_seats`: 60% economy, 30% business, 10% galaxium.
+
+    From 3 seats on, every class gets at least one.
+    """
+    seats = {seat_class: int(total_seats * share) for seat_class, share in SEAT_CLASS_SHARES.items()}
+    if total_seats >= 3:
+        seats = {seat_class: max(count, 1) for seat_class, count in seats.items()}
+    return seats
+
+
+def read_schedule(stream: IO[str], format: ScheduleFormat = 'csv') -> Iterator[Optional[dict]]:
+    """Yield schedule rows from a text stream; None stands for an NDJSON line that is not an object."""
+    if format == 'ndjson':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    else:
+        yield from csv.DictReader(stream)
+
+
+def read_schedule_bytes(stream: IO[bytes], format: ScheduleFormat = 'csv') -> Iterator[Optional[dict]]:
+    return read_schedule(io.TextIOWrapper(stream, encoding='utf-8', newline=''), format)
+
+
+def _error(index: int, error: str, error_code: str, details: str) -> ScheduleRowError:
+    return ScheduleRowError(index=index, error=error, error_code=error_code, details=details)
+
+
+def validate_row(index: int, row: Optional[dict]) -> dict | ScheduleRowError:
+    """The flight columns for a schedule row, with times normalized to YYYY-MM-DDTHH:MM:SSZ."""
+    if row is None:
+        return _error(index, "Invalid row", "INVALID_ROW", "Each NDJSON line must be a JSON object.")
+    missing = [field for field in SCHEDULE_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        return _error(index, "Missing field", "MISSING_FIELD", f"Row is missing {', '.join(missing)}.")
+    origin, destination = str(row['origin']).strip(), str(row['destination']).strip()
+    if origin == destination:
+        return _error(index, "Invalid route", "INVALID_ROUTE", f"Origin and destination are both '{origin}'.")
+    try:
+        departure, arrival = to_epoch(str(row['departure_time'])), to_epoch(str(row['arrival_time']))
+    except ValueError:
+        return _error(index, "Invalid time", "INVALID_TIME",
+                      "departure_time and arrival_time must be ISO 8601 times, e.g. 2099-01-01T09:00:00Z.")
+    if arrival <= departure:
+        return _error(index, "Invalid time", "INVALID_TIME", "arrival_time must be after departure_time.")
+    try:
+        base_price = int(row['base_price'])
+    except (TypeError, ValueError):
+        base_price = -1
+    if base_price < 0:
+        return _error(index, "Invalid price", "INVALID_PRICE", f"base_price must be a whole number of at least 0, got {row['base_price']!r}.")
+    try:
+        total_seats = int(row['total_seats'])
+    except (TypeError, ValueError):
+        total_seats = 0
+    if total_seats < 1:
+        return _error(index, "Invalid seats", "INVALID_SEATS", f"total_seats must be a whole number of at least 1, got {row['total_seats']!r}.")
+
+    seats = seat_distribution(total_seats)
+    values = {
+        'origin': origin,
+        'destination': destination,
+        'departure_time': from_epoch(departure),
+        'arrival_time': from_epoch(arrival),
+        'base_price': base_price,
+    }
+    for seat_class, count in seats.items():
+        values[f'{seat_class}_seats_available'] = count
+        values[f'{seat_class}_seats_total'] = count
+    return values
+
+
+def _flights_holding_seats(db: Session, flight_ids: list[int]) -> set[int]:
+    held = set()
+    for model in (Booking, BookingArchive):
+        held.update(db.execute(
+            select(model.flight_id)
+            .where(model.flight_id.in_(flight_ids), model.status.in_(HOLDING_STATUSES))
+            .distinct()
+        ).scalars())
+    return held
+
+
+def _execute_by_shard(db: Session, statement, rows: list[dict], id_key: str) -> None:
+    """Run a bulk statement over flight rows, once per shard when the session is sharded."""
+    router = db.info.get('shard_router')
+    if router is None:
+        db.execute(statement, rows)
+        return
+    groups: dict[str, list[dict]] = {}
+    for row in rows:
+        groups.setdefault(router.shard_for_id(row[id_key]), []).append(row)
+    for shard_id, group in groups.items():
+        db.execute(statement, group, bind_arguments={'shard_id': shard_id})
+
+
+def _assign_shard_ids(db: Session, rows: list[dict]) -> None:
+    router = db.info.get('shard_router')
+    if router is not None:
+        for row in rows:
+            row['flight_id'] = router.next_id('flights', router.shard_for_route(row['origin'], row['destination']))
+
+
+def _price_update(flight_id: int, values: dict) -> dict:
+    return {'b_flight_id': flight_id, 'arrival_time': values['arrival_time'], 'base_price': values['base_price']}
+
+
+# Plain executemany statements that still count as ORM statements for Flight, so the
+# inventory and version listeners see them. ORM bulk INSERT/UPDATE would be faster to
+# write but is not available on a sharded session.
+_INSERT_FLIGHTS = insert(Flight).execution_options(dml_strategy='raw')
+_UPDATE_FLIGHT = (
+    update(Flight)
+    .where(Flight.flight_id == bindparam('b_flight_id'))
+    .execution_options(dml_strategy='core_only', synchronize_session=False)
+)
+# Resetting the seat counters must not race a booking committed after the holding check
+_UPDATE_UNBOOKED_FLIGHT = _UPDATE_FLIGHT.where(*(
+    # A fixed bound parameter per status: an expanding IN can't be used with executemany
+    ~exists().where(model.flight_id == Flight.flight_id, model.status.in_([literal(s) for s in HOLDING_STATUSES]))
+    for model in (Booking, BookingArchive)
+))
+
+
+def import_schedule(
+    db: Session,
+    rows: Iterable[Optional[dict]],
+    chunk_size: int = SCHEDULE_CHUNK_SIZE,
+) -> ScheduleImportOut:
+    """Upsert flights from schedule rows, reporting rejected rows by index.
+
+    `rows` may be a lazy iterable of any length (see `read_schedule`); each
+    chunk is committed on its own. When a chunk lists a flight twice, the
+    later row wins.
+    """
+    result = ScheduleImportOut()
+    rows = iter(rows)
+    offset = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        flights: dict[tuple[str, str, str], dict] = {}
+        for index, row in enumerate(chunk, start=offset):
+            values = validate_row(index, row)
+            if isinstance(values, ScheduleRowError):
+                result.failed += 1
+                if len(result.errors) < MAX_REPORTED_ERRORS:
+                    result.errors.append(values)
+                continue
+            flights[(values['origin'], values['destination'], values['departure_time'])] = values
+        offset += len(chunk)
+        if not flights:
+            continue
+
+        existing = dict(
+            ((origin, destination, departure), flight_id)
+            for flight_id, origin, destination, departure in db.execute(
+                select(Flight.flight_id, Flight.origin, Flight.destination, Flight.departure_time)
+                .where(tuple_(Flight.origin, Flight.destination, Flight.departure_time).in_(list(flights)))
+            )
+        )
+        held = _flights_holding_seats(db, list(existing.values())) if existing else set()
+
+        new_rows = [values for key, values in flights.items() if key not in existing]
+        full_updates, price_updates = [], []
+        for key, flight_id in existing.items():
+            values = flights[key]
+            if flight_id in held:
+                # Bookings hold seats on this flight: keep its counters and capacity
+                price_updates.append(_price_update(flight_id, values))
+            else:
+                full_updates.append({'b_flight_id': flight_id, **values})
+        if new_rows:
+            _assign_shard_ids(db, new_rows)
+            _execute_by_shard(db, _INSERT_FLIGHTS, new_rows, 'flight_id')
+        # executemany needs the same columns in every row, hence one statement per kind
+        if full_updates:
+            _execute_by_shard(db, _UPDATE_UNBOOKED_FLIGHT, full_updates, 'b_flight_id')
+            # Flights booked since the holding check were skipped; the update holds the
+            # write lock now, so this re-check finds exactly those
+            booked_since = _flights_holding_seats(db, [values['b_flight_id'] for values in full_updates])
+            if booked_since:
+                price_updates.extend(_price_update(v['b_flight_id'], v) for v in full_updates if v['b_flight_id'] in booked_since)
+                full_updates = [v for v in full_updates if v['b_flight_id'] not in booked_since]
+        if price_updates:
+            _execute_by_shard(db, _UPDATE_FLIGHT, price_updates, 'b_flight_id')
+        db.commit()
+        result.created += len(new_rows)
+        result.updated += len(full_updates) + len(price_updates)
+        result.seats_preserved += len(price_updates)
+        result.chunks += 1
+        metrics.incr('schedule.rows', len(flights))
+    return result
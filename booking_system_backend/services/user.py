@@ -1,14 +1,81 @@
 import re
+from itertools import islice
+from typing import Iterable
 
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+import invalidation
+import metrics
+from cache import LRUCache
 from models import User
-from schemas import UserOut, ErrorResponse
+from schemas import UserOut, ErrorResponse, BatchRegistrationOut, BatchRowError
+
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Rows per INSERT/duplicate lookup; kept below SQLite's bound parameter limit
+BATCH_CHUNK_SIZE = 5000
+# Inserts of one chunk retried after concurrent registrations claimed some of its emails
+BATCH_INSERT_ATTEMPTS = 5
+
+
+# User directory cache, keyed by user_id and by normalized email.
+# Entries are only ever positive (a user that exists); any mismatch is
+# re-checked against the database before an error is returned.
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 60.0
+
+users_by_id = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+users_by_email = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+metrics.register('user_cache', lambda: {
+    'by_id': users_by_id.stats(),
+    'by_email': users_by_email.stats(),
+})
 
 
 def is_valid_email(email: str) -> bool:
     """Validate email address format."""
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(email_pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def cache_user(user: UserOut) -> None:
+    users_by_id.set(user.user_id, user)
+    users_by_email.set(user.email, user)
+
+
+def invalidate_user(user_id: int, email: str | None = None) -> None:
+    """Drop a user from the directory cache after it changed."""
+    cached = users_by_id.pop(user_id)
+    if cached is not None:
+        users_by_email.pop(cached.email)
+    if email is not None:
+        users_by_email.pop(email.lower())
+
+
+def clear_user_cache() -> None:
+    users_by_id.clear()
+    users_by_email.clear()
+
+
+# Keep the directory coherent with updates made by other server processes
+invalidation.subscribe('user_id', lambda key: invalidate_user(int(key)))
+invalidation.subscribe('user_email', lambda key: users_by_email.pop(key))
+
+
+def lookup_user(db: Session, user_id: int, use_cache: bool = True) -> UserOut | None:
+    """Return a user by id, served from the directory cache when possible."""
+    if use_cache:
+        cached = users_by_id.get(user_id)
+        if cached is not None:
+            return cached
+    found = db.query(User).filter(User.user_id == user_id).first()
+    if found is None:
+        return None
+    result = UserOut.model_validate(found)
+    cache_user(result)
+    return result
 
 
 def register_user(db: Session, name: str, email: str) -> UserOut | ErrorResponse:
@@ -34,7 +101,9 @@ def register_user(db: Session, name: str, email: str) -> UserOut | ErrorResponse
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
-    return UserOut.model_validate(new_user)
+    result = UserOut.model_validate(new_user)
+    cache_user(result)
+    return result
 
 
 def get_user(db: Session, name: str, email: str) -> UserOut | ErrorResponse:
@@ -48,11 +117,139 @@ def get_user(db: Session, name: str, email: str) -> UserOut | ErrorResponse:
             details=f"Email '{email}' is not a valid email address. Please provide a valid email in the format: example@domain.com"
         )
     
-    user = db.query(User).filter(User.name == name, User.email == email).first()
-    if not user:
-        return ErrorResponse(
-            error="User not found",
-            error_code="USER_NOT_FOUND",
-            details=f"User not found with name '{name}' and email '{email}'. The user may not be registered in our system. Please check the spelling of both name and email, or register the user first."
-        )
-    return UserOut.model_validate(user)
\ No newline at end of file
+    cached = users_by_email.get(email)
+    if cached is not None and cached.name == name:
+        return cached
+
+    # Email is unique, so looking up by email and comparing the name is
+    # equivalent to filtering on both, and lets the result be cached.
+    user = db.query(User).filter(User.email == email).first()
+    if user is not None:
+        result = UserOut.model_validate(user)
+        cache_user(result)
+        if result.name == name:
+            return result
+    return ErrorResponse(
+        error="User not found",
+        error_code="USER_NOT_FOUND",
+        details=f"User not found with name '{name}' and email '{email}'. The user may not be registered in our system. Please check the spelling of both name and email, or register the user first."
+    )
+
+
+def _email_exists_error(index: int, email: str, details: str) -> BatchRowError:
+    return BatchRowError(
+        index=index,
+        email=email,
+        error="Email already registered",
+        error_code="EMAIL_EXISTS",
+        details=details
+    )
+
+
+def _is_unique_violation(exc: IntegrityError) -> bool:
+    # SQLite: "UNIQUE constraint failed", PostgreSQL: "violates unique constraint"
+    return 'unique' in str(exc.orig).lower()
+
+
+def register_users(
+    db: Session,
+    users: Iterable[tuple[str, str]],
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    return_users: bool = True,
+) -> BatchRegistrationOut:
+    """Register many (name, email) pairs at once, reporting failures per row.
+
+    Emails are validated and de-duplicated in memory, checked against `users`
+    with one set-based query per chunk and inserted with a single bulk
+    statement per chunk. Each chunk is committed on its own, so `users` may
+    be a lazy iterable of any length. Rows whose name or email is missing
+    (not a string, as from an NDJSON `null`) are reported, not inserted.
+    """
+    match = EMAIL_PATTERN.match
+    seen: dict[str, int] = {}
+    created: list[UserOut] = []
+    created_count = 0
+    errors: list[BatchRowError] = []
+    rows = iter(users)
+    offset = 0
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        candidates: dict[str, tuple[int, str]] = {}
+        for index, (name, email) in enumerate(chunk, start=offset):
+            if not isinstance(email, str):
+                errors.append(BatchRowError(
+                    index=index,
+                    email=None,
+                    error="Invalid email format",
+                    error_code="INVALID_EMAIL",
+                    details="The row has no email. Please provide a valid email in the format: example@domain.com"
+                ))
+                continue
+            email = email.lower()
+            if not isinstance(name, str) or not name.strip():
+                errors.append(BatchRowError(
+                    index=index,
+                    email=email,
+                    error="Invalid name",
+                    error_code="INVALID_NAME",
+                    details="The row has no name. Please provide the user's name as a non-empty string."
+                ))
+            elif match(email) is None:
+                errors.append(BatchRowError(
+                    index=index,
+                    email=email,
+                    error="Invalid email format",
+                    error_code="INVALID_EMAIL",
+                    details=f"Email '{email}' is not a valid email address. Please provide a valid email in the format: example@domain.com"
+                ))
+            elif email in seen:
+                errors.append(_email_exists_error(
+                    index, email, f"Email '{email}' appears more than once in this batch; it was first submitted at row {seen[email]}."
+                ))
+            else:
+                seen[email] = index
+                candidates[email] = (index, name)
+        offset += len(chunk)
+
+        attempts = 0
+        while candidates:
+            existing = db.execute(select(User.email).where(User.email.in_(candidates))).scalars().all()
+            for email in existing:
+                index, _ = candidates.pop(email)
+                errors.append(_email_exists_error(
+                    index, email, f"Email '{email}' is already registered. Use get_user with the correct name and email to get the user_id."
+                ))
+            if not candidates:
+                break
+
+            values = [{'name': name, 'email': email} for email, (_, name) in candidates.items()]
+            try:
+                if return_users:
+                    result = db.execute(insert(User).returning(User.user_id, User.name, User.email), values)
+                    inserted = [UserOut(user_id=r.user_id, name=r.name, email=r.email) for r in result]
+                else:
+                    db.execute(insert(User), values)
+                    inserted = []
+                db.commit()
+            except IntegrityError as exc:
+                db.rollback()
+                attempts += 1
+                if not _is_unique_violation(exc) or attempts >= BATCH_INSERT_ATTEMPTS:
+                    raise
+                # A concurrent registration claimed one of the emails; re-check and retry
+                continue
+            created.extend(inserted)
+            created_count += len(values)
+            break
+
+    errors.sort(key=lambda e: e.index)
+    return BatchRegistrationOut(
+        created=created_count,
+        failed=len(errors),
+        users=created,
+        errors=errors
+    )
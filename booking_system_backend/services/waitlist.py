@@ -0,0 +1,118 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from models import Flight, WaitlistEntry
+from schemas import WaitlistOut, ErrorResponse, SeatClass
+from services.booking import SEAT_CLASS_MULTIPLIERS, SEAT_COUNTER_COLUMNS
+from services.user import lookup_user
+
+
+def _waitlist_out(db: Session, entry: WaitlistEntry) -> WaitlistOut:
+    result = WaitlistOut.model_validate(entry)
+    if entry.status == "waiting":
+        result.position = db.query(WaitlistEntry).filter(
+            WaitlistEntry.flight_id == entry.flight_id,
+            WaitlistEntry.seat_class == entry.seat_class,
+            WaitlistEntry.status == "waiting",
+            WaitlistEntry.waitlist_id <= entry.waitlist_id
+        ).count()
+    return result
+
+
+def _not_found(waitlist_id: int) -> ErrorResponse:
+    return ErrorResponse(
+        error="Waitlist entry not found",
+        error_code="WAITLIST_NOT_FOUND",
+        details=f"Waitlist entry {waitlist_id} does not exist. Please verify the waitlist_id returned by join_waitlist."
+    )
+
+
+def join_waitlist(db: Session, user_id: int, name: str, flight_id: int, seat_class: SeatClass = 'economy') -> WaitlistOut | ErrorResponse:
+    """Queue a user for a seat on a sold-out flight; they are booked automatically when one is freed."""
+    if seat_class not in SEAT_CLASS_MULTIPLIERS:
+        return ErrorResponse(
+            error="Invalid seat class",
+            error_code="INVALID_SEAT_CLASS",
+            details=f"Seat class '{seat_class}' is not valid. Valid options are: economy, business, galaxium."
+        )
+
+    flight = db.query(Flight).filter(Flight.flight_id == flight_id).first()
+    if not flight:
+        return ErrorResponse(
+            error="Flight not found",
+            error_code="FLIGHT_NOT_FOUND",
+            details=f"The specified flight_id {flight_id} does not exist in our system. Please check the flight_id or use list_flights to see available flights."
+        )
+
+    if getattr(flight, SEAT_COUNTER_COLUMNS[seat_class]) > 0:
+        return ErrorResponse(
+            error="Seats available",
+            error_code="SEATS_AVAILABLE",
+            details=f"The flight still has {seat_class} seats available. Please use book_flight instead of joining the waitlist."
+        )
+
+    user = lookup_user(db, user_id)
+    if user is not None and user.name != name:
+        user = lookup_user(db, user_id, use_cache=False)
+    if user is None:
+        return ErrorResponse(
+            error="User not found",
+            error_code="USER_NOT_FOUND",
+            details=f"User with ID {user_id} is not registered in our system. The user might need to register first, or you may need to check if the user_id is correct."
+        )
+    if user.name != name:
+        return ErrorResponse(
+            error="Name mismatch",
+            error_code="NAME_MISMATCH",
+            details=f"User ID {user_id} exists but the name '{name}' does not match the registered name '{user.name}'. Please verify the user's name or use the correct name for this user ID."
+        )
+
+    existing = db.query(WaitlistEntry).filter(
+        WaitlistEntry.user_id == user_id,
+        WaitlistEntry.flight_id == flight_id,
+        WaitlistEntry.seat_class == seat_class,
+        WaitlistEntry.status == "waiting"
+    ).first()
+    if existing:
+        return ErrorResponse(
+            error="Already on waitlist",
+            error_code="ALREADY_WAITLISTED",
+            details=f"User {user_id} is already waiting for a {seat_class} seat on flight {flight_id} (waitlist_id {existing.waitlist_id})."
+        )
+
+    entry = WaitlistEntry(
+        user_id=user_id,
+        flight_id=flight_id,
+        seat_class=seat_class,
+        status="waiting",
+        created_at=datetime.utcnow().isoformat()
+    )
+    db.add(entry)
+    db.commit()
+    db.refresh(entry)
+    return _waitlist_out(db, entry)
+
+
+def get_waitlist_entry(db: Session, waitlist_id: int) -> WaitlistOut | ErrorResponse:
+    """Return a waitlist entry with its current queue position or the booking it was promoted to."""
+    entry = db.query(WaitlistEntry).filter(WaitlistEntry.waitlist_id == waitlist_id).populate_existing().first()
+    if not entry:
+        return _not_found(waitlist_id)
+    return _waitlist_out(db, entry)
+
+
+def leave_waitlist(db: Session, waitlist_id: int) -> WaitlistOut | ErrorResponse:
+    """Remove a waiting user from the queue."""
+    entry = db.query(WaitlistEntry).filter(WaitlistEntry.waitlist_id == waitlist_id).first()
+    if not entry:
+        return _not_found(waitlist_id)
+    if entry.status != "waiting":
+        return ErrorResponse(
+            error="Not waiting",
+            error_code="WAITLIST_NOT_WAITING",
+            details=f"Waitlist entry {waitlist_id} is '{entry.status}' and can no longer be cancelled. Promoted entries already have a booking; use cancel_booking with booking_id {entry.booking_id} instead."
+        )
+
+    entry.status = "cancelled"
+    db.commit()
+    db.refresh(entry)
+    return _waitlist_out(db, entry)
@@ -11,6 +11,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from models import Base
 from db import SessionLocal
+from inventory import inventory
+from services.user import clear_user_cache
 
 # Create in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -27,6 +29,8 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_
 def db_session():
     """Create a fresh database session for each test."""
     Base.metadata.create_all(bind=test_engine)
+    clear_user_cache()
+    inventory.invalidate()
     session = TestingSessionLocal()
     try:
         yield session
@@ -46,8 +50,12 @@ def client(db_session, monkeypatch):
     def get_test_session():
         return db_session
 
+    import mcp_tools
+
     monkeypatch.setattr(db_module, "SessionLocal", lambda: db_session)
-    monkeypatch.setattr(server, "SessionLocal", lambda: db_session)
+    # Sessions the server opens for itself, on the test database
+    monkeypatch.setattr(server, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(mcp_tools, "SessionLocal", lambda: db_session)
 
     # Don't run seed during tests
     monkeypatch.setattr(server, "seed", lambda: None)
@@ -60,6 +68,7 @@ def client(db_session, monkeypatch):
             pass
 
     server.app.dependency_overrides[db_module.get_db] = override_get_db
+    server.app.dependency_overrides[db_module.get_read_db] = override_get_db
 
     with TestClient(server.app) as test_client:
         yield test_client
@@ -0,0 +1,177 @@
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastmcp import Client
+import metrics
+import mcp_tools
+from models import User, Flight
+
+
+@pytest.fixture
+def call_tool(db_session, monkeypatch):
+    """Call an MCP tool in-process against the test database."""
+    monkeypatch.setattr(mcp_tools, "SessionLocal", lambda: db_session)
+
+    def call(tool, **arguments):
+        async def run():
+            async with Client(mcp_tools.mcp) as client:
+                return await client.call_tool(tool, arguments, raise_on_error=False)
+        return asyncio.run(run())
+
+    return call
+
+
+class TestMCPTools:
+    """Test MCP tools exposed by mcp_tools.py."""
+
+    def test_tool_schema_hides_session(self):
+        """Test the injected session is not part of the tool input schema, and every tool takes timeout_ms."""
+        async def run():
+            async with Client(mcp_tools.mcp) as client:
+                return {t.name: t for t in await client.list_tools()}
+        tools = asyncio.run(run())
+        assert set(tools["book_flight"].input_schema["properties"]) == {"user_id", "name", "flight_id", "seat_class", "timeout_ms"}
+        assert set(tools["list_flights"].input_schema.get("properties", {})) == {"timeout_ms"}
+
+    def test_book_flight_success(self, call_tool, db_session):
+        """Test a successful booking returns structured booking data."""
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+
+        result = call_tool("book_flight", user_id=1, name="Test User", flight_id=1)
+        assert not result.is_error
+        assert result.structured_content["status"] == "booked"
+
+    def test_get_booking_details(self, call_tool, db_session):
+        """Test booking details include the flight's route and times."""
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+        call_tool("book_flight", user_id=1, name="Test User", flight_id=1)
+
+        result = call_tool("get_booking_details", user_id=1)
+        assert not result.is_error
+        [details] = result.structured_content["result"]
+        assert details["status"] == "booked"
+        assert details["flight"]["origin"] == "Earth"
+        assert details["flight"]["departure_time"] == "2099-01-01T09:00:00Z"
+
+    def test_change_booking(self, call_tool, db_session):
+        """Test a booking can be moved to another flight, keeping its booking_id."""
+        db_session.add(User(name="Test User", email="test@example.com"))
+        for base_price in (1000, 1500):
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time="2099-01-01T09:00:00Z",
+                arrival_time="2099-01-01T17:00:00Z",
+                base_price=base_price,
+                economy_seats_available=6,
+                business_seats_available=3,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+        call_tool("book_flight", user_id=1, name="Test User", flight_id=1)
+
+        result = call_tool("change_booking", booking_id=1, flight_id=2)
+        assert not result.is_error
+        assert result.structured_content["booking_id"] == 1
+        assert result.structured_content["flight_id"] == 2
+        assert result.structured_content["price_difference"] == 500
+
+    def test_get_fare_calendar(self, call_tool, db_session):
+        """Test the fare calendar tool returns one cheapest fare per day."""
+        for departure in ("2099-01-01T09:00:00Z", "2099-01-02T09:00:00Z"):
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time=departure,
+                arrival_time=departure.replace("09:00", "17:00"),
+                base_price=1000,
+                economy_seats_available=6,
+                business_seats_available=0,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+
+        result = call_tool("get_fare_calendar", origin="Earth", destination="Mars", seat_class="galaxium", start="2099-01-01", days=3)
+        assert not result.is_error
+        assert [(d["date"], d["price"]) for d in result.structured_content["result"]] == [("2099-01-01", 5000), ("2099-01-02", 5000)]
+
+    def test_errors_are_structured(self, call_tool, db_session):
+        """Test service errors come back as error results carrying error_code."""
+        result = call_tool("cancel_booking", booking_id=999)
+        assert result.is_error
+        assert result.structured_content["error_code"] == "BOOKING_NOT_FOUND"
+        assert result.structured_content["success"] is False
+
+    def test_tool_latency_recorded(self, call_tool, db_session):
+        """Test per-tool latency and error counts are recorded."""
+        metrics.reset()
+        call_tool("list_flights")
+        call_tool("get_user_id", name="Nobody", email="nobody@example.com")
+
+        snapshot = metrics.snapshot()
+        assert snapshot["timings"]["mcp.list_flights"]["count"] == 1
+        assert snapshot["counters"]["mcp.get_user_id.errors"] == 1
+
+    def test_write_tools_shed_when_saturated(self, call_tool, db_session, monkeypatch):
+        """Test write tools fail fast with OVERLOADED while read tools still run."""
+        import admission
+
+        limiter = admission.ConcurrencyLimiter(limit=1, max_queue=0, timeout=0.1)
+        monkeypatch.setattr(admission, "write_limiter", limiter)
+        assert limiter.acquire()
+        try:
+            result = call_tool("register_user", name="Test User", email="test@example.com")
+            assert result.is_error
+            assert result.structured_content["error_code"] == "OVERLOADED"
+            assert not call_tool("list_flights").is_error
+        finally:
+            limiter.release()
+        assert limiter.in_flight == 0
+
+    def test_timeout_ms_deadline(self, call_tool, db_session, monkeypatch):
+        """Test a tool call that outlives its timeout_ms fails with DEADLINE_EXCEEDED and is counted."""
+        import time
+        from services import booking
+
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+        get_bookings = booking.get_bookings
+
+        def slow_get_bookings(db, user_id, include_history=False):
+            time.sleep(0.05)
+            return get_bookings(db, user_id, include_history)
+
+        monkeypatch.setattr(booking, "get_bookings", slow_get_bookings)
+        before = metrics.snapshot()["counters"].get("deadlines.exceeded.get_bookings", 0)
+        result = call_tool("get_bookings", user_id=1, timeout_ms=10)
+        assert result.is_error
+        assert result.structured_content["error_code"] == "DEADLINE_EXCEEDED"
+        assert metrics.snapshot()["counters"]["deadlines.exceeded.get_bookings"] == before + 1
+
+        assert not call_tool("get_bookings", user_id=1, timeout_ms=5000).is_error
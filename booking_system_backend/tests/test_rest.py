@@ -36,6 +36,84 @@ class TestFlightsEndpoint:
         assert data[0]["destination"] == "Mars"
 
 
+    def test_search_flights(self, client, db_session):
+        """Test searching flights by route and departure date."""
+        for departure in ["2099-01-02T09:00:00Z", "2099-01-01T09:00:00Z"]:
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time=departure,
+                arrival_time=departure.replace("09:00", "17:00"),
+                base_price=1000000,
+                economy_seats_available=5,
+                business_seats_available=2,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+
+        response = client.get("/flights/search", params={"origin": "Earth", "destination": "Mars"})
+        assert response.status_code == 200
+        assert [f["flight_id"] for f in response.json()] == [2, 1]
+
+        response = client.get("/flights/search", params={"departs_after": "2099-01-02"})
+        assert [f["flight_id"] for f in response.json()] == [1]
+
+    def test_fare_calendar(self, client, db_session):
+        """Test the fare calendar returns the cheapest flight per day and validates days."""
+        for departure, base_price in [("2099-01-01T09:00:00Z", 2000), ("2099-01-01T18:00:00Z", 1000), ("2099-01-03T09:00:00Z", 1500)]:
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time=departure,
+                arrival_time=departure.replace("09:00", "17:00"),
+                base_price=base_price,
+                economy_seats_available=5,
+                business_seats_available=2,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+
+        params = {"origin": "Earth", "destination": "Mars", "start": "2099-01-01", "days": 7}
+        response = client.get("/fares/calendar", params=params)
+        assert response.status_code == 200
+        assert response.json() == [
+            {"date": "2099-01-01", "flight_id": 2, "price": 1000},
+            {"date": "2099-01-03", "flight_id": 3, "price": 1500},
+        ]
+        assert client.get("/fares/calendar", params={**params, "days": 1000}).status_code == 422
+
+    def test_import_schedule(self, client, monkeypatch):
+        """Test a CSV schedule upload creates flights and reports rejected rows."""
+        import config
+
+        body = (
+            "origin,destination,departure_time,arrival_time,base_price,total_seats\n"
+            "Earth,Mars,2099-01-01T09:00:00Z,2099-01-01T17:00:00Z,1000,100\n"
+            "Earth,Mars,2099-01-01T10:00:00Z,2099-01-01T09:00:00Z,1000,100\n"
+        )
+        assert client.post("/flights/schedule", content=body).status_code == 404
+        monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+        assert client.post("/flights/schedule", content=body).status_code == 401
+        assert client.get("/flights").json() == []
+
+        headers = {"X-Admin-Token": "s3cret"}
+        response = client.post("/flights/schedule", content=body, headers={**headers, "Content-Type": "text/csv"})
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["created"], data["updated"], data["failed"]) == (1, 0, 1)
+        assert data["errors"][0]["index"] == 1
+        assert data["errors"][0]["error_code"] == "INVALID_TIME"
+
+        flights = client.get("/flights").json()
+        assert [(f["flight_id"], f["economy_seats_available"]) for f in flights] == [(1, 60)]
+
+        ndjson = '{"origin": "Earth", "destination": "Mars", "departure_time": "2099-01-01T09:00:00Z", ' \
+                 '"arrival_time": "2099-01-01T18:00:00Z", "base_price": 900, "total_seats": 100}\n'
+        response = client.post("/flights/schedule", params={"format": "ndjson"}, content=ndjson, headers=headers)
+        assert (response.json()["created"], response.json()["updated"]) == (0, 1)
+        assert client.get("/flights").json()[0]["base_price"] == 900
+
+
 class TestRegisterEndpoint:
     """Test /register endpoint."""
 
@@ -58,6 +136,22 @@ class TestRegisterEndpoint:
         assert data["success"] == False
         assert data["error_code"] == "EMAIL_EXISTS"
 
+    def test_register_batch(self, client, db_session, sample_user_data):
+        """Test bulk registration endpoint."""
+        client.post("/register", json=sample_user_data)
+
+        response = client.post("/register/batch", json={"users": [
+            {"name": "New User", "email": "new@example.com"},
+            sample_user_data,
+            {"name": "Bad", "email": "bad"},
+        ]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 1
+        assert data["failed"] == 2
+        assert data["users"][0]["email"] == "new@example.com"
+        assert [e["error_code"] for e in data["errors"]] == ["EMAIL_EXISTS", "INVALID_EMAIL"]
+
 
 class TestUserEndpoint:
     """Test /user endpoint."""
@@ -230,3 +324,498 @@ class TestHealthEndpoint:
         response = client.get("/")
         assert response.status_code == 200
         assert response.json() == {"status": "OK"}
+
+
+class TestExportEndpoint:
+    """Test /export/{table} endpoint."""
+
+    HEADERS = {"X-Admin-Token": "s3cret"}
+
+    @pytest.fixture(autouse=True)
+    def admin_token(self, monkeypatch):
+        import config
+
+        monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+
+    def test_export_requires_admin_token(self, client, db_session):
+        """Test exports, which hold every user's email, need the admin token."""
+        response = client.get("/export/users")
+        assert response.status_code == 401
+        assert response.json()["error_code"] == "ADMIN_TOKEN_REQUIRED"
+
+    def test_export_users_csv(self, client, db_session, sample_user_data):
+        """Test streaming CSV export with watermark header."""
+        client.post("/register", json=sample_user_data)
+
+        response = client.get("/export/users", headers=self.HEADERS)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.headers["x-export-watermark"] == "1"
+        lines = response.text.splitlines()
+        assert lines[0] == "user_id,name,email"
+        assert lines[1] == "1,Test User,test@example.com"
+
+    def test_export_arrow_stream(self, client, db_session, sample_user_data):
+        """Test Arrow IPC stream export."""
+        pa = pytest.importorskip("pyarrow")
+        client.post("/register", json=sample_user_data)
+
+        response = client.get("/export/users", params={"format": "arrow"}, headers=self.HEADERS)
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column("email").to_pylist() == ["test@example.com"]
+
+    def test_export_unknown_table(self, client, db_session):
+        """Test exporting an unknown table is rejected."""
+        response = client.get("/export/payments", headers=self.HEADERS)
+        assert response.status_code == 422
+
+
+class TestMetricsEndpoint:
+    """Test /metrics endpoint."""
+
+    def test_metrics_include_user_cache(self, client, db_session, sample_user_data):
+        """Test user cache hit-rate statistics are exposed."""
+        client.post("/register", json=sample_user_data)
+        client.get("/user", params=sample_user_data)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        stats = response.json()["user_cache"]["by_email"]
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1.0
+
+
+class TestStartup:
+    """Test database preparation at startup."""
+
+    def test_seed_mode_never_skips_seeding(self, monkeypatch):
+        """Test worker processes don't reseed when the supervisor already did."""
+        import server
+        import config
+
+        calls = []
+        monkeypatch.setattr(server, "init_db", lambda: calls.append("init"))
+        monkeypatch.setattr(server, "seed", lambda: calls.append("seed"))
+        monkeypatch.setattr(config, "SEED_MODE", "never")
+        server.prepare_database()
+        assert calls == ["init"]
+
+        monkeypatch.setattr(config, "SEED_MODE", "always")
+        server.prepare_database()
+        assert calls == ["init", "init", "seed"]
+
+    def test_seed_mode_if_empty_skips_existing_data(self, monkeypatch):
+        """Test restarts don't wipe a database that already has data."""
+        import server
+        import config
+
+        calls = []
+        monkeypatch.setattr(server, "init_db", lambda: None)
+        monkeypatch.setattr(server, "seed", lambda: calls.append("seed"))
+        monkeypatch.setattr(config, "SEED_MODE", "if-empty")
+
+        monkeypatch.setattr(server, "has_data", lambda: True)
+        server.prepare_database()
+        assert calls == []
+
+        monkeypatch.setattr(server, "has_data", lambda: False)
+        server.prepare_database()
+        assert calls == ["seed"]
+
+    def test_startup_phases_reported(self, client):
+        """Test the startup phase breakdown is exposed in metrics."""
+        startup = client.get("/metrics").json()["startup"]
+        assert "import_modules" in startup
+        assert startup["ready"] >= startup["import_modules"]
+
+
+
+class TestWaitlistEndpoint:
+    """Test /waitlist endpoints."""
+
+    def test_long_poll_returns_on_promotion(self, client, db_session):
+        """Test a waiting client is released as soon as its entry is promoted."""
+        import threading
+        import time
+        from services import booking as booking_service
+
+        db_session.add(User(name="Holder", email="holder@example.com"))
+        db_session.add(User(name="Waiter", email="waiter@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=1,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+        held = client.post("/book", json={"user_id": 1, "name": "Holder", "flight_id": 1}).json()
+        entry = client.post("/waitlist", json={"user_id": 2, "name": "Waiter", "flight_id": 1}).json()
+        assert entry["status"] == "waiting"
+
+        timer = threading.Timer(0.2, booking_service.cancel_booking, args=(db_session, held["booking_id"]))
+        timer.start()
+        started = time.monotonic()
+        response = client.get(f"/waitlist/{entry['waitlist_id']}", params={"wait": 10})
+        timer.join()
+
+        assert time.monotonic() - started < 5
+        data = response.json()
+        assert data["status"] == "promoted"
+        assert data["booking_id"] is not None
+
+    def test_waitlist_not_found(self, client, db_session):
+        """Test unknown waitlist ids return a structured error."""
+        response = client.get("/waitlist/999")
+        assert response.json()["error_code"] == "WAITLIST_NOT_FOUND"
+
+
+class TestSeatStreamEndpoint:
+    """Test /flights/ws push channel."""
+
+    def test_websocket_receives_booking_update(self, client, db_session, sample_user_data):
+        """Test a booking is pushed to WebSocket subscribers."""
+        user_id = client.post("/register", json=sample_user_data).json()["user_id"]
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+
+        with client.websocket_connect("/flights/ws?flight_ids=1") as websocket:
+            client.post("/book", json={"user_id": user_id, "name": sample_user_data["name"], "flight_id": 1})
+            batch = websocket.receive_json()
+
+        assert batch == [{
+            "flight_id": 1,
+            "economy_seats_available": 5,
+            "business_seats_available": 3,
+            "galaxium_seats_available": 1,
+        }]
+
+
+class TestBookingHistory:
+    """Test archived bookings through the REST API."""
+
+    def test_bookings_history_param(self, client, db_session):
+        """Test archived bookings are hidden unless history=true is passed."""
+        from services import archive
+
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2000-01-01T09:00:00Z",
+            arrival_time="2000-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+        db_session.add(Booking(user_id=1, flight_id=1, status="completed", booking_time="1999-12-01T00:00:00", price_paid=1000000))
+        db_session.commit()
+        archive.archive_bookings(db_session)
+
+        assert client.get("/bookings/1").json() == []
+        response = client.get("/bookings/1", params={"history": "true"})
+        assert response.status_code == 200
+        assert [b["booking_id"] for b in response.json()] == [1]
+
+    def test_booking_details(self, client, db_session):
+        """Test booking details embed the flight and change ETag when the flight changes."""
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+        client.post("/book", json={"user_id": 1, "name": "Test User", "flight_id": 1})
+
+        response = client.get("/bookings/1/details")
+        assert response.status_code == 200
+        [details] = response.json()
+        assert details["flight"]["destination"] == "Mars"
+        assert details["flight"]["economy_seats_available"] == 5
+
+        etag = response.headers["etag"]
+        assert client.get("/bookings/1/details", headers={"If-None-Match": etag}).status_code == 304
+        db_session.get(Flight, 1).departure_time = "2099-01-02T09:00:00Z"
+        db_session.commit()
+        response = client.get("/bookings/1/details", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()[0]["flight"]["departure_time"] == "2099-01-02T09:00:00Z"
+
+    def test_change_booking(self, client, db_session):
+        """Test changing a booking's class returns the price difference and updates the user's bookings."""
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+        client.post("/book", json={"user_id": 1, "name": "Test User", "flight_id": 1})
+        etag = client.get("/bookings/1").headers["etag"]
+
+        response = client.post("/bookings/1/change", json={"seat_class": "business"})
+        assert response.status_code == 200
+        assert response.json()["seat_class"] == "business"
+        assert response.json()["price_difference"] == 1500000
+        assert client.get("/bookings/1", headers={"If-None-Match": etag}).status_code == 200
+
+        response = client.post("/bookings/1/change", json={"seat_class": "galaxium"})
+        assert response.json()["error_code"] == "NO_SEATS_AVAILABLE"
+        response = client.post("/bookings/1/change", json={"seat_class": "first"})
+        assert response.status_code == 422
+
+
+class TestAdmissionControl:
+    """Test rate limiting and write load shedding in the middleware."""
+
+    def test_rate_limit_per_api_key(self, client, db_session, monkeypatch):
+        """Test a client over its rate gets 429 while other clients are unaffected."""
+        import admission
+
+        monkeypatch.setattr(admission, "rate_limiter", admission.RateLimiter(rate=0.5, burst=2))
+        abuser = {"X-API-Key": "abuser"}
+        assert client.get("/flights", headers=abuser).status_code == 200
+        assert client.get("/flights", headers=abuser).status_code == 200
+
+        response = client.get("/flights", headers=abuser)
+        assert response.status_code == 429
+        assert response.json()["error_code"] == "RATE_LIMITED"
+        assert int(response.headers["retry-after"]) >= 1
+
+        assert client.get("/flights", headers={"X-API-Key": "polite"}).status_code == 200
+        assert client.get("/metrics", headers=abuser).status_code == 200
+
+    def test_rate_limit_per_ip_with_rotating_keys(self, client, db_session, monkeypatch):
+        """Test a client sending a new API key with every request is still limited by its IP."""
+        import admission
+
+        monkeypatch.setattr(admission, "rate_limiter", admission.RateLimiter(rate=0.5, burst=2))
+        monkeypatch.setattr(admission, "ip_rate_limiter", admission.RateLimiter(rate=1, burst=4))
+        for i in range(4):
+            assert client.get("/flights", headers={"X-API-Key": f"key-{i}"}).status_code == 200
+        response = client.get("/flights", headers={"X-API-Key": "key-4"})
+        assert response.status_code == 429
+        assert response.json()["error_code"] == "RATE_LIMITED"
+
+    def test_writes_shed_when_saturated(self, client, db_session, sample_user_data, monkeypatch):
+        """Test writes get 503 once the write limit and queue are full, while reads still succeed."""
+        import admission
+
+        limiter = admission.ConcurrencyLimiter(limit=1, max_queue=0, timeout=0.1)
+        monkeypatch.setattr(admission, "write_limiter", limiter)
+        assert limiter.acquire()  # Another write in flight
+        try:
+            response = client.post("/register", json=sample_user_data)
+            assert response.status_code == 503
+            assert response.json()["error_code"] == "OVERLOADED"
+            assert client.get("/flights").status_code == 200
+        finally:
+            limiter.release()
+
+        assert client.post("/register", json=sample_user_data).status_code == 200
+
+
+class TestDeadlines:
+    """Test request deadlines set by configuration or the X-Request-Timeout-Ms header."""
+
+    def test_header_deadline_fails_fast(self, client, db_session, monkeypatch):
+        """Test a request past its deadline gets 504 DEADLINE_EXCEEDED, and one within it succeeds."""
+        import time
+        import metrics
+        from services import booking
+
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+        get_bookings = booking.get_bookings
+
+        def slow_get_bookings(db, user_id, include_history=False):
+            time.sleep(0.05)
+            return get_bookings(db, user_id, include_history)
+
+        monkeypatch.setattr(booking, "get_bookings", slow_get_bookings)
+        response = client.get("/bookings/1", headers={"X-Request-Timeout-Ms": "10"})
+        assert response.status_code == 504
+        assert response.json()["error_code"] == "DEADLINE_EXCEEDED"
+        assert metrics.snapshot()["counters"]["deadlines.exceeded.GET /bookings/{user_id}"] >= 1
+
+        assert client.get("/bookings/1", headers={"X-Request-Timeout-Ms": "5000"}).status_code == 200
+        assert client.get("/bookings/1").status_code == 200
+
+    def test_configured_deadline_per_route(self, client, db_session, monkeypatch):
+        """Test a route's configured deadline applies without a header."""
+        import time
+        import config
+        from services import booking
+
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+        get_bookings = booking.get_bookings
+        monkeypatch.setattr(booking, "get_bookings", lambda *args, **kwargs: time.sleep(0.05) or get_bookings(*args, **kwargs))
+        monkeypatch.setattr(config, "DEADLINES", {"GET /bookings/{user_id}": 10})
+        assert client.get("/bookings/1").status_code == 504
+        assert client.get("/bookings/1/details").status_code == 200
+
+
+class TestAdminEndpoints:
+    """Test the token-protected profiling, memory and slow request endpoints."""
+
+    def test_hidden_without_token_configured(self, client, monkeypatch):
+        """Test admin endpoints don't exist unless a token is set, and require it once it is."""
+        import config
+
+        assert client.get("/admin/slow-requests").status_code == 404
+        monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+        response = client.get("/admin/slow-requests", headers={"X-Admin-Token": "guess"})
+        assert response.status_code == 401
+        assert response.json()["error_code"] == "ADMIN_TOKEN_REQUIRED"
+        response = client.get("/admin/slow-requests", headers={"Authorization": "Bearer s3cret"})
+        assert response.json()["error_code"] == "TRACING_DISABLED"
+
+    def test_profile_and_memory_diff(self, client, monkeypatch):
+        """Test a short profile returns collapsed stacks and a memory diff lists allocation sites."""
+        import config
+
+        monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+        headers = {"X-Admin-Token": "s3cret"}
+        response = client.get("/admin/profile", params={"seconds": 0.2, "include_idle": True}, headers=headers)
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+        response = client.get("/admin/memory", params={"seconds": 0.1, "limit": 5}, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()["top"]) <= 5
+
+    def test_slow_requests_with_sql(self, client, db_session, monkeypatch):
+        """Test requests over the threshold are kept per route with the SQL they ran."""
+        import config
+        import profiling
+
+        monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+        monkeypatch.setattr(profiling, "slow_requests", profiling.SlowRequestLog(threshold=0))
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+        assert client.get("/bookings/1").status_code == 200
+
+        headers = {"X-Admin-Token": "s3cret"}
+        routes = client.get("/admin/slow-requests", params={"clear": True}, headers=headers).json()["routes"]
+        assert list(routes) == ["GET /bookings/{user_id}"]
+        trace = routes["GET /bookings/{user_id}"][0]
+        assert (trace["path"], trace["status"]) == ("/bookings/1", 200)
+        assert trace["sql_count"] >= 1
+        assert any("bookings" in statement["sql"] for statement in trace["sql"])
+        assert client.get("/admin/slow-requests", headers=headers).json()["routes"] == {}
+
+
+
+class TestConditionalGet:
+    """Test ETags, 304 responses and response compression on list endpoints."""
+
+    def _add_flights(self, db_session, count=1):
+        for i in range(count):
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time="2099-01-01T09:00:00Z",
+                arrival_time="2099-01-01T17:00:00Z",
+                base_price=1000000 + i,
+                economy_seats_available=6,
+                business_seats_available=3,
+                galaxium_seats_available=1
+            ))
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+
+    def test_flights_not_modified_without_db(self, client, db_session, monkeypatch):
+        """Test a matching If-None-Match gets 304 without querying, and a booking changes the ETag."""
+        from services import flight
+
+        self._add_flights(db_session)
+        response = client.get("/flights")
+        etag = response.headers["etag"]
+
+        def fail(db):
+            raise AssertionError("flights were queried")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(flight, "list_flights", fail)
+            response = client.get("/flights", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+        client.post("/book", json={"user_id": 1, "name": "Test User", "flight_id": 1})
+        response = client.get("/flights", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()[0]["economy_seats_available"] == 5
+
+    def test_bookings_etag_per_user(self, client, db_session):
+        """Test a booking changes only the booking user's ETag."""
+        self._add_flights(db_session)
+        db_session.add(User(name="Other User", email="other@example.com"))
+        db_session.commit()
+        mine = client.get("/bookings/1").headers["etag"]
+        theirs = client.get("/bookings/2").headers["etag"]
+
+        client.post("/book", json={"user_id": 1, "name": "Test User", "flight_id": 1})
+
+        assert client.get("/bookings/1", headers={"If-None-Match": mine}).status_code == 200
+        assert client.get("/bookings/2", headers={"If-None-Match": theirs}).status_code == 304
+
+    def test_large_responses_compressed(self, client, db_session):
+        """Test gzip is negotiated above the size threshold and the ETag names the encoding."""
+        self._add_flights(db_session, count=30)
+        response = client.get("/flights", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.headers["etag"].endswith('-gzip"')
+        assert len(response.json()) == 30
+
+        again = client.get("/flights", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]})
+        assert again.status_code == 304
+
+        small = client.get("/bookings/1", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+
+    def test_brotli_preferred_when_accepted(self, client, db_session):
+        """Test br is chosen over gzip when the client accepts both."""
+        pytest.importorskip("brotli")
+        self._add_flights(db_session, count=30)
+        response = client.get("/flights", headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
+        assert len(response.json()) == 30
+
+    def test_negotiate_respects_q_values(self):
+        """Test encodings refused with q=0 are skipped."""
+        from compression import negotiate
+
+        assert negotiate("gzip;q=1.0, br;q=0", ["br", "gzip"]) == "gzip"
+        assert negotiate("*", ["zstd", "gzip"]) == "zstd"
+        assert negotiate("identity", ["gzip"]) is None
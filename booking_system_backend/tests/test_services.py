@@ -4,9 +4,9 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from models import User, Flight, Booking
+from models import Base, User, Flight, Booking
 from schemas import ErrorResponse
-from services import flight, user, booking
+from services import flight, user, booking, export, waitlist
 
 
 class TestFlightService:
@@ -68,6 +68,59 @@ class TestUserService:
         assert isinstance(result, ErrorResponse)
         assert result.error_code == "USER_NOT_FOUND"
 
+    def test_register_users_batch(self, db_session):
+        """Test bulk registration reports per-row failures."""
+        db_session.add(User(name="Existing", email="taken@example.com"))
+        db_session.commit()
+
+        result = user.register_users(db_session, [
+            ("User A", "A@example.com"),
+            ("User B", "not-an-email"),
+            ("User C", "a@example.com"),
+            ("User D", "taken@example.com"),
+            ("User E", "e@example.com"),
+        ], chunk_size=2)
+
+        assert result.created == 2
+        assert [u.email for u in result.users] == ["a@example.com", "e@example.com"]
+        assert [(e.index, e.error_code) for e in result.errors] == [
+            (1, "INVALID_EMAIL"),
+            (2, "EMAIL_EXISTS"),
+            (3, "EMAIL_EXISTS"),
+        ]
+        assert db_session.query(User).count() == 3
+
+    def test_register_users_batch_missing_fields(self, db_session):
+        """Test rows with a null name or email are reported instead of failing the batch."""
+        result = user.register_users(db_session, [
+            (None, "a@example.com"),
+            ("User B", None),
+            ("User C", "c@example.com"),
+        ])
+
+        assert result.created == 1
+        assert [(e.index, e.email, e.error_code) for e in result.errors] == [
+            (0, "a@example.com", "INVALID_NAME"),
+            (1, None, "INVALID_EMAIL"),
+        ]
+
+    def test_register_users_batch_retry_is_bounded(self, db_session, monkeypatch):
+        """Test an insert that keeps failing a constraint is raised, not retried forever."""
+        from sqlalchemy import event
+        from sqlalchemy.exc import IntegrityError
+
+        def reject_inserts(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO users"):
+                raise conn.dialect.loaded_dbapi.IntegrityError("UNIQUE constraint failed: users.email")
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", reject_inserts)
+        try:
+            with pytest.raises(IntegrityError):
+                user.register_users(db_session, [("User A", "a@example.com")])
+        finally:
+            event.remove(engine, "before_cursor_execute", reject_inserts)
+
 
 class TestBookingService:
     """Test booking service functions."""
@@ -265,3 +318,1885 @@ class TestBookingService:
         """Test getting bookings when user has none."""
         result = booking.get_bookings(db_session, 999)
         assert result == []
+
+
+class TestExportService:
+    """Test bulk export service functions."""
+
+    def _add_bookings(self, db_session, count):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+        for i in range(count):
+            db_session.add(Booking(
+                user_id=1,
+                flight_id=1,
+                status="booked",
+                booking_time=f"2099-01-01T10:00:{i:02d}Z",
+                seat_class="economy",
+                price_paid=1000000
+            ))
+        db_session.commit()
+
+    def test_iter_row_chunks_respects_chunk_size(self, db_session):
+        """Test rows are streamed in chunks of the requested size."""
+        self._add_bookings(db_session, 5)
+
+        chunks = list(export.iter_row_chunks(db_session, "bookings", chunk_size=2))
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        assert [row[0] for chunk in chunks for row in chunk] == [1, 2, 3, 4, 5]
+
+    def test_export_csv_incremental(self, db_session):
+        """Test CSV export only includes rows above the id watermark."""
+        self._add_bookings(db_session, 5)
+
+        result = export.export_table(db_session, "bookings", "csv", since_id=3, chunk_size=2)
+        lines = b"".join(result).decode().splitlines()
+        assert lines[0].startswith("booking_id,user_id,flight_id")
+        assert [line.split(",")[0] for line in lines[1:]] == ["4", "5"]
+
+    def test_export_csv_since_booking_time(self, db_session):
+        """Test bookings can be exported since a booking_time watermark."""
+        self._add_bookings(db_session, 5)
+
+        result = export.export_table(db_session, "bookings", "csv", since_time="2099-01-01T10:00:02Z")
+        lines = b"".join(result).decode().splitlines()
+        assert len(lines) == 3
+
+    def test_export_csv_empty_table(self, db_session):
+        """Test exporting an empty table still produces a header."""
+        result = export.export_table(db_session, "users", "csv")
+        assert b"".join(result).decode().strip() == "user_id,name,email"
+
+    def test_export_parquet_roundtrip(self, db_session):
+        """Test Parquet export writes one row group per chunk."""
+        pq = pytest.importorskip("pyarrow.parquet")
+        import io
+        self._add_bookings(db_session, 5)
+
+        result = export.export_table(db_session, "bookings", "parquet", chunk_size=2)
+        parquet_file = pq.ParquetFile(io.BytesIO(b"".join(result)))
+        assert parquet_file.metadata.num_rows == 5
+        assert parquet_file.metadata.num_row_groups == 3
+
+    def test_export_archived_bookings(self, db_session):
+        """Test archived bookings can be exported, so the archive job doesn't lose history."""
+        from services import archive
+
+        self._add_bookings(db_session, 3)
+        db_session.query(Booking).filter(Booking.booking_id == 2).update({"status": "cancelled", "booking_time": "2000-01-01T00:00:00"})
+        db_session.commit()
+        archive.archive_bookings(db_session, cancelled_before="2098-01-01T00:00:00")
+
+        live = b"".join(export.export_table(db_session, "bookings", "csv")).decode().splitlines()
+        archived = b"".join(export.export_table(db_session, "bookings_archive", "csv")).decode().splitlines()
+        assert [line.split(",")[0] for line in live[1:]] == ["1", "3"]
+        assert archived[0].endswith(",archived_at")
+        assert [line.split(",")[0] for line in archived[1:]] == ["2"]
+
+    def test_export_invalid_watermark(self, db_session):
+        """Test booking_time watermark is rejected for other tables."""
+        result = export.export_table(db_session, "users", "csv", since_time="2099-01-01T00:00:00Z")
+        assert isinstance(result, ErrorResponse)
+        assert result.error_code == "INVALID_WATERMARK"
+
+
+class TestUserDirectoryCache:
+    """Test the user directory cache used for identity checks."""
+
+    def _add_flight(self, db_session):
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+        return db_session.query(Flight).first()
+
+    def test_lru_cache_evicts_and_expires(self, monkeypatch):
+        """Test size bound, LRU order and TTL expiry."""
+        from cache import LRUCache
+        import cache as cache_module
+
+        lru = LRUCache(maxsize=2, ttl=10)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        assert lru.get("a") == 1
+        lru.set("c", 3)
+        assert lru.get("b") is None
+        assert lru.get("a") == 1
+
+        now = cache_module.time.monotonic()
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now + 11)
+        assert lru.get("a") is None
+        assert lru.stats()["evictions"] == 1
+
+    def test_repeated_lookups_hit_cache(self, db_session):
+        """Test get_user serves repeated lookups from the cache."""
+        user.register_user(db_session, "Test User", "test@example.com")
+        user.clear_user_cache()
+
+        for _ in range(5):
+            result = user.get_user(db_session, "Test User", "TEST@example.com")
+            assert result.email == "test@example.com"
+
+        stats = user.users_by_email.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 4
+
+    def test_stale_cached_name_rechecked_against_db(self, db_session):
+        """Test a rename made outside the service layer doesn't cause a false mismatch."""
+        registered = user.register_user(db_session, "Old Name", "test@example.com")
+        flight_obj = self._add_flight(db_session)
+
+        db_session.query(User).filter(User.user_id == registered.user_id).update({"name": "New Name"})
+        db_session.commit()
+        assert user.users_by_id.get(registered.user_id).name == "Old Name"
+
+        result = booking.book_flight(db_session, registered.user_id, "New Name", flight_obj.flight_id)
+        assert result.status == "booked"
+        assert user.users_by_id.get(registered.user_id).name == "New Name"
+
+    def test_booking_identity_served_from_cache(self, db_session):
+        """Test booking with the cached name doesn't query the users table."""
+        from sqlalchemy import event
+
+        registered = user.register_user(db_session, "Test User", "test@example.com")
+        flight_obj = self._add_flight(db_session)
+        statements = []
+        listen = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_session.get_bind(), "before_cursor_execute", listen)
+        try:
+            result = booking.book_flight(db_session, registered.user_id, "Test User", flight_obj.flight_id)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listen)
+
+        assert result.status == "booked"
+        assert not any("FROM users" in s for s in statements)
+
+    def test_stale_cached_name_rejected(self, db_session, monkeypatch):
+        """Test the old name of a user renamed by another process can't book once the rename is synced."""
+        import invalidation
+        from invalidation import InvalidationListener
+
+        registered = user.register_user(db_session, "Old Name", "test@example.com")
+        flight_obj = self._add_flight(db_session)
+        listener = InvalidationListener(db_session.get_bind())
+        listener.poll()
+
+        with monkeypatch.context() as other_process:
+            other_process.setattr(invalidation, "PROCESS_ID", "other-worker")
+            db_session.query(User).filter(User.user_id == registered.user_id).update({"name": "New Name"})
+            invalidation.publish(db_session, "user_id", str(registered.user_id))
+            db_session.commit()
+        assert user.users_by_id.get(registered.user_id).name == "Old Name"
+        listener.poll()
+        listener.stop()
+
+        result = booking.book_flight(db_session, registered.user_id, "Old Name", flight_obj.flight_id)
+        assert result.error_code == "NAME_MISMATCH"
+        db_session.query(Flight).update({"galaxium_seats_available": 0})
+        db_session.commit()
+        result = waitlist.join_waitlist(db_session, registered.user_id, "Old Name", flight_obj.flight_id, "galaxium")
+        assert result.error_code == "NAME_MISMATCH"
+
+    def test_invalidation_from_other_process(self, db_session, monkeypatch):
+        """Test an update published by another process evicts the cached user."""
+        import invalidation
+        from invalidation import InvalidationListener, publish
+
+        registered = user.register_user(db_session, "Old Name", "test@example.com")
+        listener = InvalidationListener(db_session.get_bind())
+        listener.poll()
+
+        # Another worker renames the user and publishes the invalidation
+        with monkeypatch.context() as other_process:
+            other_process.setattr(invalidation, "PROCESS_ID", "other-worker")
+            db_session.query(User).filter(User.user_id == registered.user_id).update({"name": "New Name"})
+            publish(db_session, "user_id", str(registered.user_id))
+            publish(db_session, "user_email", "test@example.com")
+            db_session.commit()
+        assert user.users_by_id.get(registered.user_id) is not None
+
+        assert listener.poll() == 2
+        assert user.users_by_id.get(registered.user_id) is None
+        assert user.get_user(db_session, "New Name", "test@example.com").user_id == registered.user_id
+        listener.stop()
+
+
+class TestInvalidationLog:
+    """Test the cross-process invalidation log."""
+
+    def _book_and_cancel(self, db_session):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=10,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+        booked = booking.book_flight(db_session, 1, "Test User", 1)
+        booking.cancel_booking(db_session, booked.booking_id)
+
+    def test_nothing_published_without_sync(self, db_session, monkeypatch):
+        """Test a single worker that doesn't sync caches writes no log rows."""
+        import config
+        from models import CacheInvalidation
+
+        monkeypatch.setattr(config, "CACHE_SYNC_INTERVAL", 0)
+        monkeypatch.setattr(config, "WORKERS", 1)
+        self._book_and_cancel(db_session)
+        assert db_session.query(CacheInvalidation).count() == 0
+
+    def test_listener_skips_own_rows(self, db_session, monkeypatch):
+        """Test a process doesn't re-apply invalidations it published itself."""
+        from invalidation import InvalidationListener
+        from versions import data_versions
+
+        listener = InvalidationListener(db_session.get_bind())
+        listener.poll()
+        self._book_and_cancel(db_session)
+        local = data_versions.flights
+
+        assert listener.poll() == 0
+        assert data_versions.flights == local
+        listener.stop()
+
+    def test_prune_keeps_latest_rows(self, db_session, monkeypatch):
+        """Test pruning keeps only the newest RETAIN_ROWS rows."""
+        import invalidation
+        from models import CacheInvalidation
+
+        monkeypatch.setattr(invalidation, "RETAIN_ROWS", 3)
+        for n in range(10):
+            invalidation.publish(db_session, "data_version", str(n))
+        db_session.commit()
+
+        assert invalidation.prune(db_session.get_bind()) == 7
+        assert [row.key for row in db_session.query(CacheInvalidation).order_by(CacheInvalidation.id)] == ["7", "8", "9"]
+
+
+class TestWaitlistService:
+    """Test waitlist service functions."""
+
+    def _setup_sold_out_flight(self, db_session):
+        for name in ("Holder", "First", "Second"):
+            db_session.add(User(name=name, email=f"{name.lower()}@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=1,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+        return booking.book_flight(db_session, 1, "Holder", 1)
+
+    def test_join_waitlist_requires_sold_out(self, db_session):
+        """Test joining is refused while seats are still available."""
+        db_session.add(User(name="Holder", email="holder@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=1,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+
+        result = waitlist.join_waitlist(db_session, 1, "Holder", 1, "economy")
+        assert isinstance(result, ErrorResponse)
+        assert result.error_code == "SEATS_AVAILABLE"
+
+    def test_join_waitlist_positions(self, db_session):
+        """Test waiting users are queued in FIFO order without duplicates."""
+        self._setup_sold_out_flight(db_session)
+
+        first = waitlist.join_waitlist(db_session, 2, "First", 1, "economy")
+        second = waitlist.join_waitlist(db_session, 3, "Second", 1, "economy")
+        duplicate = waitlist.join_waitlist(db_session, 2, "First", 1, "economy")
+
+        assert (first.position, second.position) == (1, 2)
+        assert duplicate.error_code == "ALREADY_WAITLISTED"
+
+    def test_cancel_promotes_first_waiting_user(self, db_session):
+        """Test cancelling a booking books the head of the waitlist in the same commit."""
+        held = self._setup_sold_out_flight(db_session)
+        first = waitlist.join_waitlist(db_session, 2, "First", 1, "economy")
+        second = waitlist.join_waitlist(db_session, 3, "Second", 1, "economy")
+
+        booking.cancel_booking(db_session, held.booking_id)
+
+        promoted = waitlist.get_waitlist_entry(db_session, first.waitlist_id)
+        assert promoted.status == "promoted"
+        assert promoted.position is None
+        new_booking = db_session.query(Booking).filter(Booking.booking_id == promoted.booking_id).one()
+        assert (new_booking.user_id, new_booking.status, new_booking.price_paid) == (2, "booked", 1000000)
+        assert db_session.query(Flight).one().economy_seats_available == 0
+        assert waitlist.get_waitlist_entry(db_session, second.waitlist_id).position == 1
+
+    def test_cancel_without_waitlist_restores_seat(self, db_session):
+        """Test seats are restored when no one is waiting in that class."""
+        held = self._setup_sold_out_flight(db_session)
+        waitlist.leave_waitlist(db_session, waitlist.join_waitlist(db_session, 2, "First", 1, "economy").waitlist_id)
+
+        booking.cancel_booking(db_session, held.booking_id)
+
+        assert db_session.query(Flight).one().economy_seats_available == 1
+        assert db_session.query(Booking).count() == 1
+
+
+class TestSeatBroadcaster:
+    """Test seat availability fan-out to push subscribers."""
+
+    def _add_flight_and_user(self, db_session):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=6,
+            business_seats_available=3,
+            galaxium_seats_available=1
+        ))
+        db_session.commit()
+
+    def test_burst_is_coalesced_after_commit(self, db_session):
+        """Test a burst of bookings reaches subscribers as one batch with the latest counts."""
+        import asyncio
+        from live_updates import SeatBroadcaster
+        import live_updates
+
+        self._add_flight_and_user(db_session)
+
+        async def run():
+            broadcaster = SeatBroadcaster(interval=0.01)
+            original = live_updates.broadcaster
+            live_updates.broadcaster = broadcaster
+            await broadcaster.start()
+            try:
+                subscriber = broadcaster.subscribe()
+                other = broadcaster.subscribe({42})
+                booking.book_flight(db_session, 1, "Test User", 1)
+                booking.book_flight(db_session, 1, "Test User", 1, "business")
+                batch = await subscriber.next_batch(timeout=1)
+                assert await other.next_batch(timeout=0.05) == []
+                return batch
+            finally:
+                await broadcaster.stop()
+                live_updates.broadcaster = original
+
+        batch = asyncio.run(run())
+        assert batch == [{
+            "flight_id": 1,
+            "economy_seats_available": 5,
+            "business_seats_available": 2,
+            "galaxium_seats_available": 1,
+        }]
+
+    def test_slow_subscriber_keeps_latest_state_only(self):
+        """Test a subscriber that doesn't read holds one pending entry per flight."""
+        import asyncio
+        from live_updates import SeatBroadcaster
+
+        async def run():
+            broadcaster = SeatBroadcaster()
+            await broadcaster.start()
+            subscriber = broadcaster.subscribe()
+            for seats in range(100, 0, -1):
+                broadcaster.publish([{"flight_id": 1, "economy_seats_available": seats}])
+                broadcaster.flush()
+            await broadcaster.stop()
+            return subscriber.pending
+
+        pending = asyncio.run(run())
+        assert pending == {1: {"flight_id": 1, "economy_seats_available": 1}}
+
+    def test_rollback_discards_announcement(self, db_session):
+        """Test seat counts are not broadcast for a rolled back transaction."""
+        from live_updates import announce_seats
+
+        self._add_flight_and_user(db_session)
+        flight_obj = db_session.query(Flight).first()
+        announce_seats(db_session, flight_obj)
+        db_session.rollback()
+        assert "seat_updates" not in db_session.info
+
+
+class TestBookingQueue:
+    """Test the group-commit booking queue."""
+
+    def _setup(self, db_session, economy_seats):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=economy_seats,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+
+    def _start_queue(self, db_session, **kwargs):
+        from sqlalchemy.orm import sessionmaker
+        from services.booking_queue import BookingQueue
+
+        queue = BookingQueue(**kwargs)
+        queue.start(sessionmaker(autoflush=False, bind=db_session.get_bind()))
+        return queue
+
+    def test_concurrent_bookings_never_oversell(self, db_session):
+        """Test a burst of bookings is group-committed without overselling."""
+        import metrics
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._setup(db_session, economy_seats=6)
+        metrics.reset()
+        queue = self._start_queue(db_session, max_batch=100, max_delay=0.05)
+        try:
+            with ThreadPoolExecutor(max_workers=20) as pool:
+                results = list(pool.map(lambda _: queue.book(1, "Test User", 1), range(20)))
+        finally:
+            queue.stop()
+
+        booked = [r for r in results if not isinstance(r, ErrorResponse)]
+        rejected = [r for r in results if isinstance(r, ErrorResponse)]
+        assert len(booked) == 6
+        assert {r.error_code for r in rejected} == {"NO_SEATS_AVAILABLE"}
+        assert len({b.booking_id for b in booked}) == 6
+        db_session.expire_all()
+        assert db_session.query(Flight).one().economy_seats_available == 0
+        assert db_session.query(Booking).count() == 6
+        assert metrics.snapshot()["counters"]["booking_queue.batches"] < 20
+
+    def test_batch_preserves_order_and_isolates_errors(self, db_session):
+        """Test bookings apply in submission order and a bad request doesn't fail its batch."""
+        self._setup(db_session, economy_seats=2)
+        queue = self._start_queue(db_session, max_batch=10, max_delay=0.2)
+        try:
+            futures = [
+                queue.submit(1, "Test User", 1),
+                queue.submit(1, "Wrong Name", 1),
+                queue.submit(1, "Test User", 1),
+                queue.submit(1, "Test User", 1),
+            ]
+            results = [f.result(timeout=5) for f in futures]
+        finally:
+            queue.stop()
+
+        assert results[0].booking_id == 1
+        assert results[1].error_code == "NAME_MISMATCH"
+        assert results[2].booking_id == 2
+        assert results[3].error_code == "NO_SEATS_AVAILABLE"
+
+    def _fail_for(self, monkeypatch, function_name, failing_name):
+        from sqlalchemy.exc import OperationalError
+        from services import booking_queue
+
+        original = getattr(booking_queue, function_name)
+
+        def flaky(db, user_id, name, *args):
+            if name == failing_name:
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            return original(db, user_id, name, *args)
+        monkeypatch.setattr(booking_queue, function_name, flaky)
+
+    def _submit_pair(self, db_session):
+        db_session.add(User(name="Other User", email="other@example.com"))
+        db_session.commit()
+        queue = self._start_queue(db_session, max_batch=10, max_delay=0.2)
+        try:
+            futures = [queue.submit(1, "Test User", 1), queue.submit(2, "Other User", 1)]
+            for future in futures:
+                future.exception(timeout=5)
+        finally:
+            queue.stop()
+        return futures
+
+    def test_staging_error_fails_only_its_booking(self, db_session, monkeypatch):
+        """Test an error staging one booking retries the batch individually instead of failing it."""
+        self._setup(db_session, economy_seats=2)
+        self._fail_for(monkeypatch, "stage_booking", "Other User")
+        first, second = self._submit_pair(db_session)
+
+        assert first.result().booking_id == 1
+        assert second.result().booking_id == 2
+        db_session.expire_all()
+        assert db_session.query(Booking).count() == 2
+
+    def test_individual_retry_reports_committed_bookings(self, db_session, monkeypatch):
+        """Test a booking committed by the individual retry is reported as booked."""
+        self._setup(db_session, economy_seats=2)
+        self._fail_for(monkeypatch, "stage_booking", "Other User")
+        self._fail_for(monkeypatch, "book_flight", "Other User")
+        first, second = self._submit_pair(db_session)
+
+        assert first.exception() is None
+        assert first.result().booking_id == 1
+        assert second.exception() is not None
+        db_session.expire_all()
+        assert db_session.query(Booking).count() == 1
+
+    def test_traced_booking_records_writer_sql(self, db_session):
+        """Test a traced request's booking SQL is recorded though the writer thread runs it."""
+        import profiling
+
+        self._setup(db_session, economy_seats=2)
+        queue = self._start_queue(db_session, max_batch=10, max_delay=0.2)
+        traced, other = profiling._RequestSQL(), profiling._RequestSQL()
+        try:
+            with profiling.recording(traced):
+                first = queue.submit(1, "Test User", 1)
+            with profiling.recording(other):
+                second = queue.submit(1, "Test User", 1)
+            untraced = queue.submit(1, "Test User", 1)
+            results = [f.result(timeout=5) for f in (first, second, untraced)]
+        finally:
+            queue.stop()
+
+        assert results[0].booking_id == 1
+        assert results[2].error_code == "NO_SEATS_AVAILABLE"
+        for log in (traced, other):
+            statements = [s["sql"] for s in log.statements]
+            assert any(s.startswith("SELECT") and "flights" in s for s in statements)
+            assert any(s.startswith("INSERT INTO bookings") for s in statements)
+
+
+class TestShardedInventory:
+    """Test flights, bookings and waitlists partitioned across several SQLite shards."""
+
+    @pytest.fixture
+    def sharded(self, tmp_path):
+        from sqlalchemy import create_engine
+        from db import ShardRouter
+
+        def make_engine(name):
+            return create_engine(f"sqlite:///{tmp_path / name}.db", connect_args={"check_same_thread": False})
+
+        router = ShardRouter(make_engine("global"), [make_engine(f"shard{i}") for i in range(3)])
+        for engine in router.engines.values():
+            Base.metadata.create_all(bind=engine)
+        session = router.sessionmaker()()
+        session.add(User(name="Test User", email="test@example.com"))
+        for origin, destination in [("Earth", "Mars"), ("Earth", "Moon"), ("Mars", "Earth"),
+                                    ("Venus", "Earth"), ("Jupiter", "Europa"), ("Earth", "Pluto")]:
+            session.add(Flight(
+                origin=origin,
+                destination=destination,
+                departure_time="2099-01-01T09:00:00Z",
+                arrival_time="2099-01-01T17:00:00Z",
+                base_price=1000000,
+                economy_seats_available=1,
+                business_seats_available=1,
+                galaxium_seats_available=0
+            ))
+        session.commit()
+        try:
+            yield router, session
+        finally:
+            session.close()
+            for engine in router.engines.values():
+                engine.dispose()
+
+    def test_export_merges_shards(self, sharded):
+        """Test the export watermark and rows cover every shard, in primary key order."""
+        router, session = sharded
+        flight_ids = sorted(f.flight_id for f in session.query(Flight))
+        assert len({router.shard_for_id(i) for i in flight_ids}) > 1
+
+        assert export.get_watermark(session, "flights") == flight_ids[-1]
+        chunks = list(export.iter_row_chunks(session, "flights", chunk_size=4))
+        assert [len(c) for c in chunks] == [4, 2]
+        assert [row[0] for chunk in chunks for row in chunk] == flight_ids
+        assert export.get_watermark(session, "users") == 1
+
+    def _rows(self, engine, table):
+        from sqlalchemy import text
+
+        with engine.connect() as conn:
+            return conn.execute(text(f"SELECT * FROM {table}")).mappings().all()
+
+    def test_rows_are_placed_by_flight(self, sharded):
+        """Test flights spread over the shards and users stay in the global database."""
+        router, session = sharded
+        assert len(self._rows(router.global_engine, "users")) == 1
+        placed = {}
+        for shard_id in router.shard_ids:
+            for row in self._rows(router.engines[shard_id], "flights"):
+                assert router.shard_for_id(row["flight_id"]) == shard_id
+                assert router.shard_for_route(row["origin"], row["destination"]) == shard_id
+                placed[row["flight_id"]] = shard_id
+            assert self._rows(router.engines[shard_id], "users") == []
+        assert len(placed) == 6
+        assert len(set(placed.values())) > 1
+
+    def test_list_flights_gathers_all_shards(self, sharded):
+        """Test list_flights returns every shard's flights in id order."""
+        _, session = sharded
+        flight_ids = [f.flight_id for f in flight.list_flights(session)]
+        assert len(flight_ids) == 6
+        assert flight_ids == sorted(flight_ids)
+
+    def test_book_and_cancel_on_flight_shard(self, sharded):
+        """Test bookings land on their flight's shard and are found by booking_id alone."""
+        router, session = sharded
+        flights = flight.list_flights(session)
+        results = [booking.book_flight(session, 1, "Test User", f.flight_id) for f in flights]
+        assert all(not isinstance(r, ErrorResponse) for r in results)
+        assert len({r.booking_id for r in results}) == len(results)
+
+        for result in results:
+            shard_id = router.shard_for_id(result.flight_id)
+            assert router.shard_for_id(result.booking_id) == shard_id
+            assert result.booking_id in [r["booking_id"] for r in self._rows(router.engines[shard_id], "bookings")]
+
+        sold_out = booking.book_flight(session, 1, "Test User", flights[0].flight_id)
+        assert sold_out.error_code == "NO_SEATS_AVAILABLE"
+
+        cancelled = booking.cancel_booking(session, results[0].booking_id)
+        assert cancelled.status == "cancelled"
+        rows = self._rows(router.engines[router.shard_for_id(flights[0].flight_id)], "flights")
+        assert {r["flight_id"]: r["economy_seats_available"] for r in rows}[flights[0].flight_id] == 1
+
+        user_bookings = booking.get_bookings(session, 1)
+        assert [b.booking_id for b in user_bookings] == sorted(r.booking_id for r in results)
+
+    def test_change_booking_within_shard(self, sharded):
+        """Test a booking can change class on its shard but not move to another shard's flight."""
+        router, session = sharded
+        flights = flight.list_flights(session)
+        original = booking.book_flight(session, 1, "Test User", flights[0].flight_id)
+
+        changed = booking.change_booking(session, original.booking_id, seat_class="business")
+        assert changed.seat_class == "business"
+        rows = self._rows(router.engines[router.shard_for_id(original.flight_id)], "booking_changes")
+        assert [r["booking_id"] for r in rows] == [original.booking_id]
+
+        elsewhere = next(f for f in flights if router.shard_for_id(f.flight_id) != router.shard_for_id(original.flight_id))
+        result = booking.change_booking(session, original.booking_id, elsewhere.flight_id)
+        assert result.error_code == "CROSS_SHARD_CHANGE"
+
+    def test_schedule_import_places_flights_by_route(self, sharded):
+        """Test imported flights land on their route's shard and re-imports find them there."""
+        import io
+        from services import schedule
+
+        router, session = sharded
+        text = "origin,destination,departure_time,arrival_time,base_price,total_seats\n" + "".join(
+            f"{origin},{destination},2099-02-01T09:00:00Z,2099-02-01T17:00:00Z,{price},10\n"
+            for origin, destination in [("Earth", "Mars"), ("Venus", "Earth"), ("Jupiter", "Europa")]
+            for price in (1000,)
+        )
+        result = schedule.import_schedule(session, schedule.read_schedule(io.StringIO(text)))
+        assert result.created == 3
+        for shard_id in router.shard_ids:
+            for row in self._rows(router.engines[shard_id], "flights"):
+                assert router.shard_for_id(row["flight_id"]) == shard_id
+                assert router.shard_for_route(row["origin"], row["destination"]) == shard_id
+
+        result = schedule.import_schedule(session, schedule.read_schedule(io.StringIO(text.replace(",1000,", ",1500,"))))
+        assert (result.created, result.updated) == (0, 3)
+        assert sorted(f.base_price for f in flight.list_flights(session) if f.departure_time.startswith("2099-02")) == [1500] * 3
+
+    def test_waitlist_promotion_on_shard(self, sharded):
+        """Test a cancellation promotes the waitlist entry stored on the same shard."""
+        _, session = sharded
+        flight_id = flight.list_flights(session)[-1].flight_id
+        session.add(User(name="Second User", email="second@example.com"))
+        session.commit()
+
+        first = booking.book_flight(session, 1, "Test User", flight_id)
+        entry = waitlist.join_waitlist(session, 2, "Second User", flight_id)
+        assert entry.position == 1
+
+        booking.cancel_booking(session, first.booking_id)
+        promoted = waitlist.get_waitlist_entry(session, entry.waitlist_id)
+        assert promoted.status == "promoted"
+        assert [b.booking_id for b in booking.get_bookings(session, 2)] == [promoted.booking_id]
+
+
+class TestReadReplicas:
+    """Test read replicas refreshed from the primary with the SQLite backup API."""
+
+    @pytest.fixture
+    def replica_set(self, tmp_path):
+        from sqlalchemy import create_engine
+        from db import ReplicaSet
+
+        def make_engine(name):
+            return create_engine(f"sqlite:///{tmp_path / name}.db", connect_args={"check_same_thread": False})
+
+        primary = make_engine("primary")
+        Base.metadata.create_all(bind=primary)
+        replicas = ReplicaSet(primary, [make_engine("replica0"), make_engine("replica1")], interval=60)
+        session = replicas.PrimarySession()
+        session.add(User(name="Test User", email="test@example.com"))
+        session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=5,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        session.commit()
+        replicas.start()
+        try:
+            yield replicas, session
+        finally:
+            replicas.stop()
+            session.close()
+
+    def test_replicas_serve_copy_of_primary(self, replica_set):
+        """Test replicas hold the primary's data and only pick up changes on refresh."""
+        replicas, session = replica_set
+        for _ in replicas.replicas:
+            with replicas.session() as read_db:
+                assert [f.economy_seats_available for f in flight.list_flights(read_db)] == [5]
+
+        booking.book_flight(session, 1, "Test User", 1)
+        with replicas.session() as read_db:
+            assert flight.list_flights(read_db)[0].economy_seats_available == 5
+
+        assert replicas.refresh() is True
+        assert replicas.refresh() is False  # Unchanged primary is not copied again
+        with replicas.session() as read_db:
+            assert flight.list_flights(read_db)[0].economy_seats_available == 4
+        assert replicas.status()["refreshes"] == [2, 2]
+
+    def test_reads_your_own_writes(self, replica_set):
+        """Test a user's reads go to the primary until their booking reaches the replicas."""
+        replicas, session = replica_set
+        assert not replicas.has_unsynced_write("user:1")
+
+        booked = booking.book_flight(session, 1, "Test User", 1)
+        assert replicas.has_unsynced_write("user:1")
+        with replicas.session("user:1") as read_db:
+            assert read_db.get_bind() is replicas.primary
+            assert [b.booking_id for b in booking.get_bookings(read_db, 1)] == [booked.booking_id]
+        with replicas.session("user:2") as read_db:
+            assert read_db.get_bind() is not replicas.primary
+
+        replicas.refresh()
+        assert not replicas.has_unsynced_write("user:1")
+        with replicas.session("user:1") as read_db:
+            assert read_db.get_bind() is not replicas.primary
+            assert [b.booking_id for b in booking.get_bookings(read_db, 1)] == [booked.booking_id]
+
+    def test_registration_is_tracked_by_email(self, replica_set):
+        """Test a newly registered user is looked up on the primary by email."""
+        replicas, session = replica_set
+        user.register_user(session, "New User", "new@example.com")
+        assert replicas.has_unsynced_write("email:new@example.com")
+        with replicas.session("email:new@example.com") as read_db:
+            assert user.get_user(read_db, "New User", "new@example.com").user_id == 2
+
+    def test_mixed_case_email_lookup_reads_own_write(self, replica_set, monkeypatch):
+        """Test a lookup with the email in another case still goes to the primary."""
+        import db as db_module
+        from starlette.requests import Request
+
+        replicas, session = replica_set
+        monkeypatch.setattr(db_module, "replicas", replicas)
+        user.register_user(session, "New User", "New@Example.com")
+
+        request = Request({"type": "http", "path_params": {}, "query_string": b"name=New+User&email=NEW@example.com"})
+        dependency = db_module.get_read_db(request)
+        read_db = next(dependency)
+        assert read_db.get_bind() is replicas.primary
+        assert user.get_user(read_db, "New User", "NEW@example.com").user_id == 2
+        dependency.close()
+
+
+class TestInventorySnapshot:
+    """Test the array-backed flight inventory snapshot."""
+
+    def _add_flights(self, db_session):
+        for origin, destination, departure, seats in [
+            ("Earth", "Mars", "2099-01-03T09:00:00Z", 5),
+            ("Earth", "Mars", "2099-01-01T09:00:00Z", 0),
+            ("Earth", "Moon", "2099-01-02T09:00:00Z", 5),
+            ("Mars", "Earth", "2099-01-01T12:00:00Z", 5),
+        ]:
+            db_session.add(Flight(
+                origin=origin,
+                destination=destination,
+                departure_time=departure,
+                arrival_time=departure.replace("09:00", "17:00"),
+                base_price=1000000,
+                economy_seats_available=seats,
+                business_seats_available=1,
+                galaxium_seats_available=0
+            ))
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+
+    def test_search_by_route_and_date(self, db_session):
+        """Test route, departure window and seat class filters, ordered by departure."""
+        self._add_flights(db_session)
+
+        result = flight.search_flights(db_session, origin="Earth", destination="Mars")
+        assert [f.flight_id for f in result] == [2, 1]
+        assert result[1].business_price == 2500000
+        assert result[1].departure_time == "2099-01-03T09:00:00Z"
+
+        result = flight.search_flights(db_session, origin="Earth", departs_before="2099-01-02")
+        assert [f.flight_id for f in result] == [2, 3]
+        result = flight.search_flights(db_session, departs_after="2099-01-01T10:00:00Z", limit=2)
+        assert [f.flight_id for f in result] == [4, 3]
+        result = flight.search_flights(db_session, destination="Mars", seat_class="economy")
+        assert [f.flight_id for f in result] == [1]
+        assert flight.search_flights(db_session, origin="Pluto") == []
+
+        assert flight.search_flights(db_session, seat_class="first").error_code == "INVALID_SEAT_CLASS"
+        assert flight.search_flights(db_session, departs_after="soon").error_code == "INVALID_DATE"
+
+    def test_booking_updates_snapshot_copy_on_write(self, db_session):
+        """Test a committed booking swaps in a new snapshot without reloading or touching the old one."""
+        from inventory import inventory
+
+        self._add_flights(db_session)
+        before = inventory.get(db_session)
+        loads = inventory.loads
+
+        booking.book_flight(db_session, 1, "Test User", 1)
+
+        after = inventory.current
+        assert after is not before
+        assert after.version == before.version + 1
+        assert inventory.loads == loads
+        assert before.seats_available(before.position(1), "economy") == 5
+        assert after.seats_available(after.position(1), "economy") == 4
+        assert after.flight_ids is before.flight_ids
+
+    def test_new_flight_reloads_snapshot(self, db_session):
+        """Test adding a flight drops the snapshot so the next search sees it."""
+        from inventory import inventory
+
+        self._add_flights(db_session)
+        assert len(inventory.get(db_session)) == 4
+        db_session.add(Flight(
+            origin="Venus",
+            destination="Earth",
+            departure_time="2099-02-01T09:00:00Z",
+            arrival_time="2099-02-01T17:00:00Z",
+            base_price=500000,
+            economy_seats_available=3,
+            business_seats_available=0,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+
+        assert inventory.current is None
+        assert [f.flight_id for f in flight.search_flights(db_session, origin="Venus")] == [5]
+
+    def test_core_update_seen_after_max_age(self, db_session, monkeypatch):
+        """Test a Core UPDATE the ORM hooks miss shows up once the snapshot reaches its max age."""
+        import inventory as inventory_module
+        from sqlalchemy import update
+        from inventory import inventory
+
+        self._add_flights(db_session)
+        monkeypatch.setattr(inventory, "max_age", 60)
+        assert flight.search_flights(db_session, origin="Earth", destination="Moon")[0].base_price == 1000000
+        with db_session.get_bind().begin() as conn:
+            conn.execute(update(Flight.__table__).where(Flight.__table__.c.flight_id == 3).values(base_price=900000))
+        assert flight.search_flights(db_session, origin="Earth", destination="Moon")[0].base_price == 1000000
+
+        now = inventory_module.time.monotonic()
+        monkeypatch.setattr(inventory_module.time, "monotonic", lambda: now + 61)
+        assert flight.search_flights(db_session, origin="Earth", destination="Moon")[0].base_price == 900000
+
+    def test_update_copies_only_touched_pages(self):
+        """Test copy-on-write shares every seat page except the updated one."""
+        from inventory import PAGE_SIZE, InventorySnapshot
+
+        rows = [
+            (i, "Earth", "Mars", "2099-01-01T09:00:00Z", "2099-01-01T17:00:00Z", 100, 6, 3, 1)
+            for i in range(1, 3 * PAGE_SIZE)
+        ]
+        snapshot = InventorySnapshot.build(rows)
+        updated = snapshot.with_seats([{
+            "flight_id": PAGE_SIZE + 10,
+            "economy_seats_available": 5,
+            "business_seats_available": 3,
+            "galaxium_seats_available": 1,
+        }])
+
+        pages = updated.seats["economy"]
+        assert pages[0] is snapshot.seats["economy"][0]
+        assert pages[2] is snapshot.seats["economy"][2]
+        assert pages[1] is not snapshot.seats["economy"][1]
+        assert updated.seats_available(updated.position(PAGE_SIZE + 10), "economy") == 5
+        assert snapshot.seats_available(snapshot.position(PAGE_SIZE + 10), "economy") == 6
+        assert snapshot.with_seats([{"flight_id": 10 ** 9}]) is None
+
+
+class TestAdmissionLimiters:
+    """Test the token buckets and write concurrency limit used for admission control."""
+
+    def test_token_bucket_per_client(self):
+        """Test each client gets its own burst and refill rate."""
+        from admission import RateLimiter
+
+        limiter = RateLimiter(rate=10, burst=3)
+        assert [limiter.check("key:abuser") for _ in range(3)] == [0, 0, 0]
+        retry_after = limiter.check("key:abuser")
+        assert 0 < retry_after <= 0.1
+        assert limiter.check("key:other") == 0
+
+    def test_concurrency_limit_queues_then_sheds(self):
+        """Test writers beyond the limit queue, and fail fast when the queue is full or times out."""
+        import threading
+        import metrics
+        from admission import ConcurrencyLimiter
+
+        metrics.reset()
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, timeout=5)
+        assert limiter.acquire()
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        waiter.start()
+        while limiter.queued == 0:
+            pass
+        assert not limiter.acquire()  # Queue full: rejected immediately
+
+        limiter.release()  # Hands the slot straight to the queued writer
+        waiter.join()
+        assert results == [True]
+        assert limiter.in_flight == 1
+
+        limiter.timeout = 0.05
+        assert not limiter.acquire()  # Waited in the queue too long
+        limiter.release()
+        assert limiter.in_flight == 0
+        counters = metrics.snapshot()["counters"]
+        assert counters["admission.shed"] == 1
+        assert counters["admission.timed_out"] == 1
+
+
+class TestDeadlines:
+    """Test request deadlines cutting SQLite lock waits and long statements short."""
+
+    def test_budget_precedence(self, monkeypatch):
+        """Test the caller's timeout wins (up to the cap), then the per-operation setting, then the default."""
+        import config
+        from deadlines import budget
+
+        monkeypatch.setattr(config, "DEADLINE_MS", 0)
+        monkeypatch.setattr(config, "DEADLINES", {"POST /book": 2000})
+        monkeypatch.setattr(config, "MAX_DEADLINE_MS", 10000)
+        assert budget("GET /flights") is None
+        assert budget("POST /book") == 2.0
+        assert budget("POST /book", 500) == 0.5
+        assert budget("GET /flights", 60000) == 10.0
+        monkeypatch.setattr(config, "DEADLINE_MS", 3000)
+        assert budget("GET /flights") == 3.0
+
+    def test_lock_contention_fails_at_deadline(self, tmp_path):
+        """Test a booking stuck behind another writer's lock gives up at its deadline, not after the busy timeout."""
+        import sqlite3
+        import time
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        import config
+        import deadlines
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'locked.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        session.add(User(name="Test User", email="test@example.com"))
+        session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-01T09:00:00Z",
+            arrival_time="2099-01-01T17:00:00Z",
+            base_price=1000000,
+            economy_seats_available=5,
+            business_seats_available=1,
+            galaxium_seats_available=0
+        ))
+        session.commit()
+
+        blocker = sqlite3.connect(tmp_path / "locked.db", isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")  # Another writer holds the write lock
+        try:
+            started = time.monotonic()
+            with deadlines.deadline("book_flight", 200):
+                with pytest.raises(deadlines.DeadlineExceeded):
+                    booking.book_flight(session, 1, "Test User", 1)
+            elapsed = time.monotonic() - started
+            session.rollback()
+            assert 0.15 <= elapsed < 1.5
+        finally:
+            blocker.rollback()
+            blocker.close()
+
+        result = booking.book_flight(session, 1, "Test User", 1)
+        assert result.status == "booked"
+        assert session.get(Flight, 1).economy_seats_available == 4
+        assert session.execute(text("PRAGMA busy_timeout")).scalar() == config.DB_BUSY_TIMEOUT_MS
+        session.close()
+        engine.dispose()
+
+    def test_long_statement_interrupted(self, db_session):
+        """Test a statement still running at the deadline is interrupted, and the connection recovers."""
+        import time
+        from sqlalchemy import text
+        import deadlines
+
+        count_up = text(
+            "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) SELECT count(*) FROM c"
+        )
+        started = time.monotonic()
+        with deadlines.deadline("test", 100):
+            with pytest.raises(deadlines.DeadlineExceeded):
+                db_session.execute(count_up, {"n": 10 ** 9})
+        assert time.monotonic() - started < 1.0
+        db_session.rollback()
+        assert db_session.execute(count_up, {"n": 1000}).scalar() == 1000
+
+
+class TestProfiling:
+    """Test the sampling profiler and tracemalloc diff behind the admin endpoints."""
+
+    def test_sample_stacks_finds_busy_function(self):
+        """Test a thread spinning in a function shows up in the collapsed stacks."""
+        import threading
+        import profiling
+
+        stop = threading.Event()
+
+        def spin_for_profile():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=spin_for_profile, name="spinner")
+        thread.start()
+        try:
+            counts = profiling.sample_stacks(0.3, 0.005)
+        finally:
+            stop.set()
+            thread.join()
+        spinner = [stack for stack in counts if stack.startswith("spinner;")]
+        assert spinner
+        assert all("spin_for_profile (test_services.py:" in stack for stack in spinner)
+        assert profiling.collapsed_stacks(counts).endswith("\n")
+
+    def test_memory_diff_reports_growth(self):
+        """Test allocations made during the diff window are attributed to their line, and runs don't overlap."""
+        import threading
+        import tracemalloc
+        import profiling
+
+        kept = []
+        timer = threading.Timer(0.05, lambda: kept.append([object() for _ in range(20000)]))
+        timer.start()
+        result = profiling.memory_diff(0.3, limit=10)
+        timer.join()
+        assert not tracemalloc.is_tracing()
+        top = result["top"][0]
+        assert "test_services.py:" in top["location"][0]
+        assert top["count_diff"] >= 20000
+
+        assert profiling._busy.acquire(blocking=False)
+        try:
+            assert profiling.memory_diff(0.01) is None
+            assert profiling.sample_stacks(0.01, 0.005) is None
+        finally:
+            profiling._busy.release()
+
+
+class TestArchiveService:
+    """Test moving finished bookings to the archive table."""
+
+    def _add_bookings(self, db_session):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        for departure in ("2000-01-01T09:00:00Z", "2099-01-01T09:00:00Z"):
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time=departure,
+                arrival_time=departure.replace("09:", "17:"),
+                base_price=1000000,
+                economy_seats_available=6,
+                business_seats_available=3,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+        for flight_id, status, booked in [
+            (1, "completed", "1999-12-01T00:00:00"),  # Departed: archived
+            (1, "cancelled", "1999-12-01T00:00:00"),  # Departed: archived
+            (2, "booked", "2098-12-01T00:00:00"),     # Upcoming: kept
+            (2, "cancelled", "2000-01-01T00:00:00"),  # Old cancellation: archived
+            (2, "cancelled", "2098-12-01T00:00:00"),  # Recent cancellation: kept
+        ]:
+            db_session.add(Booking(user_id=1, flight_id=flight_id, status=status, booking_time=booked, price_paid=1000000))
+        db_session.commit()
+
+    def test_archives_finished_bookings(self, db_session):
+        """Test departed and old cancelled bookings move to the archive and active ones stay."""
+        from models import BookingArchive
+        from services import archive
+
+        self._add_bookings(db_session)
+        result = archive.archive_bookings(db_session, cancelled_before="2098-01-01T00:00:00", chunk_size=2)
+
+        assert result.archived == 3
+        assert result.chunks == 2
+        assert sorted(b.booking_id for b in db_session.query(Booking)) == [3, 5]
+        archived = db_session.query(BookingArchive).order_by(BookingArchive.booking_id).all()
+        assert [(b.booking_id, b.status) for b in archived] == [(1, "completed"), (2, "cancelled"), (4, "cancelled")]
+        assert all(b.archived_at for b in archived)
+
+        # Nothing left to do on a second run
+        assert archive.archive_bookings(db_session, cancelled_before="2098-01-01T00:00:00").archived == 0
+
+    def test_get_bookings_with_history(self, db_session):
+        """Test archived bookings are only returned when history is requested."""
+        from services import archive
+
+        self._add_bookings(db_session)
+        archive.archive_bookings(db_session, cancelled_before="2098-01-01T00:00:00")
+
+        assert [b.booking_id for b in booking.get_bookings(db_session, 1)] == [3, 5]
+        history = booking.get_bookings(db_session, 1, include_history=True)
+        assert [b.booking_id for b in history] == [1, 2, 3, 4, 5]
+        assert history[0].status == "completed"
+
+    def test_reseed_clears_archive(self, db_session, monkeypatch):
+        """Test reseeding leaves no archived bookings behind to attach to the new flights."""
+        import seed
+        from models import BookingArchive
+        from services import archive, reconcile
+
+        self._add_bookings(db_session)
+        archive.archive_bookings(db_session, cancelled_before="2098-01-01T00:00:00")
+        monkeypatch.setattr(seed, "init_db", lambda: None)
+        monkeypatch.setattr(seed, "SessionLocal", lambda: db_session)
+        seed.seed()
+
+        assert db_session.query(BookingArchive).count() == 0
+        assert reconcile.reconcile_seats(db_session).drift == []
+
+
+class TestBookingLifecycle:
+    """Test the job marking bookings of landed flights completed."""
+
+    def _add_flight(self, db_session, arrival):
+        flight_row = Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time=arrival.replace("17:", "09:"),
+            arrival_time=arrival,
+            base_price=1000000,
+            economy_seats_available=60,
+            business_seats_available=30,
+            galaxium_seats_available=10
+        )
+        db_session.add(flight_row)
+        db_session.commit()
+        return flight_row.flight_id
+
+    def test_completes_landed_bookings(self, db_session):
+        """Test only booked bookings of flights that have landed become completed."""
+        from services import lifecycle
+
+        db_session.add(User(name="Test User", email="test@example.com"))
+        landed = [self._add_flight(db_session, f"2000-01-0{day}T17:00:00Z") for day in range(1, 6)]
+        upcoming = self._add_flight(db_session, "2099-01-01T17:00:00Z")
+        for flight_id in landed + [upcoming]:
+            for status in ("booked", "cancelled"):
+                db_session.add(Booking(user_id=1, flight_id=flight_id, status=status, booking_time="1999-12-01T00:00:00", price_paid=1000000))
+        db_session.commit()
+
+        result = lifecycle.complete_landed_bookings(db_session, chunk_size=2)
+        assert result.completed == 5
+        assert result.chunks == 3
+        assert lifecycle.progress["cursor"] == "2000-01-05T17:00:00Z"
+        statuses = {(b.flight_id, b.status) for b in db_session.query(Booking)}
+        assert statuses == {(f, "completed") for f in landed} | {(f, "cancelled") for f in landed + [upcoming]} | {(upcoming, "booked")}
+
+        # Re-running finds nothing left to complete
+        assert lifecycle.complete_landed_bookings(db_session).completed == 0
+
+    def test_bookings_not_blocked_by_run(self, tmp_path):
+        """Test bookings made during a large run only wait for one chunk at a time."""
+        import threading
+        import time
+        from sqlalchemy import create_engine, insert
+        from sqlalchemy.orm import sessionmaker
+        from services import lifecycle
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'lifecycle.db'}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        flights = 2000
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+            conn.execute(insert(User), [{"name": "Test User", "email": "test@example.com"}])
+            conn.execute(insert(Flight), [{
+                "origin": "Earth",
+                "destination": "Mars",
+                "departure_time": "2000-01-01T09:00:00Z" if i < flights else "2099-01-01T09:00:00Z",
+                "arrival_time": "2000-01-01T17:00:00Z" if i < flights else "2099-01-01T17:00:00Z",
+                "base_price": 1000000,
+                "economy_seats_available": 10 ** 6,
+                "business_seats_available": 0,
+                "galaxium_seats_available": 0,
+            } for i in range(flights + 1)])
+            conn.execute(insert(Booking), [{
+                "user_id": 1,
+                "flight_id": i % flights + 1,
+                "status": "booked",
+                "booking_time": "1999-12-01T00:00:00",
+                "seat_class": "economy",
+                "price_paid": 1000000,
+            } for i in range(100000)])
+        Session = sessionmaker(bind=engine)
+
+        job = Session()
+        runner = threading.Thread(target=lambda: lifecycle.complete_landed_bookings(job, chunk_size=100))
+        runner.start()
+        latencies = []
+        with Session() as db:
+            while runner.is_alive():
+                started = time.perf_counter()
+                result = booking.book_flight(db, 1, "Test User", flights + 1)
+                latencies.append(time.perf_counter() - started)
+                assert not isinstance(result, ErrorResponse)
+        runner.join()
+        job.close()
+
+        assert lifecycle.progress["completed"] == 100000
+        assert latencies and max(latencies) < 1.0
+
+
+class TestSeatReconciliation:
+    """Test checking and repairing seat counters against bookings."""
+
+    def _setup(self, db_session, flights=3):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        for _ in range(flights):
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time="2099-01-01T09:00:00Z",
+                arrival_time="2099-01-01T17:00:00Z",
+                base_price=1000000,
+                economy_seats_available=6,
+                business_seats_available=3,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+
+    def test_consistent_counters(self, db_session):
+        """Test bookings and cancellations through the services leave no drift."""
+        from services import reconcile
+
+        self._setup(db_session)
+        assert db_session.get(Flight, 1).economy_seats_total == 6
+        first = booking.book_flight(db_session, 1, "Test User", 1)
+        booking.book_flight(db_session, 1, "Test User", 2, "business")
+        booking.cancel_booking(db_session, first.booking_id)
+
+        result = reconcile.reconcile_seats(db_session, batch_size=2)
+        assert result.flights_checked == 3
+        assert result.drift == []
+
+    def test_reports_and_repairs_drift(self, db_session):
+        """Test a wrong counter is reported and repaired, and unmatched bookings are reported."""
+        from services import reconcile
+
+        self._setup(db_session)
+        booking.book_flight(db_session, 1, "Test User", 2, "galaxium")
+        db_session.get(Flight, 1).economy_seats_available = 2  # Lost 4 seats
+        db_session.add(Booking(user_id=1, flight_id=99, status="booked", booking_time="2099-01-01T00:00:00", price_paid=1))
+        db_session.add(Booking(user_id=1, flight_id=3, status="booked", booking_time="2099-01-01T00:00:00", seat_class="steerage", price_paid=1))
+        db_session.commit()
+
+        result = reconcile.reconcile_seats(db_session, batch_size=2)
+        assert [(d.flight_id, d.seat_class, d.seats_available, d.expected_available) for d in result.drift] == [
+            (1, "economy", 2, 6),
+            (3, "steerage", None, None),
+            (99, "economy", None, None),
+        ]
+        assert result.repaired == 0
+        assert db_session.get(Flight, 1).economy_seats_available == 2
+
+        result = reconcile.reconcile_seats(db_session, repair=True)
+        assert result.repaired == 1
+        db_session.expire_all()
+        assert db_session.get(Flight, 1).economy_seats_available == 6
+        assert db_session.get(Flight, 2).galaxium_seats_available == 0
+        assert len(reconcile.reconcile_seats(db_session).drift) == 2  # Unmatched bookings are never "repaired"
+
+    def test_backfills_missing_capacity(self, db_session):
+        """Test flights without capacity are reported unchecked, and backfilled only when repairing."""
+        from sqlalchemy import update
+        from services import reconcile
+
+        self._setup(db_session, flights=1)
+        booking.book_flight(db_session, 1, "Test User", 1)
+        db_session.execute(update(Flight).values(economy_seats_total=None, business_seats_total=None, galaxium_seats_total=None))
+        db_session.commit()
+
+        result = reconcile.reconcile_seats(db_session)
+        assert (result.flights_checked, result.capacity_unchecked, result.capacity_backfilled) == (0, 1, 0)
+        db_session.expire_all()
+        assert db_session.get(Flight, 1).economy_seats_total is None
+
+        result = reconcile.reconcile_seats(db_session, repair=True)
+        assert (result.capacity_unchecked, result.capacity_backfilled) == (1, 1)
+        assert result.drift == []
+        db_session.expire_all()
+        flight_row = db_session.get(Flight, 1)
+        assert (flight_row.economy_seats_total, flight_row.business_seats_total, flight_row.galaxium_seats_total) == (6, 3, 1)
+        assert reconcile.reconcile_seats(db_session).flights_checked == 1
+
+    def test_booking_between_reads_is_not_drift(self, db_session, monkeypatch):
+        """Test a booking committed between reading counters and held seats is not reported."""
+        from services import reconcile
+
+        self._setup(db_session)
+        booking.book_flight(db_session, 1, "Test User", 1)
+        booking.book_flight(db_session, 1, "Test User", 2, "business")
+        # Held seats as read before the bookings committed
+        monkeypatch.setattr(reconcile, "_held_counts", lambda db, low, high: {})
+
+        result = reconcile.reconcile_seats(db_session)
+        assert result.flights_checked == 3
+        assert result.drift == []
+
+
+class TestBookingEventLog:
+    """Test the batched booking event log, its replay and compaction."""
+
+    @pytest.fixture
+    def logged_session(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from event_log import event_log
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+        Base.metadata.create_all(bind=engine)
+        event_log.start(engine)
+        session = sessionmaker(bind=engine)()
+        session.add(User(name="Test User", email="test@example.com"))
+        for arrival in ("2000-01-01T17:00:00Z", "2099-01-01T17:00:00Z"):
+            session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time=arrival.replace("17:", "09:"),
+                arrival_time=arrival,
+                base_price=1000,
+                economy_seats_available=6,
+                business_seats_available=3,
+                galaxium_seats_available=1
+            ))
+        session.commit()
+        try:
+            yield session
+        finally:
+            session.close()
+            event_log.stop()
+
+    def test_events_logged_after_commit(self, logged_session):
+        """Test claims, releases and completions are logged in order, and rolled back changes are not."""
+        from event_log import event_log
+        from models import BookingEvent
+        from services import lifecycle
+
+        first = booking.book_flight(logged_session, 1, "Test User", 1)
+        second = booking.book_flight(logged_session, 1, "Test User", 2, "business")
+        booking.cancel_booking(logged_session, second.booking_id)
+        logged_session.add(Booking(user_id=1, flight_id=2, status="booked", booking_time="2099-01-01T00:00:00", price_paid=1))
+        logged_session.flush()
+        logged_session.rollback()
+        lifecycle.complete_landed_bookings(logged_session)
+        event_log.flush()
+
+        logged = [(e.seq, e.kind, e.booking_id, e.status) for e in logged_session.query(BookingEvent).order_by(BookingEvent.seq)]
+        assert logged == [
+            (1, "booked", first.booking_id, "booked"),
+            (2, "booked", second.booking_id, "booked"),
+            (3, "cancelled", second.booking_id, "cancelled"),
+            (4, "status", first.booking_id, "completed"),
+        ]
+
+    def test_change_logged_as_release_and_claim(self, logged_session):
+        """Test a booking change replays as a release on the old flight and a claim on the new one."""
+        from event_log import event_log
+        from services import events
+
+        original = booking.book_flight(logged_session, 1, "Test User", 2)
+        booking.change_booking(logged_session, original.booking_id, seat_class="business")
+        event_log.flush()
+
+        totals = {(a.flight_id, a.seat_class): (a.seats_held, a.claims, a.releases, a.revenue)
+                  for a in events.replay_events(logged_session).flights}
+        assert totals == {(2, "economy"): (0, 1, 1, 0), (2, "business"): (1, 1, 0, 2500)}
+
+    def test_replay_and_compaction(self, logged_session, tmp_path):
+        """Test replay rebuilds seat counters, and compaction keeps its result while shrinking the log."""
+        import gzip
+        from event_log import event_log
+        from models import BookingEvent
+        from services import events
+
+        for seat_class in ("economy", "economy", "galaxium"):
+            booking.book_flight(logged_session, 1, "Test User", 2, seat_class)
+        booking.cancel_booking(logged_session, 1)
+        event_log.flush()
+
+        replayed = events.replay_events(logged_session)
+        assert replayed.events == 4
+        totals = {(a.flight_id, a.seat_class): (a.seats_held, a.claims, a.releases, a.revenue) for a in replayed.flights}
+        assert totals == {(2, "economy"): (1, 2, 1, 1000), (2, "galaxium"): (1, 1, 0, 5000)}
+
+        output = tmp_path / "events.ndjson.gz"
+        result = events.compact_events(logged_session, before="2999-01-01", output=str(output), chunk_size=3)
+        assert (result.compacted, result.through_seq) == (4, 4)
+        assert logged_session.query(BookingEvent).count() == 0
+        assert len(gzip.open(output, "rt").readlines()) == 4
+        assert events.replay_events(logged_session).flights == replayed.flights
+
+        flight_row = logged_session.get(Flight, 2)
+        flight_row.economy_seats_available = 0
+        logged_session.commit()
+        assert events.replay_events(logged_session, apply_seats=True).counters_updated == 1
+        assert logged_session.get(Flight, 2).economy_seats_available == 5
+
+    def test_compaction_stops_at_newer_event(self, logged_session):
+        """Test an event with a lower seq but a later recorded_at is not deleted unfolded."""
+        from event_log import event_log
+        from models import BookingEvent
+        from services import events
+
+        booking.book_flight(logged_session, 1, "Test User", 2)
+        booking.book_flight(logged_session, 1, "Test User", 2)
+        event_log.flush()
+        logged_session.query(BookingEvent).filter(BookingEvent.seq == 1).update({"recorded_at": "2000-01-02T00:00:00"})
+        logged_session.query(BookingEvent).filter(BookingEvent.seq == 2).update({"recorded_at": "2000-01-01T00:00:00"})
+        logged_session.commit()
+        replayed = events.replay_events(logged_session).flights
+
+        result = events.compact_events(logged_session, before="2000-01-01T12:00:00")
+        assert result.compacted == 0
+        assert logged_session.query(BookingEvent).count() == 2
+        assert events.replay_events(logged_session).flights == replayed
+
+        result = events.compact_events(logged_session, before="2000-01-03T00:00:00")
+        assert (result.compacted, result.through_seq) == (2, 2)
+        assert events.replay_events(logged_session).flights == replayed
+
+    def test_baseline_from_existing_bookings(self, db_session):
+        """Test enabling the log on a database with bookings starts from a checkpoint of them."""
+        from services import events
+
+        db_session.add(Booking(user_id=1, flight_id=1, status="booked", booking_time="2099-01-01T00:00:00", price_paid=10))
+        db_session.add(Booking(user_id=1, flight_id=1, status="cancelled", booking_time="2099-01-01T00:00:00", price_paid=10))
+        db_session.commit()
+
+        assert events.ensure_baseline(db_session) == 1
+        activity = events.replay_events(db_session).flights
+        assert [(a.seats_held, a.claims, a.releases, a.revenue) for a in activity] == [(1, 2, 1, 10)]
+        assert events.ensure_baseline(db_session) == 0
+
+
+class TestBookingsWithFlights:
+    """Test bookings enriched with their flights' details."""
+
+    @pytest.mark.parametrize("count", [1, 5, 20])
+    def test_single_query(self, db_session, count):
+        """Test bookings and flights are read in one query, however many bookings there are."""
+        from sqlalchemy import event
+
+        db_session.add(User(name="Test User", email="test@example.com"))
+        for i in range(count):
+            db_session.add(Flight(
+                origin="Earth",
+                destination=f"Moon {i}",
+                departure_time="2099-01-01T09:00:00Z",
+                arrival_time="2099-01-01T17:00:00Z",
+                base_price=1000,
+                economy_seats_available=6,
+                business_seats_available=3,
+                galaxium_seats_available=1
+            ))
+        db_session.commit()
+        for i in range(count):
+            db_session.add(Booking(user_id=1, flight_id=i + 1, status="booked", booking_time="2099-01-01T00:00:00", price_paid=1000))
+        db_session.commit()
+        db_session.expire_all()
+
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            result = booking.get_bookings_with_flights(db_session, 1)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert len(statements) == 1
+        assert [b.flight.destination for b in result] == [f"Moon {i}" for i in range(count)]
+        assert result[0].flight.business_price == 2500
+
+
+class TestBookingChange:
+    """Test moving a booking to another flight or seat class."""
+
+    def _setup(self, db_session, economy=6, business=3):
+        db_session.add(User(name="Test User", email="test@example.com"))
+        for base_price in (1000, 2000):
+            db_session.add(Flight(
+                origin="Earth",
+                destination="Mars",
+                departure_time="2099-01-01T09:00:00Z",
+                arrival_time="2099-01-01T17:00:00Z",
+                base_price=base_price,
+                economy_seats_available=economy,
+                business_seats_available=business,
+                galaxium_seats_available=0
+            ))
+        db_session.commit()
+
+    def test_change_flight_and_class(self, db_session):
+        """Test the old seat is released, the new one claimed and the price difference recorded."""
+        from inventory import inventory
+        from models import BookingChange
+        from services import reconcile
+
+        self._setup(db_session)
+        original = booking.book_flight(db_session, 1, "Test User", 1)
+        before = inventory.get(db_session)
+        loads = inventory.loads
+
+        result = booking.change_booking(db_session, original.booking_id, flight_id=2, seat_class="business")
+        assert result.booking_id == original.booking_id
+        assert (result.flight_id, result.seat_class, result.status) == (2, "business", "booked")
+        assert result.price_paid == 5000
+        assert result.price_difference == 4000
+
+        assert db_session.get(Flight, 1).economy_seats_available == 6
+        assert db_session.get(Flight, 2).business_seats_available == 2
+        change = db_session.query(BookingChange).one()
+        assert (change.from_flight_id, change.from_seat_class, change.flight_id, change.seat_class) == (1, "economy", 2, "business")
+        assert change.price_difference == 4000
+
+        # The snapshot is updated in place rather than reloaded
+        after = inventory.current
+        assert inventory.loads == loads and after.version == before.version + 1
+        assert after.seats_available(after.position(1), "economy") == 6
+        assert after.seats_available(after.position(2), "business") == 2
+
+        # Back to economy on the same flight: a refund
+        result = booking.change_booking(db_session, original.booking_id, seat_class="economy")
+        assert (result.flight_id, result.seat_class, result.price_difference) == (2, "economy", -3000)
+        assert reconcile.reconcile_seats(db_session).drift == []
+
+    def test_change_rejected(self, db_session):
+        """Test failed changes leave the booking and the seat counters untouched."""
+        self._setup(db_session, business=0)
+        original = booking.book_flight(db_session, 1, "Test User", 1)
+
+        assert booking.change_booking(db_session, original.booking_id, 2, "business").error_code == "NO_SEATS_AVAILABLE"
+        assert booking.change_booking(db_session, original.booking_id, 1, "economy").error_code == "NO_CHANGE"
+        assert booking.change_booking(db_session, original.booking_id, 99).error_code == "FLIGHT_NOT_FOUND"
+        assert booking.change_booking(db_session, 999, 2).error_code == "BOOKING_NOT_FOUND"
+        booking.cancel_booking(db_session, original.booking_id)
+        assert booking.change_booking(db_session, original.booking_id, 2).error_code == "BOOKING_NOT_CHANGEABLE"
+
+        db_session.expire_all()
+        assert [(b.flight_id, b.seat_class, b.status) for b in db_session.query(Booking)] == [(1, "economy", "cancelled")]
+        assert db_session.get(Flight, 1).economy_seats_available == 6
+        assert db_session.get(Flight, 2).economy_seats_available == 6
+
+    def test_change_promotes_waitlist_on_old_flight(self, db_session):
+        """Test the released seat goes to the first user waiting for it."""
+        self._setup(db_session, economy=1)
+        db_session.add(User(name="Waiting User", email="waiting@example.com"))
+        db_session.commit()
+        original = booking.book_flight(db_session, 1, "Test User", 1)
+        entry = waitlist.join_waitlist(db_session, 2, "Waiting User", 1)
+
+        booking.change_booking(db_session, original.booking_id, 2)
+        assert waitlist.get_waitlist_entry(db_session, entry.waitlist_id).status == "promoted"
+        assert db_session.get(Flight, 1).economy_seats_available == 0
+
+    def test_concurrent_swaps_keep_counters_consistent(self, tmp_path):
+        """Test users swapping between two flights concurrently neither deadlock nor drift."""
+        import threading
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from services import reconcile
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'swaps.db'}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        Session = sessionmaker(bind=engine)
+        users = 8
+        with Session() as db:
+            self._setup(db, economy=users // 2 + 1)
+            for i in range(1, users):
+                db.add(User(name=f"User {i}", email=f"user{i}@example.com"))
+            db.commit()
+            bookings = [
+                booking.book_flight(db, i + 1, "Test User" if i == 0 else f"User {i}", i % 2 + 1).booking_id
+                for i in range(users)
+            ]
+
+        errors = []
+
+        def swap(booking_id):
+            with Session() as db:
+                for _ in range(25):
+                    current = db.get(Booking, booking_id, populate_existing=True)
+                    result = booking.change_booking(db, booking_id, 3 - current.flight_id)
+                    if isinstance(result, ErrorResponse) and result.error_code != "NO_SEATS_AVAILABLE":
+                        errors.append(result.error_code)
+
+        threads = [threading.Thread(target=swap, args=(booking_id,)) for booking_id in bookings]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        assert not any(thread.is_alive() for thread in threads)
+        assert errors == []
+
+        with Session() as db:
+            assert reconcile.reconcile_seats(db).drift == []
+            held = db.query(Booking).filter(Booking.status == "booked").count()
+            assert held == users
+            assert all(
+                db.get(Flight, flight_id).economy_seats_available >= 0 for flight_id in (1, 2)
+            )
+        engine.dispose()
+
+
+class TestFareCalendar:
+    """Test the cheapest fare per route, day and seat class."""
+
+    def _add_flights(self, db_session):
+        for destination, departure, base_price, seats in [
+            ("Mars", "2099-01-01T09:00:00Z", 1000, 1),
+            ("Mars", "2099-01-01T18:00:00Z", 1500, 5),
+            ("Mars", "2099-01-02T09:00:00Z", 800, 0),
+            ("Mars", "2099-01-04T09:00:00Z", 1200, 5),
+            ("Moon", "2099-01-01T09:00:00Z", 100, 5),
+        ]:
+            db_session.add(Flight(
+                origin="Earth",
+                destination=destination,
+                departure_time=departure,
+                arrival_time=departure.replace("09:00", "17:00"),
+                base_price=base_price,
+                economy_seats_available=seats,
+                business_seats_available=1,
+                galaxium_seats_available=0
+            ))
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+
+    def test_cheapest_fare_per_day(self, db_session):
+        """Test each day lists its cheapest flight with seats left, and sold-out days are omitted."""
+        self._add_flights(db_session)
+
+        result = flight.get_fare_calendar(db_session, "Earth", "Mars", start="2099-01-01", days=5)
+        assert [(d.date, d.flight_id, d.price) for d in result] == [
+            ("2099-01-01", 1, 1000),
+            ("2099-01-04", 4, 1200),
+        ]
+        result = flight.get_fare_calendar(db_session, "Earth", "Mars", "business", start="2099-01-02", days=2)
+        assert [(d.date, d.flight_id, d.price) for d in result] == [("2099-01-02", 3, 2000)]
+        assert flight.get_fare_calendar(db_session, "Earth", "Pluto", start="2099-01-01") == []
+
+        assert flight.get_fare_calendar(db_session, "Earth", "Mars", "first").error_code == "INVALID_SEAT_CLASS"
+        assert flight.get_fare_calendar(db_session, "Earth", "Mars", start="soon").error_code == "INVALID_DATE"
+        assert flight.get_fare_calendar(db_session, "Earth", "Mars", days=0).error_code == "INVALID_DAYS"
+
+    def test_follows_sold_out_and_recovered_seats(self, db_session):
+        """Test selling the last seat and cancelling it update the calendar without a rebuild."""
+        from fares import fare_calendar
+
+        self._add_flights(db_session)
+        flight.get_fare_calendar(db_session, "Earth", "Mars", start="2099-01-01")
+        builds = fare_calendar.builds
+
+        last_seat = booking.book_flight(db_session, 1, "Test User", 1)
+        result = flight.get_fare_calendar(db_session, "Earth", "Mars", start="2099-01-01", days=1)
+        assert [(d.flight_id, d.price) for d in result] == [(2, 1500)]
+
+        booking.cancel_booking(db_session, last_seat.booking_id)
+        result = flight.get_fare_calendar(db_session, "Earth", "Mars", start="2099-01-01", days=1)
+        assert [(d.flight_id, d.price) for d in result] == [(1, 1000)]
+        assert fare_calendar.builds == builds
+
+    def test_new_flight_rebuilds_calendar(self, db_session):
+        """Test adding a flight drops the calendar so the next lookup includes it."""
+        self._add_flights(db_session)
+        assert flight.get_fare_calendar(db_session, "Earth", "Mars", start="2099-01-03", days=1) == []
+
+        db_session.add(Flight(
+            origin="Earth",
+            destination="Mars",
+            departure_time="2099-01-03T09:00:00Z",
+            arrival_time="2099-01-03T17:00:00Z",
+            base_price=900,
+            economy_seats_available=5,
+            business_seats_available=1,
+            galaxium_seats_available=0
+        ))
+        db_session.commit()
+        result = flight.get_fare_calendar(db_session, "Earth", "Mars", start="2099-01-03", days=1)
+        assert [(d.flight_id, d.price) for d in result] == [(6, 900)]
+
+
+class TestScheduleImport:
+    """Test bulk upserts of flights from a CSV or NDJSON schedule."""
+
+    CSV = (
+        "origin,destination,departure_time,arrival_time,base_price,total_seats\n"
+        "Earth,Mars,2099-01-01T09:00:00Z,2099-01-01T17:00:00Z,1000,100\n"
+        "Earth,Moon,2099-01-01T10:00:00+00:00,2099-01-01T12:00:00Z,500,10\n"
+        "Earth,Earth,2099-01-01T10:00:00Z,2099-01-01T12:00:00Z,500,10\n"
+        "Earth,Venus,tomorrow,2099-01-01T12:00:00Z,500,10\n"
+        "Earth,Venus,2099-01-01T10:00:00Z,2099-01-01T12:00:00Z,,10\n"
+        "Earth,Venus,2099-01-01T10:00:00Z,2099-01-01T12:00:00Z,500,0\n"
+    )
+
+    def _import(self, db_session, text, format="csv", chunk_size=1000):
+        import io
+        from services import schedule
+
+        return schedule.import_schedule(db_session, schedule.read_schedule(io.StringIO(text), format), chunk_size)
+
+    def test_creates_and_updates_flights(self, db_session):
+        """Test new flights get the 60/30/10 seat split and re-importing updates them in place."""
+        result = self._import(db_session, self.CSV)
+        assert (result.created, result.updated, result.failed) == (2, 0, 4)
+        assert [(e.index, e.error_code) for e in result.errors] == [
+            (2, "INVALID_ROUTE"), (3, "INVALID_TIME"), (4, "MISSING_FIELD"), (5, "INVALID_SEATS"),
+        ]
+        mars = db_session.get(Flight, 1)
+        assert (mars.economy_seats_available, mars.business_seats_available, mars.galaxium_seats_available) == (60, 30, 10)
+        assert (mars.economy_seats_total, mars.business_seats_total, mars.galaxium_seats_total) == (60, 30, 10)
+        assert db_session.get(Flight, 2).departure_time == "2099-01-01T10:00:00Z"
+
+        result = self._import(db_session, self.CSV.replace(",1000,100", ",1200,200"))
+        assert (result.created, result.updated, result.seats_preserved) == (0, 2, 0)
+        db_session.expire_all()
+        mars = db_session.get(Flight, 1)
+        assert (mars.base_price, mars.economy_seats_available, mars.galaxium_seats_total) == (1200, 120, 20)
+        assert db_session.query(Flight).count() == 2
+
+    def test_booked_flight_keeps_its_seats(self, db_session):
+        """Test a flight with a booking gets the new price but keeps its seat counts."""
+        self._import(db_session, self.CSV)
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+        assert booking.book_flight(db_session, 1, "Test User", 1).status == "booked"
+
+        result = self._import(db_session, self.CSV.replace(",1000,100", ",1200,200"))
+        assert (result.updated, result.seats_preserved) == (2, 1)
+        db_session.expire_all()
+        mars = db_session.get(Flight, 1)
+        assert (mars.base_price, mars.economy_seats_available, mars.economy_seats_total) == (1200, 59, 60)
+        assert flight.list_flights(db_session)[0].base_price == 1200
+
+    def test_booking_during_import_keeps_its_seat(self, db_session, monkeypatch):
+        """Test a booking committed after the holding check is not overwritten by the seat reset."""
+        from services import schedule
+
+        self._import(db_session, self.CSV)
+        db_session.add(User(name="Test User", email="test@example.com"))
+        db_session.commit()
+        assert booking.book_flight(db_session, 1, "Test User", 1).status == "booked"
+
+        # The first holding check ran before the booking committed
+        holding_checks = []
+        real_check = schedule._flights_holding_seats
+        monkeypatch.setattr(schedule, "_flights_holding_seats",
+                            lambda db, ids: set() if not holding_checks.append(ids) and len(holding_checks) == 1 else real_check(db, ids))
+        result = self._import(db_session, self.CSV.replace(",1000,100", ",1200,200"))
+        assert (result.updated, result.seats_preserved) == (2, 1)
+        db_session.expire_all()
+        mars = db_session.get(Flight, 1)
+        assert (mars.base_price, mars.economy_seats_available, mars.economy_seats_total) == (1200, 59, 60)
+
+    def test_ndjson_rows(self, db_session):
+        """Test NDJSON lines are imported and a line that is not an object is rejected by index."""
+        text = (
+            '{"origin": "Earth", "destination": "Mars", "departure_time": "2099-01-01T09:00:00Z", '
+            '"arrival_time": "2099-01-01T17:00:00Z", "base_price": 1000, "total_seats": 10}\n'
+            "\n"
+            "[1, 2]\n"
+        )
+        result = self._import(db_session, text, "ndjson")
+        assert (result.created, result.failed) == (1, 1)
+        assert (result.errors[0].index, result.errors[0].error_code) == (1, "INVALID_ROW")
+
+    def test_invalidates_once_per_chunk(self, db_session, monkeypatch):
+        """Test the inventory snapshot is dropped once per committed chunk, not per row."""
+        from inventory import inventory
+
+        rows = "".join(
+            f"Earth,Mars,2099-01-{day:02d}T09:00:00Z,2099-01-{day:02d}T17:00:00Z,1000,10\n" for day in range(1, 11)
+        )
+        calls = []
+        monkeypatch.setattr(inventory, "invalidate", lambda: calls.append(1))
+        result = self._import(db_session, self.CSV.splitlines(keepends=True)[0] + rows, chunk_size=4)
+        assert (result.created, result.chunks) == (10, 3)
+        assert len(calls) == 3
+
+    def test_import_reaches_other_processes(self, db_session, monkeypatch):
+        """Test an import from a separate single-worker process invalidates the server's caches."""
+        import invalidation
+        from invalidation import InvalidationListener
+        from versions import data_versions
+
+        listener = InvalidationListener(db_session.get_bind())
+        listener.poll()
+        with monkeypatch.context() as other_process:
+            other_process.setattr(invalidation, "PROCESS_ID", "import-script")
+            self._import(db_session, self.CSV)
+        local = data_versions.flights
+
+        # Another process sees the import only through the invalidation log
+        assert listener.poll() > 0
+        assert data_versions.flights > local
+        listener.stop()
@@ -0,0 +1,143 @@
+"""Data version counters behind the ETags of GET /flights and GET /bookings/{user_id}.
+
+Every commit that changes flights bumps the flights version, and every
+commit that changes a user's bookings bumps that user's version. Both come
+from one ever-increasing counter, so an ETag never repeats. A conditional
+GET whose If-None-Match still matches is answered with 304 from the counter
+alone, without opening a database connection.
+
+Versions are per process, and every ETag includes a boot id, so two workers
+(or a restarted server) never accept each other's tags. When cross-process
+sync is enabled, changes are also written to the invalidation log, so other
+workers, and servers running alongside a writing script such as
+import_schedule.py, bump their versions too.
+"""
+import itertools
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import invalidation
+from models import Booking, Flight
+
+BOOT_ID = uuid.uuid4().hex[:8]
+_SESSION_KEY = 'data_versions'
+# Suffix added to an ETag by the compression middleware for an encoded representation
+_ENCODING_SUFFIX = re.compile(r'-(gzip|br|zstd)"$')
+
+
+class DataVersions:
+    def __init__(self, max_users: int = 100000):
+        self.max_users = max_users
+        self._counter = itertools.count(1)
+        self.flights = 0
+        self._users: OrderedDict[int, int] = OrderedDict()
+        # Version of users without an entry: never changed, or evicted at or before this version
+        self._users_floor = 0
+        self._lock = threading.Lock()
+
+    def bump_flights(self) -> None:
+        with self._lock:
+            self.flights = next(self._counter)
+
+    def bump_user(self, user_id: int) -> None:
+        with self._lock:
+            self._users[user_id] = next(self._counter)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                _, version = self._users.popitem(last=False)
+                self._users_floor = max(self._users_floor, version)
+
+    def bump_all_users(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self._users_floor = next(self._counter)
+
+    def user(self, user_id: int) -> int:
+        with self._lock:
+            return self._users.get(user_id, self._users_floor)
+
+    def flights_etag(self) -> str:
+        return f'"flights-{BOOT_ID}-{self.flights}"'
+
+    def bookings_etag(self, user_id: int) -> str:
+        return f'"bookings-{user_id}-{BOOT_ID}-{self.user(user_id)}"'
+
+    def booking_details_etag(self, user_id: int) -> str:
+        # Bookings with flight details change with either the user's bookings or any flight
+        return f'"booking-details-{user_id}-{BOOT_ID}-{self.user(user_id)}-{self.flights}"'
+
+    def apply(self, key: str) -> None:
+        if key == 'flights':
+            self.bump_flights()
+        elif key == 'users':
+            self.bump_all_users()
+        else:
+            self.bump_user(int(key.removeprefix('user:')))
+
+
+data_versions = DataVersions()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header lists `etag` (in any content encoding)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip().removeprefix('W/')
+        if _ENCODING_SUFFIX.sub('"', candidate) == etag:
+            return True
+    return False
+
+
+def _changes(session: Session) -> set:
+    return session.info.setdefault(_SESSION_KEY, set())
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changes(session: Session, flush_context, instances) -> None:
+    keys = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Flight):
+            keys.add('flights')
+        elif isinstance(obj, Booking):
+            keys.add(f'user:{obj.user_id}')
+    keys -= _changes(session)
+    if not keys:
+        return
+    _changes(session).update(keys)
+    for key in keys:
+        invalidation.publish(session, 'data_version', key)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    classes = {m.class_ for m in orm_execute_state.all_mappers}
+    keys = ({'flights'} if Flight in classes else set()) | ({'users'} if Booking in classes else set())
+    keys -= _changes(orm_execute_state.session)
+    if keys:
+        _changes(orm_execute_state.session).update(keys)
+        for key in keys:
+            invalidation.publish(orm_execute_state.session, 'data_version', key)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session: Session) -> None:
+    for key in session.info.pop(_SESSION_KEY, ()):
+        data_versions.apply(key)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+invalidation.subscribe('data_version', data_versions.apply)
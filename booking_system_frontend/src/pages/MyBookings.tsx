@@ -1,9 +1,9 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import type { Booking, Flight } from '../types';
+import type { BookingWithFlight } from '../types';
 import { LoadingSpinner, Modal, Button } from '../components/common';
 import { BookingCard } from '../components/bookings/BookingCard';
-import { getUserBookings, getFlights, cancelBooking, isErrorResponse } from '../services/api';
+import { getUserBookingsWithFlights, cancelBooking, isErrorResponse } from '../services/api';
 import { useUser } from '../hooks/useUser';
 import { AlertCircle } from 'lucide-react';
 import toast from 'react-hot-toast';
@@ -12,8 +12,7 @@ import { motion } from 'framer-motion';
 export const MyBookings = () => {
   const { user } = useUser();
   const navigate = useNavigate();
-  const [bookings, setBookings] = useState<Booking[]>([]);
-  const [flights, setFlights] = useState<Flight[]>([]);
+  const [bookings, setBookings] = useState<BookingWithFlight[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [cancellingId, setCancellingId] = useState<number | null>(null);
   const [showCancelModal, setShowCancelModal] = useState(false);
@@ -32,12 +31,7 @@ export const MyBookings = () => {
 
     setIsLoading(true);
     try {
-      const [bookingsData, flightsData] = await Promise.all([
-        getUserBookings(user.user_id),
-        getFlights(),
-      ]);
-      setBookings(bookingsData);
-      setFlights(flightsData);
+      setBookings(await getUserBookingsWithFlights(user.user_id));
     } catch (error: any) {
       toast.error('Failed to load bookings');
       console.error(error);
@@ -75,10 +69,6 @@ export const MyBookings = () => {
     }
   };
 
-  const getFlightForBooking = (booking: Booking): Flight | undefined => {
-    return flights.find((f) => f.flight_id === booking.flight_id);
-  };
-
   const activeBookings = bookings.filter((b) => b.status === 'booked');
   const pastBookings = bookings.filter((b) => b.status !== 'booked');
 
@@ -138,7 +128,7 @@ export const MyBookings = () => {
                   <BookingCard
                     key={booking.booking_id}
                     booking={booking}
-                    flight={getFlightForBooking(booking)}
+                    flight={booking.flight ?? undefined}
                     onCancel={handleCancelClick}
                     isCancelling={cancellingId === booking.booking_id}
                   />
@@ -162,7 +152,7 @@ export const MyBookings = () => {
                   <BookingCard
                     key={booking.booking_id}
                     booking={booking}
-                    flight={getFlightForBooking(booking)}
+                    flight={booking.flight ?? undefined}
                     onCancel={handleCancelClick}
                   />
                 ))}
@@ -2,6 +2,7 @@ import axios from 'axios';
 import type {
   Flight,
   Booking,
+  BookingWithFlight,
   User,
   BookingRequest,
   UserRegistration,
@@ -89,6 +90,14 @@ export const getUserBookings = async (userId: number): Promise<Booking[]> => {
   return response.data;
 };
 
+/**
+ * Get all bookings for a user, each with its flight's details
+ */
+export const getUserBookingsWithFlights = async (userId: number): Promise<BookingWithFlight[]> => {
+  const response = await api.get<BookingWithFlight[]>(`/bookings/${userId}/details`);
+  return response.data;
+};
+
 /**
  * Cancel a booking
  */
@@ -55,7 +55,7 @@ export interface ErrorResponse {
 
 // Extended types for UI
 export interface BookingWithFlight extends Booking {
-  flight?: Flight;
+  flight: Flight | null;
 }
 
 export interface FlightFilters {